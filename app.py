@@ -13,7 +13,9 @@ import io
 import uuid
 import streamlit.components.v1 as components
 # [NEW] 분리한 utils 파일에서 공통 함수 임포트
-from utils import get_db, firestore, validate_password
+from utils import get_db, firestore, validate_password, get_company_info
+from db_usage import begin_usage_run
+from post_sweeper import start_post_sweeper
 from ui_orders import render_order_entry, render_order_status, render_partner_order_status
 from ui_production_weaving import render_weaving
 from ui_production_dyeing import render_dyeing
@@ -22,7 +24,7 @@ from ui_shipping import render_shipping_operations, render_shipping_status
 from ui_inventory import render_inventory
 from ui_statements import render_statement_list
 from ui_basic_info import render_product_master, render_partners, render_machines, render_codes
-from ui_system import render_users, render_my_profile, render_company_settings
+from ui_system import render_users, render_my_profile, render_company_settings, render_db_usage
 from ui_statistics import render_statistics
 from ui_board import render_notice_board, render_schedule
 
@@ -81,6 +83,10 @@ st.markdown(base_css, unsafe_allow_html=True)
 
 with st.spinner("시스템 초기화 및 DB 연결 중..."):
     db = get_db()
+    start_post_sweeper() # [NEW] 만료 게시물 정리 작업 (프로세스당 1회 시작)
+
+# [NEW] 이번 rerun의 DB 사용량 집계 시작
+begin_usage_run(st.session_state.get("user_id"))
 
 # --- 로그인 기능 추가 ---
 if "logged_in" not in st.session_state:
@@ -109,9 +115,8 @@ if not st.session_state["logged_in"]:
 
     # [NEW] 회사 로고 및 제목 가져오기
     try:
-        comp_doc = db.collection("settings").document("company_info").get()
-        if comp_doc.exists:
-            comp_data = comp_doc.to_dict()
+        comp_data = get_company_info()
+        if comp_data:
             login_logo = comp_data.get("logo_img")
             # [NEW] 로그인 화면 디자인 설정 적용
             lg_logo_width = comp_data.get("lg_logo_width", 120)
@@ -313,9 +318,9 @@ if not st.session_state["logged_in"]:
 
 # [NEW] 브라우저 탭 제목 동적 변경 (사용자 설정 반영)
 try:
-    c_doc = db.collection("settings").document("company_info").get()
-    if c_doc.exists:
-        app_title = c_doc.to_dict().get("app_title", "타올 생산 현황 관리")
+    c_data = get_company_info()
+    if c_data:
+        app_title = c_data.get("app_title", "타올 생산 현황 관리")
     else:
         app_title = "타올 생산 현황 관리"
 except:
@@ -344,9 +349,8 @@ with st.sidebar:
 
     # [NEW] 회사 정보 가져오기 (상호명 표시용)
     try:
-        comp_info_ref = db.collection("settings").document("company_info").get()
-        if comp_info_ref.exists:
-            comp_data = comp_info_ref.to_dict()
+        comp_data = get_company_info()
+        if comp_data:
             logo_img = comp_data.get("logo_img")
             
             # [NEW] 사이드바 디자인 설정 적용
@@ -574,13 +578,14 @@ with st.sidebar:
                         menu_item("제직기 등록", "제직기관리")
 
         if st.session_state.get("role") == "admin":
-            with st.expander("시스템관리", expanded=(cm in ["사용자 관리", "회사정보 관리"])):
+            with st.expander("시스템관리", expanded=(cm in ["사용자 관리", "회사정보 관리", "DB 사용량"])):
                 with st.expander("사용자 관리", expanded=(cm == "사용자 관리")):
                     menu_item("사용자 목록", "사용자 관리")
                     menu_item("사용자 등록", "사용자 관리")
                 with st.expander("회사정보 관리", expanded=(cm == "회사정보 관리")):
                     menu_item("회사정보 조회", "회사정보 관리")
                     menu_item("정보 수정", "회사정보 관리")
+                menu_item("DB 사용량 조회", "DB 사용량")
     
     # [수정] 하단 여백 축소 (50px -> 10px)
     st.markdown("<div style='margin-top: 10px;'></div>", unsafe_allow_html=True)
@@ -841,6 +846,8 @@ elif menu == "사용자 관리":
     render_users(db, sub_menu)
 elif menu == "회사정보 관리":
     render_company_settings(db, sub_menu)
+elif menu == "DB 사용량":
+    render_db_usage(db, sub_menu)
 elif menu == "로그인 정보 설정":
     render_my_profile(db)
 else:
@@ -0,0 +1,310 @@
+import streamlit as st
+import threading
+import datetime
+import functools
+import collections
+import json
+import io
+import pandas as pd
+
+# [NEW] Firestore 읽기/쓰기/삭제 사용량 집계
+# utils.get_db()가 반환하는 클라이언트를 감싸서, 실제 Firestore 호출 시 문서 수를
+# 화면(render 함수)별 / rerun별로 기록합니다. (일일 사용량 초과 원인 추적용)
+
+_COUNTER_KEYS = ("reads", "writes", "deletes")
+_local = threading.local()
+
+def _new_counter():
+    return {"reads": 0, "writes": 0, "deletes": 0, "calls": 0}
+
+@st.cache_resource
+def _get_usage_state():
+    return {
+        "lock": threading.Lock(),
+        "started_at": datetime.datetime.now(),
+        "scopes": collections.defaultdict(_new_counter),
+        "runs": collections.deque(maxlen=200),
+    }
+
+def _current_scope():
+    stack = getattr(_local, "scopes", None)
+    if stack:
+        return stack[-1]
+    # 스크립트 스레드 밖(스냅샷 리스너, 백그라운드 작업 등)에서 발생한 호출
+    return "(공통)" if getattr(_local, "run", None) is not None else "(백그라운드)"
+
+def record_usage(kind, count=1, scope=None):
+    """사용량을 기록합니다. kind: 'reads' | 'writes' | 'deletes'"""
+    if kind not in _COUNTER_KEYS:
+        return
+    scope = scope or _current_scope()
+    state = _get_usage_state()
+    with state["lock"]:
+        sc = state["scopes"][scope]
+        sc[kind] += count
+        sc["calls"] += 1
+        run = getattr(_local, "run", None)
+        if run is not None:
+            run[kind] += count
+            run["calls"] += 1
+            run_sc = run["scopes"].setdefault(scope, _new_counter())
+            run_sc[kind] += count
+            run_sc["calls"] += 1
+
+def begin_usage_run(user_id=None):
+    """rerun 시작 시 호출하여 이번 실행의 사용량 기록을 시작합니다."""
+    run = _new_counter()
+    run.update({"time": datetime.datetime.now(), "user": user_id or "", "scopes": {}})
+    _local.run = run
+    _local.scopes = []
+    state = _get_usage_state()
+    with state["lock"]:
+        state["runs"].append(run)
+
+def track_db_usage(func):
+    """render 함수에 적용하여 함수 실행 중 발생한 DB 사용량을 함수 이름으로 집계합니다."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, "scopes", None)
+        if stack is None:
+            stack = _local.scopes = []
+        stack.append(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+    return wrapper
+
+def get_usage_snapshot():
+    """(화면별 누적 사용량 DataFrame, 최근 rerun 목록 DataFrame)을 반환합니다."""
+    state = _get_usage_state()
+    with state["lock"]:
+        scope_rows = [{"scope": name, **dict(c)} for name, c in state["scopes"].items()]
+        run_rows = []
+        for r in state["runs"]:
+            top = sorted(r["scopes"].items(), key=lambda x: x[1]["reads"] + x[1]["writes"] + x[1]["deletes"], reverse=True)
+            run_rows.append({
+                "time": r["time"], "user": r["user"],
+                "reads": r["reads"], "writes": r["writes"], "deletes": r["deletes"], "calls": r["calls"],
+                "scopes": ", ".join(name for name, _ in top),
+            })
+    df_scopes = pd.DataFrame(scope_rows, columns=["scope", "reads", "writes", "deletes", "calls"])
+    if not df_scopes.empty:
+        df_scopes["total"] = df_scopes["reads"] + df_scopes["writes"] + df_scopes["deletes"]
+        df_scopes = df_scopes.sort_values("total", ascending=False).reset_index(drop=True)
+    df_runs = pd.DataFrame(run_rows, columns=["time", "user", "reads", "writes", "deletes", "calls", "scopes"])
+    if not df_runs.empty:
+        df_runs = df_runs.iloc[::-1].reset_index(drop=True)
+    return df_scopes, df_runs
+
+def reset_usage():
+    state = _get_usage_state()
+    with state["lock"]:
+        state["scopes"].clear()
+        state["runs"].clear()
+        state["started_at"] = datetime.datetime.now()
+
+def usage_started_at():
+    return _get_usage_state()["started_at"]
+
+def export_usage_json():
+    df_scopes, df_runs = get_usage_snapshot()
+    payload = {
+        "started_at": usage_started_at().isoformat(),
+        "exported_at": datetime.datetime.now().isoformat(),
+        "scopes": df_scopes.to_dict(orient="records"),
+        "runs": [{**r, "time": r["time"].isoformat()} for r in df_runs.to_dict(orient="records")],
+    }
+    return json.dumps(payload, ensure_ascii=False, indent=2, default=str)
+
+def export_usage_csv():
+    df_scopes, _ = get_usage_snapshot()
+    buf = io.StringIO()
+    df_scopes.to_csv(buf, index=False)
+    return buf.getvalue().encode("utf-8-sig")
+
+# --- Firestore 객체 래퍼 ---
+
+def _unwrap(obj):
+    return obj._target if isinstance(obj, _Tracked) else obj
+
+def _unwrap_args(args, kwargs):
+    return [_unwrap(a) for a in args], {k: _unwrap(v) for k, v in kwargs.items()}
+
+class _Tracked:
+    """래핑 대상 객체의 나머지 속성/메서드는 그대로 전달합니다."""
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        if name == "_target":
+            raise AttributeError(name)
+        return getattr(self._target, name)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"Tracked({self._target!r})"
+
+class TrackedSnapshot(_Tracked):
+    @property
+    def reference(self):
+        return TrackedDocument(self._target.reference)
+
+class TrackedDocument(_Tracked):
+    def get(self, *args, **kwargs):
+        record_usage("reads", 1)
+        args, kwargs = _unwrap_args(args, kwargs)
+        return TrackedSnapshot(self._target.get(*args, **kwargs))
+
+    def set(self, *args, **kwargs):
+        record_usage("writes", 1)
+        return self._target.set(*args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        record_usage("writes", 1)
+        return self._target.create(*args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        record_usage("writes", 1)
+        return self._target.update(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        record_usage("deletes", 1)
+        return self._target.delete(*args, **kwargs)
+
+    def collection(self, *args, **kwargs):
+        return TrackedQuery(self._target.collection(*args, **kwargs))
+
+    def on_snapshot(self, callback):
+        return self._target.on_snapshot(_tracked_listener(callback))
+
+    @property
+    def parent(self):
+        return TrackedQuery(self._target.parent)
+
+class TrackedAggregation(_Tracked):
+    def get(self, *args, **kwargs):
+        # 집계 쿼리는 인덱스 항목 1,000개당 1회 읽기로 과금 (최소 1회)
+        record_usage("reads", 1)
+        return self._target.get(*args, **kwargs)
+
+class TrackedQuery(_Tracked):
+    """CollectionReference 및 Query 공용 래퍼"""
+    _CHAIN_METHODS = ("where", "order_by", "limit", "limit_to_last", "offset", "select",
+                      "start_at", "start_after", "end_at", "end_before")
+
+    def __getattr__(self, name):
+        if name == "_target":
+            raise AttributeError(name)
+        attr = getattr(self._target, name)
+        if name in self._CHAIN_METHODS:
+            @functools.wraps(attr)
+            def chained(*args, **kwargs):
+                args, kwargs = _unwrap_args(args, kwargs)
+                return TrackedQuery(attr(*args, **kwargs))
+            return chained
+        return attr
+
+    def document(self, *args, **kwargs):
+        return TrackedDocument(self._target.document(*args, **kwargs))
+
+    def add(self, *args, **kwargs):
+        record_usage("writes", 1)
+        update_time, ref = self._target.add(*args, **kwargs)
+        return update_time, TrackedDocument(ref)
+
+    def stream(self, *args, **kwargs):
+        args, kwargs = _unwrap_args(args, kwargs)
+        count = 0
+        try:
+            for snap in self._target.stream(*args, **kwargs):
+                count += 1
+                yield TrackedSnapshot(snap)
+        finally:
+            # 결과가 없는 쿼리도 최소 1회 읽기로 과금
+            record_usage("reads", max(count, 1))
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+    def list_documents(self, *args, **kwargs):
+        refs = list(self._target.list_documents(*args, **kwargs))
+        record_usage("reads", max(len(refs), 1))
+        return [TrackedDocument(r) for r in refs]
+
+    def count(self, *args, **kwargs):
+        return TrackedAggregation(self._target.count(*args, **kwargs))
+
+    def on_snapshot(self, callback):
+        return self._target.on_snapshot(_tracked_listener(callback))
+
+class TrackedWriteBatch(_Tracked):
+    def set(self, reference, *args, **kwargs):
+        record_usage("writes", 1)
+        return self._target.set(_unwrap(reference), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        record_usage("writes", 1)
+        return self._target.create(_unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        record_usage("writes", 1)
+        return self._target.update(_unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        record_usage("deletes", 1)
+        return self._target.delete(_unwrap(reference), *args, **kwargs)
+
+class TrackedBulkWriter(TrackedWriteBatch):
+    # set/create/update/delete 시그니처가 WriteBatch와 같으므로 집계 방식을 공유합니다.
+    pass
+
+class TrackedTransaction(TrackedWriteBatch):
+    # firestore.transactional 데코레이터가 내부 속성(_id 등)을 읽으므로 속성 전달을 유지합니다.
+    def get(self, ref_or_query, *args, **kwargs):
+        target = _unwrap(ref_or_query)
+        # [FIX] SDK는 문서 참조도 get_all 결과(제너레이터)를 반환하므로 문서/쿼리 모두 스냅샷 반복자로 감싸서 반환
+        snaps = list(self._target.get(target, *args, **kwargs))
+        record_usage("reads", max(len(snaps), 1))
+        return iter([TrackedSnapshot(s) for s in snaps])
+
+def _tracked_listener(callback):
+    scope = _current_scope()
+    def on_change(snapshots, changes, read_time):
+        record_usage("reads", max(len(changes), 1), scope=f"{scope} (리스너)")
+        return callback(snapshots, changes, read_time)
+    return on_change
+
+class TrackedClient(_Tracked):
+    def collection(self, *args, **kwargs):
+        return TrackedQuery(self._target.collection(*args, **kwargs))
+
+    def collection_group(self, *args, **kwargs):
+        return TrackedQuery(self._target.collection_group(*args, **kwargs))
+
+    def document(self, *args, **kwargs):
+        return TrackedDocument(self._target.document(*args, **kwargs))
+
+    def batch(self, *args, **kwargs):
+        return TrackedWriteBatch(self._target.batch(*args, **kwargs))
+
+    def transaction(self, *args, **kwargs):
+        return TrackedTransaction(self._target.transaction(*args, **kwargs))
+
+    def bulk_writer(self, *args, **kwargs):
+        return TrackedBulkWriter(self._target.bulk_writer(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        args, kwargs = _unwrap_args(args, kwargs)
+        count = 0
+        try:
+            for snap in self._target.get_all([_unwrap(r) for r in references], *args, **kwargs):
+                count += 1
+                yield TrackedSnapshot(snap)
+        finally:
+            record_usage("reads", max(count, 1))
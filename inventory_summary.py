@@ -0,0 +1,168 @@
+import datetime
+import hashlib
+import pandas as pd
+from firebase_admin import firestore
+
+# [NEW] 제품별 재고 요약 (inventory_summary 컬렉션)
+# 재고(봉제완료) 상태로 들어오거나 나가는 시점(봉제완료, 출고, 출고취소, 재고 등록/수정/삭제)마다
+# 제품코드+발주처별 합계를 firestore.Increment로 갱신하여, '제품별 재고' 요약을 작은 컬렉션 1회 조회로 표시합니다.
+# 누락/불일치가 생기면 rebuild_inventory_summary()로 orders에서 다시 계산합니다. (관리자 '요약 재계산' 또는 python inventory_summary.py)
+# 대량 삭제처럼 변경 전 내용을 알 수 없는 경우 sync_state/inventory_summary에 재계산 필요 표시만 남깁니다.
+
+INVENTORY_STATUS = "봉제완료"
+SUMMARY_COLLECTION = "inventory_summary"
+SUMMARY_COLUMNS = ['product_code', 'product_type', 'yarn_type', 'weight', 'size', 'stock', 'shipping_unit_price', 'total_value']
+_INFO_FIELDS = ("product_type", "yarn_type", "weight", "size")
+STATE_DOC_ID = "inventory_summary"
+
+def _num(v):
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return 0
+    return 0 if pd.isna(v) else int(v)
+
+def _clean(v):
+    # DataFrame 행에서 넘어온 NaN은 None으로 저장
+    try:
+        return None if pd.isna(v) else v
+    except (TypeError, ValueError):
+        return v
+
+def _summary_id(product_code, customer):
+    # 발주처명에 '/' 등 문서 ID로 쓸 수 없는 문자가 있을 수 있으므로 해시 사용
+    return hashlib.md5(f"{product_code}\x1f{customer}".encode("utf-8")).hexdigest()
+
+def _contribution(order):
+    """발주 1건이 요약에 더하는 값 (재고 상태가 아니면 None)"""
+    if order is None or order.get("status") != INVENTORY_STATUS:
+        return None
+    if hasattr(order, "to_dict"): # pandas Series
+        order = order.to_dict()
+    key = (str(_clean(order.get("product_code")) or ""), str(_clean(order.get("customer")) or ""))
+    stock = _num(order.get("stock"))
+    price = _num(order.get("shipping_unit_price"))
+    values = {"stock": stock, "doc_count": 1, "price_sum": price, "total_value": stock * price}
+    info = {f: _clean(order.get(f)) for f in _INFO_FIELDS}
+    return key, values, info
+
+def record_inventory_changes(db, changes, batch=None):
+    """
+    발주 문서의 (변경 전, 변경 후) 데이터 목록으로 재고 요약을 증감합니다.
+    신규 등록은 변경 전을 None, 삭제는 변경 후를 None으로 넘깁니다.
+    batch를 넘기면 같은 batch에 함께 기록하고(커밋은 호출측), 없으면 즉시 커밋합니다.
+    반환: 기록한 요약 문서 수
+    """
+    deltas = {}
+    infos = {}
+    for before, after in changes:
+        for order, sign in ((before, -1), (after, 1)):
+            c = _contribution(order)
+            if c is None:
+                continue
+            key, values, info = c
+            d = deltas.setdefault(key, dict.fromkeys(values, 0))
+            for k, v in values.items():
+                d[k] += sign * v
+            if sign > 0 or key not in infos:
+                infos[key] = info
+
+    deltas = {k: d for k, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return 0
+
+    own_batch = batch is None
+    if own_batch:
+        batch = db.batch()
+    for (code, customer), d in deltas.items():
+        ref = db.collection(SUMMARY_COLLECTION).document(_summary_id(code, customer))
+        data = {"product_code": code, "customer": customer, "updated_at": firestore.SERVER_TIMESTAMP}
+        data.update({f: v for f, v in infos[(code, customer)].items() if v not in (None, "")})
+        data.update({k: firestore.Increment(v) for k, v in d.items()})
+        batch.set(ref, data, merge=True)
+    if own_batch:
+        batch.commit()
+    return len(deltas)
+
+def _state_ref(db):
+    return db.collection("sync_state").document(STATE_DOC_ID)
+
+def flag_inventory_rebuild(db):
+    """요약을 증분으로 맞출 수 없는 변경(대량 삭제 등) 후 재계산 필요 표시를 남깁니다."""
+    _state_ref(db).set({"rebuild_needed": True, "flagged_at": firestore.SERVER_TIMESTAMP}, merge=True)
+
+def inventory_rebuild_needed(db):
+    snap = _state_ref(db).get()
+    return snap.exists and bool(snap.to_dict().get("rebuild_needed"))
+
+def _to_summary_df(df):
+    """발주처별 요약 행을 제품코드별로 합산합니다. (평균단가 = 단가 합 / 건수)"""
+    if df.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    for c in _INFO_FIELDS:
+        if c not in df.columns:
+            df[c] = ""
+    summary = df.groupby('product_code').agg({
+        'product_type': 'first',
+        'yarn_type': 'first',
+        'weight': 'first',
+        'size': 'first',
+        'stock': 'sum',
+        'doc_count': 'sum',
+        'price_sum': 'sum',
+        'total_value': 'sum'
+    }).reset_index()
+    summary = summary[summary['doc_count'] > 0]
+    summary['weight'] = pd.to_numeric(summary['weight'], errors='coerce').fillna(0).astype(int)
+    summary['shipping_unit_price'] = (summary['price_sum'] / summary['doc_count']).astype(int)
+    for c in ['stock', 'total_value']:
+        summary[c] = summary[c].astype(int)
+    return summary[SUMMARY_COLUMNS].reset_index(drop=True)
+
+def load_inventory_summary(db, customer=None):
+    """제품코드별 재고 요약 DataFrame ('제품별 재고' 목록 형식)"""
+    query = db.collection(SUMMARY_COLLECTION)
+    if customer is not None:
+        query = query.where("customer", "==", customer)
+    rows = [doc.to_dict() for doc in query.stream()]
+    return _to_summary_df(pd.DataFrame(rows))
+
+def rebuild_inventory_summary(db):
+    """
+    orders의 재고(봉제완료) 문서로 요약 컬렉션을 다시 만듭니다. (불일치 보정용)
+    재계산 중 발생한 재고 변동은 덮어써질 수 있으므로 작업이 적은 시간에 실행합니다.
+    반환: 요약 문서 수
+    """
+    totals = {}
+    infos = {}
+    for doc in db.collection("orders").where("status", "==", INVENTORY_STATUS).stream():
+        key, values, info = _contribution(doc.to_dict())
+        t = totals.setdefault(key, dict.fromkeys(values, 0))
+        for k, v in values.items():
+            t[k] += v
+        merged = infos.setdefault(key, {})
+        for f, v in info.items():
+            if merged.get(f) in (None, ""):
+                merged[f] = v
+
+    writer = db.bulk_writer()
+    writer.on_write_error(lambda failure, _writer: failure.attempts < 5)
+    now = datetime.datetime.now()
+    keep_ids = set()
+    for (code, customer), t in totals.items():
+        doc_id = _summary_id(code, customer)
+        keep_ids.add(doc_id)
+        data = {"product_code": code, "customer": customer, **infos[(code, customer)], **t,
+                "updated_at": firestore.SERVER_TIMESTAMP, "rebuilt_at": now}
+        writer.set(db.collection(SUMMARY_COLLECTION).document(doc_id), data)
+    for snap in db.collection(SUMMARY_COLLECTION).select([]).stream():
+        if snap.id not in keep_ids:
+            writer.delete(snap.reference)
+    writer.close()
+    _state_ref(db).set({"rebuild_needed": False, "rebuilt_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    return len(totals)
+
+if __name__ == "__main__":
+    from utils import get_db
+    count = rebuild_inventory_summary(get_db())
+    print(f"재고 요약 문서 {count:,}건을 다시 만들었습니다.")
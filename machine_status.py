@@ -0,0 +1,145 @@
+from firebase_admin import firestore
+from utils import stamp_updated_at
+
+# [NEW] 제직기 가동 상태 문서 (machine_status/current)
+# 제직기번호 -> 가동중인 발주 요약을 한 문서에 유지하여, 제직 현황 대시보드와 '사용중' 확인을 1회 읽기로 처리합니다.
+# 제직 시작/롤 등록/완료/취소 시 발주 문서와 같은 트랜잭션에서 갱신하므로 이 문서가 제직기 잠금 역할을 합니다.
+# (동시에 같은 제직기에 작업을 배정하면 한쪽은 트랜잭션 재시도 후 '사용중'으로 거절됨)
+# 문서가 없거나 어긋난 경우 rebuild_machine_status()로 orders의 제직중 건에서 다시 만듭니다.
+
+STATUS_COLLECTION = "machine_status"
+STATUS_DOC_ID = "current"
+WEAVING_STATUS = "제직중"
+_CARD_FIELDS = ("order_no", "name", "customer", "product_type", "weaving_type", "size", "weight", "stock",
+                "delivery_req_date", "weaving_roll_count", "completed_rolls", "weaving_start_time")
+
+def _status_ref(db):
+    return db.collection(STATUS_COLLECTION).document(STATUS_DOC_ID)
+
+def _key(machine_no):
+    # DataFrame 행에서 넘어온 3.0 등도 "3"으로 통일
+    try:
+        return str(int(float(machine_no)))
+    except (TypeError, ValueError):
+        return str(machine_no)
+
+def _card(order_id, data):
+    card = {f: data[f] for f in _CARD_FIELDS if data.get(f) is not None}
+    card["order_id"] = order_id
+    return card
+
+def get_machine_status(db):
+    """제직기번호(문자열) -> 가동중인 발주 요약 dict. 상태 문서가 없으면 orders에서 생성합니다."""
+    snap = _status_ref(db).get()
+    if not snap.exists:
+        return rebuild_machine_status(db)
+    return snap.to_dict().get("machines", {})
+
+def machine_holder(db, machine_no):
+    """해당 제직기를 사용 중인 발주 요약 (비어 있으면 None)"""
+    return get_machine_status(db).get(_key(machine_no))
+
+def rebuild_machine_status(db):
+    """orders의 제직중 건으로 상태 문서를 다시 만듭니다. (불일치 보정용) 반환: 새 상태"""
+    machines = {}
+    for doc in db.collection("orders").where("status", "==", WEAVING_STATUS).stream():
+        d = doc.to_dict()
+        if d.get("machine_no"):
+            machines[_key(d["machine_no"])] = _card(doc.id, d)
+    _status_ref(db).set({"machines": machines, "rebuilt_at": firestore.SERVER_TIMESTAMP})
+    return machines
+
+def record_machine_changes(db, changes, batch=None):
+    """
+    관리자 수정/삭제 등 발주 문서의 (변경 전, 변경 후) 목록을 제직기 상태에 반영합니다. (삭제는 변경 후 None)
+    변경 전 데이터에는 문서 ID('id')가 있어야 합니다.
+    제직중이 아니게 된 건은 잠금을 해제하고, 제직중+제직기번호인 건은 비어 있는 제직기에 잠급니다.
+    batch를 넘기면 같은 batch에 기록하고(커밋은 호출측), 없으면 즉시 기록합니다.
+    반환: 다른 작업이 사용 중이라 잠그지 못한 경우의 안내 메시지 목록
+    """
+    snap = _status_ref(db).get()
+    if not snap.exists:
+        return [] # 다음 조회 시 orders에서 새로 생성됨
+    machines = snap.to_dict().get("machines", {})
+    changed = False
+    conflicts = []
+    for before, after in changes:
+        order_id = before.get("id")
+        for key in [k for k, card in machines.items() if card.get("order_id") == order_id]:
+            if after is None or after.get("status") != WEAVING_STATUS or _key(after.get("machine_no")) != key:
+                del machines[key]
+                changed = True
+        machine_no = after.get("machine_no") if after is not None else None
+        if after is not None and after.get("status") == WEAVING_STATUS and machine_no and machine_no == machine_no: # NaN 제외
+            key = _key(machine_no)
+            holder = machines.get(key)
+            if holder and holder.get("order_id") != order_id:
+                conflicts.append(f"{key}호대는 다른 작업({holder.get('name', '-')})이 사용 중이라 제직기 현황에 반영하지 않았습니다.")
+                continue
+            machines[key] = _card(order_id, after)
+            changed = True
+    if changed:
+        if batch is None:
+            _status_ref(db).update({"machines": machines})
+        else:
+            batch.update(_status_ref(db), {"machines": machines})
+    return conflicts
+
+def start_weaving(db, machine_no, order_id, updates, expected_statuses=("제직대기",)):
+    """
+    제직기를 잠그고 발주 문서를 제직중으로 변경합니다. (트랜잭션)
+    반환: 실패 사유 (성공 시 None)
+    """
+    key = _key(machine_no)
+    status_ref = _status_ref(db)
+    order_ref = db.collection("orders").document(order_id)
+    if not status_ref.get().exists:
+        rebuild_machine_status(db) # 최초 사용 시 기존 제직중 건으로 생성
+
+    @firestore.transactional
+    def run(transaction):
+        status_snap = status_ref.get(transaction=transaction)
+        order_snap = order_ref.get(transaction=transaction)
+        machines = status_snap.to_dict().get("machines", {}) if status_snap.exists else {}
+        holder = machines.get(key)
+        if holder and holder.get("order_id") != order_id:
+            return f"해당 제직기는 이미 작업 중입니다. ({holder.get('name', '-')})"
+        if not order_snap.exists or order_snap.to_dict().get("status") not in expected_statuses:
+            return "다른 사용자가 이미 상태를 변경했습니다. 목록을 새로고침하세요."
+        machines[key] = _card(order_id, {**order_snap.to_dict(), **updates})
+        transaction.update(order_ref, stamp_updated_at(updates))
+        transaction.set(status_ref, {"machines": machines}, merge=True)
+        return None
+
+    return run(db.transaction())
+
+def update_weaving_order(db, machine_no, order_id, updates, release=False):
+    """
+    제직중 발주 문서를 수정하고 제직기 상태를 함께 갱신합니다. (트랜잭션)
+    release=True면 제직기 잠금을 해제합니다. (마지막 롤 완료, 제직 취소)
+    """
+    key = _key(machine_no) if machine_no is not None else None
+    status_ref = _status_ref(db)
+    order_ref = db.collection("orders").document(order_id)
+
+    @firestore.transactional
+    def run(transaction):
+        status_snap = status_ref.get(transaction=transaction)
+        machines = status_snap.to_dict().get("machines", {}) if status_snap.exists else {}
+        transaction.update(order_ref, stamp_updated_at(updates))
+        holder = machines.get(key)
+        if holder and holder.get("order_id") == order_id:
+            if release:
+                del machines[key]
+            else:
+                holder.update({f: v for f, v in updates.items() if f in _CARD_FIELDS})
+            # 필드 단위 병합 시 삭제된 제직기 키가 남지 않도록 machines 전체를 다시 기록
+            transaction.update(status_ref, {"machines": machines})
+
+    run(db.transaction())
+
+if __name__ == "__main__":
+    # python machine_status.py -> 제직기 상태 문서를 orders의 제직중 건으로 다시 만듦
+    from utils import get_db
+    status = rebuild_machine_status(get_db())
+    print(f"제직기 상태를 재구성했습니다. (가동중 {len(status)}대)")
@@ -0,0 +1,191 @@
+import time
+import atexit
+import threading
+import collections
+import streamlit as st
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+from utils import fetch_query_page, get_db
+
+# [NEW] 공지사항 목록/상세 분리 조회 및 조회수 버퍼
+# 목록은 필드 선택(select)으로 제목/작성자/날짜/공개대상 등 메타데이터만 읽고,
+# 본문(content)은 게시물을 열 때 해당 문서 1건만 읽습니다. (기존 Base64 첨부 file_data는 목록/상세 모두 제외)
+# 조회수는 서버 프로세스 메모리에 모아 두었다가 VIEW_FLUSH_COUNT건 또는 VIEW_FLUSH_SECONDS초마다 batch로 반영합니다.
+#
+# [NEW] 공개 대상 색인 (audience)
+# 게시물 작성/수정 시 볼 수 있는 대상을 audience 배열로 함께 기록합니다.
+#   "all" (전체공지) / "user:{아이디}" (대상 사용자, 작성자) / "dept:{부서}" (대상 부서)
+# 목록은 audience array-contains-any [all, user:나, dept:내부서] 조건으로 서버에서 걸러 페이지 단위로 조회하므로,
+# 오래된 게시물의 대상자도 자기 글을 볼 수 있고 볼 수 없는 글은 읽지 않습니다. (관리자는 조건 없이 전체 조회)
+# 기존 게시물은 backfill_post_audience()로 한 번 채웁니다. (목록 최초 조회 시 자동 실행)
+
+LIST_FIELDS = ["title", "author", "author_id", "created_at", "is_important", "target_type", "target_value",
+               "expiration_date", "file_name", "file_size", "views"]
+DETAIL_FIELDS = LIST_FIELDS + ["content", "file_chunks", "audience"]
+VIEW_FLUSH_COUNT = 20
+VIEW_FLUSH_SECONDS = 60
+PINNED_LIMIT = 10 # 상단 고정(중요) 공지 최대 표시 수
+SEARCH_SCAN_LIMIT = 300 # 검색 시 조회하는 최근 게시물 수 (볼 수 있는 글 기준)
+AUDIENCE_ALL = "all"
+DEPT_TARGET_PREFIX = "[부서] "
+
+def post_audience(target_type, target_value, author_id):
+    """공개 대상 설정으로 audience 배열을 만듭니다. target_value: ["아이디 (이름)", "[부서] 부서명", ...]"""
+    if target_type != "대상선택":
+        return [AUDIENCE_ALL]
+    keys = []
+    for target in target_value or []:
+        if target.startswith(DEPT_TARGET_PREFIX):
+            keys.append(f"dept:{target[len(DEPT_TARGET_PREFIX):]}")
+        else:
+            keys.append(f"user:{target.split(' (')[0]}")
+    if author_id:
+        keys.append(f"user:{author_id}")
+    return list(dict.fromkeys(keys))
+
+def department_targets(users):
+    """공지 대상 선택 목록에 추가할 부서 항목"""
+    depts = sorted({u.get("department") for u in users if u.get("department")})
+    return [f"{DEPT_TARGET_PREFIX}{d}" for d in depts]
+
+def viewer_keys(user_id, department=None):
+    keys = [AUDIENCE_ALL, f"user:{user_id}"]
+    if department:
+        keys.append(f"dept:{department}")
+    return keys
+
+def can_view(post, keys, is_admin=False):
+    """상세 조회 권한 확인 (URL로 직접 연 경우 포함)"""
+    if is_admin:
+        return True
+    audience = post.get("audience") or post_audience(post.get("target_type"), post.get("target_value"), post.get("author_id"))
+    return bool(set(audience) & set(keys))
+
+def _visible_query(db, keys, is_admin):
+    query = db.collection("posts")
+    if not is_admin:
+        query = query.where("audience", "array-contains-any", keys)
+    return query
+
+def load_pinned_posts(db, keys, is_admin=False):
+    """상단 고정(중요) 공지 목록 (최신순)"""
+    rows, _ = fetch_query_page(_visible_query(db, keys, is_admin).where("is_important", "==", True).select(LIST_FIELDS),
+                               "created_at", PINNED_LIMIT)
+    return rows
+
+def load_post_page(db, keys, is_admin=False, page_size=10, cursor=None):
+    """일반 공지 1페이지 (최신순). 반환: (목록, 다음 페이지 커서)"""
+    query = _visible_query(db, keys, is_admin).where("is_important", "==", False).select(LIST_FIELDS)
+    return fetch_query_page(query, "created_at", page_size, cursor)
+
+def count_posts(db, keys, is_admin=False):
+    """볼 수 있는 일반 공지 수 (집계 쿼리)"""
+    result = _visible_query(db, keys, is_admin).where("is_important", "==", False).count().get()
+    return int(result[0][0].value) if result else 0
+
+def search_posts(db, keys, is_admin=False, author="", keyword=""):
+    """볼 수 있는 최근 게시물 중 작성자/키워드(제목+내용) 조건에 맞는 글 (중요 공지 우선, 최신순)"""
+    fields = LIST_FIELDS + (["content"] if keyword else [])
+    rows, _ = fetch_query_page(_visible_query(db, keys, is_admin).select(fields), "created_at", SEARCH_SCAN_LIMIT)
+    found = [r for r in rows
+             if (not author or author in r.get('author', ''))
+             and (not keyword or keyword in f"{r.get('title', '')} {r.get('content', '')}")]
+    found.sort(key=lambda x: x.get('is_important', False), reverse=True) # 안정 정렬로 최신순 유지
+    return found
+
+def backfill_post_audience(db):
+    """audience가 없는 기존 게시물에 값을 채웁니다. 반환: 채운 문서 수"""
+    batch, n, filled = db.batch(), 0, 0
+    for snap in db.collection("posts").select(["target_type", "target_value", "author_id", "audience", "is_important"]).stream():
+        d = snap.to_dict()
+        updates = {}
+        if "audience" not in d:
+            updates["audience"] = post_audience(d.get("target_type"), d.get("target_value"), d.get("author_id"))
+        if "is_important" not in d:
+            updates["is_important"] = False # 목록 조회 조건(is_important ==)에 포함되도록
+        if updates:
+            batch.update(snap.reference, updates)
+            n += 1
+            filled += 1
+            if n >= 400:
+                batch.commit()
+                batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    db.collection("sync_state").document("post_audience").set({"backfilled_at": firestore.SERVER_TIMESTAMP})
+    return filled
+
+@st.cache_resource
+def _audience_ready():
+    return {"done": False}
+
+def ensure_post_audience(db):
+    """기존 게시물 audience 채우기를 최초 1회 실행합니다. (프로세스당 상태 문서 1회 확인)"""
+    state = _audience_ready()
+    if state["done"]:
+        return
+    if not db.collection("sync_state").document("post_audience").get().exists:
+        backfill_post_audience(db)
+    state["done"] = True
+
+def load_post(db, post_id):
+    """게시물 1건의 본문 포함 상세 (없으면 None)"""
+    snap = db.collection("posts").document(post_id).get(field_paths=DETAIL_FIELDS)
+    if not snap.exists:
+        return None
+    d = snap.to_dict()
+    d['id'] = snap.id
+    return d
+
+@st.cache_resource
+def _get_view_buffer():
+    buffer = {"lock": threading.Lock(), "counts": collections.Counter(), "since": time.time()}
+    atexit.register(_flush_at_exit) # 서버 종료 시 남은 조회수 반영
+    return buffer
+
+def _flush_at_exit():
+    try:
+        flush_views(get_db())
+    except Exception:
+        pass
+
+def record_view(db, post_id):
+    """조회수 1 증가를 버퍼에 기록합니다. (같은 세션에서 다시 열면 세지 않음)"""
+    viewed = st.session_state.setdefault("viewed_post_ids", set())
+    if post_id in viewed:
+        return
+    viewed.add(post_id)
+    buffer = _get_view_buffer()
+    with buffer["lock"]:
+        buffer["counts"][post_id] += 1
+        due = sum(buffer["counts"].values()) >= VIEW_FLUSH_COUNT or time.time() - buffer["since"] >= VIEW_FLUSH_SECONDS
+    if due:
+        flush_views(db)
+
+def pending_views(post_id):
+    """아직 반영되지 않은 조회수"""
+    return _get_view_buffer()["counts"].get(post_id, 0)
+
+def flush_views(db):
+    """버퍼의 조회수를 batch로 반영합니다. 반환: 반영한 게시물 수"""
+    buffer = _get_view_buffer()
+    with buffer["lock"]:
+        counts = dict(buffer["counts"])
+        buffer["counts"].clear()
+        buffer["since"] = time.time()
+    if not counts:
+        return 0
+    posts = db.collection("posts")
+    batch = db.batch()
+    for post_id, n in counts.items():
+        batch.update(posts.document(post_id), {"views": firestore.Increment(n)})
+    try:
+        batch.commit()
+    except NotFound:
+        # 그 사이 삭제된 게시물이 있으면 batch 전체가 실패하므로 건별로 다시 반영
+        for post_id, n in counts.items():
+            try:
+                posts.document(post_id).update({"views": firestore.Increment(n)})
+            except NotFound:
+                pass
+    return len(counts)
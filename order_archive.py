@@ -0,0 +1,109 @@
+import os
+import datetime
+import streamlit as st
+from firebase_admin import firestore
+from utils import get_db, mark_orders_reset
+
+# [NEW] 출고 이력 보관(아카이브) 컬렉션
+# 출고 후 ARCHIVE_AFTER_MONTHS개월이 지난 출고완료 건을 orders_archive로 옮겨,
+# 생산/재고/출고 화면의 일상 조회(orders)가 진행중인 작업과 최근 이력만 읽도록 합니다.
+# - 문서 ID는 그대로 유지하고 archived_at만 추가 (이동은 200건 단위 batch로 복사+삭제를 함께 커밋)
+# - 보관 경계(archived_before)는 sync_state/orders_archive에 기록
+# - 이력 화면은 stream_history()로 조회 기간이 경계 이전일 때만 보관 컬렉션을 함께 읽음
+# 보관된 건은 조회 전용입니다. (출고 취소 등 수정 대상에서 제외)
+
+ARCHIVE_COLLECTION = "orders_archive"
+ARCHIVE_STATUS = "출고완료"
+ARCHIVE_AFTER_MONTHS = int(os.environ.get("ORDER_ARCHIVE_MONTHS", "12"))
+ARCHIVE_CHUNK_SIZE = 200 # batch당 문서 수 (복사+삭제 = 400 쓰기)
+
+def _naive(dt):
+    return dt.replace(tzinfo=None) if getattr(dt, "tzinfo", None) else dt
+
+def _state_ref(db):
+    return db.collection("sync_state").document("orders_archive")
+
+def archive_cutoff(months=ARCHIVE_AFTER_MONTHS, today=None):
+    """보관 기준 시각: months개월 전 달의 1일 0시 (이 시각 이전 출고분이 보관 대상)"""
+    today = today or datetime.date.today()
+    y, m = divmod(today.year * 12 + today.month - 1 - months, 12)
+    return datetime.datetime(y, m + 1, 1)
+
+@st.cache_data(ttl=60) # 1분 동안 결과 캐싱
+def get_archived_before():
+    """보관 경계 시각 (보관된 건이 없으면 None)"""
+    snap = _state_ref(get_db()).get()
+    value = snap.to_dict().get("archived_before") if snap.exists else None
+    return _naive(value) if isinstance(value, datetime.datetime) else None
+
+def _archive_query(db, cutoff):
+    return db.collection("orders").where("status", "==", ARCHIVE_STATUS).where("shipping_date", "<", cutoff)
+
+def count_archive_targets(db, months=ARCHIVE_AFTER_MONTHS):
+    """보관 예정 건수를 집계 쿼리로 확인합니다. (실제 이동 없음)"""
+    result = _archive_query(db, archive_cutoff(months)).count().get()
+    return int(result[0][0].value) if result else 0
+
+def archive_shipped_orders(db, months=ARCHIVE_AFTER_MONTHS, progress_cb=None):
+    """
+    출고 후 months개월이 지난 출고완료 건을 보관 컬렉션으로 옮기고 옮긴 건수를 반환합니다.
+    progress_cb(옮긴건수)는 batch 커밋마다 호출됩니다.
+    """
+    cutoff = archive_cutoff(months)
+    prepared = False
+
+    def prepare():
+        # [FIX] 첫 batch 커밋 전에 경계와 재조회 표시를 먼저 기록
+        # (중간에 실패/중단되어도 이미 옮긴 건이 이력 조회에서 빠지지 않도록)
+        # 경계는 앞으로만 이동 (보관 기간을 늘려 다시 실행해도 이미 옮긴 건을 계속 함께 읽도록)
+        get_archived_before.clear()
+        prev = get_archived_before()
+        if prev is None or cutoff > prev:
+            _state_ref(db).set({"archived_before": cutoff, "archived_at": firestore.SERVER_TIMESTAMP}, merge=True)
+            get_archived_before.clear()
+        # 증분 동기화(fetch_order_changes) 측이 사라진 문서를 삭제로 오인하지 않도록 전체 재조회 표시
+        mark_orders_reset(db)
+
+    moved = 0
+    batch, n = db.batch(), 0
+    for doc in _archive_query(db, cutoff).stream():
+        batch.set(db.collection(ARCHIVE_COLLECTION).document(doc.id), {**doc.to_dict(), "archived_at": firestore.SERVER_TIMESTAMP})
+        batch.delete(doc.reference)
+        n += 1
+        if n >= ARCHIVE_CHUNK_SIZE:
+            if not prepared:
+                prepare()
+                prepared = True
+            batch.commit()
+            moved += n
+            batch, n = db.batch(), 0
+            if progress_cb:
+                progress_cb(moved)
+    if n:
+        if not prepared:
+            prepare()
+        batch.commit()
+        moved += n
+    if moved:
+        mark_orders_reset(db) # 이동 도중 전체 재조회한 측도 이후 삭제분을 다시 받도록 완료 시점에 한 번 더 표시
+    return moved
+
+def stream_history(db, live_query, archive_query=None, start_dt=None):
+    """
+    이력 조회용: orders 쿼리 결과에 보관 컬렉션 결과를 이어서 반환합니다. (문서 스냅샷)
+    archive_query(보관 컬렉션 참조 -> 쿼리)는 조회 시작일(start_dt)이 보관 경계 이전이거나 없을 때만 실행합니다.
+    """
+    yield from live_query.stream()
+    if archive_query is None:
+        return
+    archived_before = get_archived_before()
+    if archived_before is None or (start_dt is not None and _naive(start_dt) >= archived_before):
+        return
+    yield from archive_query(db.collection(ARCHIVE_COLLECTION)).stream()
+
+if __name__ == "__main__":
+    # python order_archive.py [보관개월수]  -> 예약 작업(cron 등)으로 주기 실행
+    import sys
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_MONTHS
+    count = archive_shipped_orders(get_db(), months, lambda n: print(f"{n:,}건 이동 중..."))
+    print(f"출고 후 {months}개월이 지난 {count:,}건을 보관했습니다.")
@@ -0,0 +1,254 @@
+import os
+import json
+import datetime
+import threading
+try: # type: ignore
+    import pyarrow as pa # type: ignore
+    import pyarrow.parquet as pq # type: ignore
+except ImportError:
+    pa = None
+    pq = None
+from utils import fetch_order_changes
+from order_archive import ARCHIVE_COLLECTION, get_archived_before, stream_history
+
+# [NEW] 마감된 출고 내역 로컬 캐시 (월별 Parquet)
+# 출고완료 후 CLOSED_AFTER_DAYS일이 지난 달은 더 이상 거의 바뀌지 않으므로,
+# 월 단위(month=YYYY-MM/orders.parquet)로 디스크에 저장해 두고 재시작/기간 변경 시에도 다시 읽지 않습니다.
+# - 변경 감지: updated_at 워터마크 이후 수정된 문서의 출고월 + 월별 건수(count 집계) 비교 (삭제/취소 감지)
+# - 조회: 기간에 해당하는 월 파일만 열고, 출고일 조건은 Parquet 필터(행 그룹 통계)로 적용
+# - 최근(마감 전) 구간은 기존처럼 Firestore에서 직접 조회
+# pyarrow가 없으면 전체 구간을 Firestore에서 조회합니다.
+
+CACHE_DIR = os.environ.get("ORDER_HISTORY_DIR", os.path.join(".cache", "order_history"))
+CLOSED_STATUS = "출고완료"
+CLOSED_AFTER_DAYS = 14
+CHECK_INTERVAL_SEC = 600 # 캐시된 월의 변경 확인 주기
+WATERMARK_MARGIN_SEC = 300 # 서버/로컬 시계 차이 여유
+
+_lock = threading.Lock()
+
+def _manifest_path():
+    return os.path.join(CACHE_DIR, "manifest.json")
+
+def _month_path(month):
+    return os.path.join(CACHE_DIR, f"month={month}", "orders.parquet")
+
+def _load_manifest():
+    try:
+        with open(_manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"months": {}}
+
+def _save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = _manifest_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, _manifest_path())
+
+def _naive(dt):
+    # Firestore 시간(UTC 표기, 현지 시각 저장)과 같은 기준으로 비교하기 위해 tz 제거
+    return dt.replace(tzinfo=None) if getattr(dt, "tzinfo", None) else dt
+
+def _utcnow():
+    # updated_at(SERVER_TIMESTAMP)과 비교하는 워터마크는 실제 UTC 시각으로 기록
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _month_range(month):
+    y, m = int(month[:4]), int(month[5:7])
+    start = datetime.datetime(y, m, 1)
+    end = datetime.datetime(y + 1, 1, 1) if m == 12 else datetime.datetime(y, m + 1, 1)
+    return start, end
+
+def _months_between(start_dt, end_dt):
+    months = []
+    y, m = start_dt.year, start_dt.month
+    while (y, m) <= (end_dt.year, end_dt.month):
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+def _closed_before():
+    """이 시각 이전에 끝난 달만 캐시 대상 (마감)"""
+    return datetime.datetime.now() - datetime.timedelta(days=CLOSED_AFTER_DAYS)
+
+def _month_queries(db, month):
+    start, end = _month_range(month)
+    # [NEW] 보관 경계 이전 달은 보관 컬렉션(orders_archive)도 함께 조회
+    archived_before = get_archived_before()
+    collections = ["orders"] + ([ARCHIVE_COLLECTION] if archived_before and start < archived_before else [])
+    return [db.collection(c).where("status", "==", CLOSED_STATUS)
+            .where("shipping_date", ">=", start).where("shipping_date", "<", end) for c in collections]
+
+# --- Parquet 변환 ---
+# 문서마다 필드 구성/타입이 다를 수 있으므로 열별로 타입을 정하고,
+# 타입이 섞였거나 목록/맵(shipping_cost_lines 등)인 열은 JSON 문자열로 저장합니다.
+
+def _column_type(values):
+    present = [v for v in values if v is not None]
+    if not present:
+        return pa.string()
+    if all(isinstance(v, bool) for v in present):
+        return pa.bool_()
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return pa.int64()
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return pa.float64()
+    if all(isinstance(v, datetime.datetime) for v in present):
+        return pa.timestamp("us", tz="UTC")
+    if all(isinstance(v, str) for v in present):
+        return pa.string()
+    return None # JSON
+
+def _to_table(docs):
+    # 빈 달도 출고일 필터를 적용할 수 있도록 id/shipping_date 열은 항상 생성
+    columns = sorted({k for d in docs for k in d} | {"id", "shipping_date"})
+    arrays, json_cols = {}, []
+    for col in columns:
+        values = [d.get(col) for d in docs]
+        col_type = _column_type(values)
+        if col == "shipping_date" and not any(v is not None for v in values):
+            col_type = pa.timestamp("us", tz="UTC")
+        if col_type is None:
+            json_cols.append(col)
+            values = [None if v is None else json.dumps(v, ensure_ascii=False, default=str) for v in values]
+            col_type = pa.string()
+        elif pa.types.is_timestamp(col_type):
+            values = [None if v is None else (v if v.tzinfo else v.replace(tzinfo=datetime.timezone.utc)) for v in values]
+        elif pa.types.is_float64(col_type):
+            values = [None if v is None else float(v) for v in values]
+        arrays[col] = pa.array(values, type=col_type)
+    table = pa.table(arrays)
+    return table.replace_schema_metadata({"json_columns": json.dumps(json_cols)})
+
+def _from_table(table):
+    meta = table.schema.metadata or {}
+    json_cols = set(json.loads(meta.get(b"json_columns", b"[]")))
+    rows = []
+    for rec in table.to_pylist():
+        # Firestore 문서처럼 값이 없는 필드는 키를 두지 않음
+        d = {k: v for k, v in rec.items() if v is not None}
+        for col in json_cols & d.keys():
+            d[col] = json.loads(d[col])
+        rows.append(d)
+    return rows
+
+def _fetch_month(db, month):
+    docs = []
+    for doc in (snap for q in _month_queries(db, month) for snap in q.stream()):
+        d = doc.to_dict()
+        d["id"] = doc.id
+        docs.append(d)
+    path = _month_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(_to_table(docs), tmp)
+    os.replace(tmp, path)
+    now = _utcnow().isoformat()
+    # checked_at: 이 시각 이후 updated_at이 바뀐 문서가 있으면 다시 받음 (월별 워터마크)
+    return {"count": len(docs), "fetched_at": now, "checked_at": now}
+
+# --- 동기화 ---
+
+def _stale_months(db, manifest, months):
+    """캐시된 월 중 변경된 월 목록 (증분 동기화 + 건수 비교)"""
+    stale = set()
+    # 1) 가장 오래된 워터마크 이후 수정된 문서의 출고월 (출고일 필드만 조회)
+    since = min(datetime.datetime.fromisoformat(manifest["months"][m]["checked_at"]) for m in months)
+    since -= datetime.timedelta(seconds=WATERMARK_MARGIN_SEC)
+    changes = fetch_order_changes(db, since, fields=["shipping_date"])
+    if changes["reset"]:
+        return set(months)
+    for d in changes["changed"]:
+        s_date = d.get("shipping_date")
+        if isinstance(s_date, datetime.datetime):
+            stale.add(_naive(s_date).strftime("%Y-%m"))
+    # 2) updated_at 없이 바뀐 문서/삭제/출고취소는 건수 차이로 감지 (집계 쿼리)
+    for m in months:
+        if m in stale:
+            continue
+        count = 0
+        for q in _month_queries(db, m):
+            result = q.count().get()
+            count += int(result[0][0].value) if result else 0
+        if count != manifest["months"][m]["count"]:
+            stale.add(m)
+    return stale & set(months)
+
+def sync_order_history(db, months):
+    """마감된 월 중 캐시에 없거나 변경된 월만 Firestore에서 다시 받아 저장합니다. 반환: 새로 받은 월 목록"""
+    closed_before = _closed_before()
+    months = [m for m in months if _month_range(m)[1] <= closed_before]
+    now = _utcnow()
+    with _lock:
+        manifest = _load_manifest()
+        cached = manifest["months"]
+        refresh = {m for m in months if m not in cached or not os.path.exists(_month_path(m))}
+        due = [m for m in months if m not in refresh and
+               (now - datetime.datetime.fromisoformat(cached[m]["checked_at"])).total_seconds() >= CHECK_INTERVAL_SEC]
+        if due:
+            refresh |= _stale_months(db, manifest, due)
+            for m in due:
+                cached[m]["checked_at"] = now.isoformat()
+        for m in sorted(refresh):
+            cached[m] = _fetch_month(db, m)
+        if refresh or due:
+            _save_manifest(manifest)
+    return sorted(refresh)
+
+def mark_history_stale(dates):
+    """출고/출고취소 등으로 바뀐 출고일의 월을 다음 조회 시 다시 받도록 표시합니다."""
+    months = {_naive(d).strftime("%Y-%m") for d in dates if isinstance(d, datetime.datetime)}
+    if not months or pq is None:
+        return
+    with _lock:
+        manifest = _load_manifest()
+        if any(manifest["months"].pop(m, None) is not None for m in months):
+            _save_manifest(manifest)
+
+def _read_months(months, start_dt, end_dt):
+    start = datetime.datetime.combine(start_dt, datetime.time.min) if not isinstance(start_dt, datetime.datetime) else start_dt
+    end = datetime.datetime.combine(end_dt, datetime.time.max) if not isinstance(end_dt, datetime.datetime) else end_dt
+    filters = [("shipping_date", ">=", start.replace(tzinfo=datetime.timezone.utc)),
+               ("shipping_date", "<=", end.replace(tzinfo=datetime.timezone.utc))]
+    rows = []
+    for m in months:
+        rows.extend(_from_table(pq.read_table(_month_path(m), filters=filters)))
+    return rows
+
+def load_shipped_orders(db, start_dt, end_dt):
+    """
+    출고일 기준 기간의 출고완료 문서 목록을 반환합니다.
+    마감된 월은 로컬 Parquet 캐시에서, 최근 구간은 Firestore에서 읽습니다.
+    """
+    months = _months_between(start_dt, end_dt) if start_dt <= end_dt else []
+    closed_before = _closed_before()
+    closed = [m for m in months if _month_range(m)[1] <= closed_before] if pq is not None else []
+    rows = []
+    live_start = start_dt
+    if closed:
+        sync_order_history(db, closed)
+        rows = _read_months(closed, start_dt, end_dt)
+        live_start = max(start_dt, _month_range(closed[-1])[1])
+    if live_start <= end_dt:
+        docs = stream_history(
+            db, db.collection("orders").where("shipping_date", ">=", live_start).where("shipping_date", "<=", end_dt),
+            lambda col: col.where("shipping_date", ">=", live_start).where("shipping_date", "<=", end_dt), live_start)
+        for doc in docs:
+            d = doc.to_dict()
+            if d.get("status") != CLOSED_STATUS:
+                continue
+            d["id"] = doc.id
+            rows.append(d)
+    return rows
+
+def first_shipped_date(db):
+    """가장 오래된 출고일 (전체 기간 조회 시 시작일로 사용)"""
+    dates = []
+    for col in ("orders", ARCHIVE_COLLECTION):
+        docs = list(db.collection(col).order_by("shipping_date").limit(1).stream())
+        s_date = docs[0].to_dict().get("shipping_date") if docs else None
+        if isinstance(s_date, datetime.datetime):
+            dates.append(_naive(s_date))
+    return min(dates) if dates else None
@@ -0,0 +1,285 @@
+import datetime
+import hashlib
+import time
+import concurrent.futures
+import pandas as pd
+from firebase_admin import firestore
+from utils import allocate_order_numbers, stamp_updated_at, mark_orders_reset
+from production_log import weaving_end_date, index_production_dates, PRODUCTION_STATUSES
+from stats_rollup import record_stats_changes, flag_stats_rebuild
+from inventory_summary import record_inventory_changes, flag_inventory_rebuild
+from machine_status import record_machine_changes, WEAVING_STATUS
+
+# [NEW] 발주 엑셀 일괄 등록 엔진
+# 1) 검증/제품 매핑을 DataFrame 단위(벡터 연산)로 처리하고 행별 오류를 수집
+# 2) 발주번호를 한 번에 예약한 뒤 400건 단위 batch를 병렬(최대 4개)로 커밋
+# 3) 작업 상태(import_jobs/{job_id})에 완료된 묶음을 기록하여, 중단 시 이어서 등록
+#    (문서 ID가 작업ID+행번호로 고정되므로 같은 묶음을 다시 커밋해도 중복되지 않음)
+# 4) 커밋된 묶음의 통계/재고 요약 증감과 제직기 잠금(제직중 건)은 완료 표시와 같은 batch로 기록 (전체 재계산 없이 등록분만 반영, 이어서 등록해도 중복 반영 없음)
+
+IMPORT_CHUNK_SIZE = 400
+IMPORT_MAX_WORKERS = 4
+
+def file_job_id(file_bytes):
+    """업로드 파일 내용으로 작업 ID를 만듭니다. (같은 파일 = 같은 작업)"""
+    return "imp_" + hashlib.md5(file_bytes).hexdigest()[:16]
+
+def _col(df, name, default=None):
+    if name in df.columns:
+        return df[name]
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+def _to_str(series):
+    # 기존 str(val) 변환과 동일하게 처리하되 빈 값/nan은 ""로 정리
+    s = series.astype(str)
+    return s.where(series.notna() & (s != "nan"), "")
+
+def _to_datetime(series):
+    try:
+        parsed = pd.to_datetime(series, errors="coerce", format="mixed")
+    except (TypeError, ValueError):
+        parsed = pd.to_datetime(series, errors="coerce")
+    return [t.to_pydatetime() if pd.notna(t) else None for t in parsed]
+
+def _to_date_str(series):
+    blank = series.isna() | (series.astype(str).str.strip() == "")
+    return series.astype(str).str[:10].where(~blank, "")
+
+def _to_number(series, label, row_nos, errors):
+    num = pd.to_numeric(series, errors="coerce")
+    bad = series.notna() & (series.astype(str).str.strip() != "") & num.isna()
+    for r in row_nos[bad.to_numpy()]:
+        errors.append({"행": int(r), "오류": f"{label} 값이 숫자가 아닙니다."})
+    return num
+
+def build_import_docs(df_upload, products_data):
+    """
+    엑셀 DataFrame을 발주 문서 목록으로 변환합니다.
+    반환: (rows, errors) - rows는 [(엑셀 행번호, 문서 dict)], errors는 [{"행", "오류"}]
+    """
+    df = df_upload.reset_index(drop=True)
+    row_nos = (df.index + 2).to_numpy() # 엑셀 행 번호 (헤더 1행)
+    errors = []
+
+    # 제품코드 -> 제품 정보 매핑 (벡터 조인)
+    p_code = _to_str(_col(df, "제품코드", "")).str.strip()
+    df_prod = pd.DataFrame(products_data)
+    for c in ["product_code", "product_type", "weaving_type", "yarn_type", "weight", "size"]:
+        if c not in df_prod.columns: df_prod[c] = None
+    df_prod["product_type"] = df_prod["product_type"].fillna(df_prod["weaving_type"])
+    df_prod = df_prod.drop_duplicates("product_code").set_index("product_code").astype(object)
+    matched = p_code.isin(df_prod.index)
+    prod = df_prod.reindex(p_code)
+    prod = prod.where(prod.notna(), None)
+    prod.index = df.index
+
+    for r, code in zip(row_nos[~matched.to_numpy()], p_code[~matched]):
+        errors.append({"행": int(r), "오류": f"제품코드 '{code}'가 존재하지 않습니다."})
+
+    stock_raw = _col(df, "수량", 0)
+    stock = _to_number(stock_raw, "수량", row_nos, errors)
+    blank_stock = stock_raw.isna() | (stock_raw.astype(str).str.strip() == "")
+    for r in row_nos[blank_stock.to_numpy()]:
+        errors.append({"행": int(r), "오류": "수량이 입력되지 않았습니다."})
+    machine_no = _to_number(_col(df, "제직기번호"), "제직기번호", row_nos, errors)
+    real_stock = _to_number(_col(df, "생산수량"), "생산수량", row_nos, errors)
+    prod_weight = _to_number(_col(df, "생산중량"), "생산중량", row_nos, errors)
+    ship_cost = _to_number(_col(df, "운임비"), "운임비", row_nos, errors)
+
+    status = _to_str(_col(df, "현재상태", "발주접수")).str.strip().replace("", "발주접수")
+    now = datetime.datetime.now()
+    reg_dates = [d or now for d in _to_datetime(_col(df, "접수일자"))]
+    weaving_end = _to_datetime(_col(df, "제직완료일"))
+
+    columns = {
+        "product_code": p_code.tolist(),
+        "product_type": prod["product_type"].tolist(),
+        "yarn_type": prod["yarn_type"].tolist(),
+        "weight": prod["weight"].tolist(),
+        "size": prod["size"].tolist(),
+        "date": reg_dates,
+        "order_type": _to_str(_col(df, "구분", "")).tolist(),
+        "customer": _to_str(_col(df, "발주처", "")).tolist(),
+        "delivery_req_date": _to_str(_col(df, "납품요청일", "")).tolist(),
+        "name": _to_str(_col(df, "제품명(고객용)", "")).tolist(),
+        "color": _to_str(_col(df, "색상", "")).tolist(),
+        "stock": [int(v) if pd.notna(v) else 0 for v in stock],
+        "delivery_to": _to_str(_col(df, "납품처", "")).tolist(),
+        "delivery_contact": _to_str(_col(df, "납품연락처", "")).tolist(),
+        "delivery_address": _to_str(_col(df, "납품주소", "")).tolist(),
+        "note": _to_str(_col(df, "비고", "")).tolist(),
+        "status": status.tolist(),
+        # 상세 정보 매핑 (과거 데이터)
+        "machine_no": [int(v) if pd.notna(v) else None for v in machine_no],
+        "weaving_end_time": weaving_end,
+        "weaving_end_date": [weaving_end_date(v) for v in weaving_end],
+        "real_stock": [int(v) if pd.notna(v) else 0 for v in real_stock],
+        "prod_weight_kg": [float(v) if pd.notna(v) else 0.0 for v in prod_weight],
+        "dyeing_partner": _to_str(_col(df, "염색업체", "")).tolist(),
+        "dyeing_in_date": _to_date_str(_col(df, "염색입고일")).tolist(),
+        "sewing_partner": _to_str(_col(df, "봉제업체", "")).tolist(),
+        "sewing_end_date": _to_date_str(_col(df, "봉제완료일")).tolist(),
+        "shipping_date": _to_datetime(_col(df, "출고일")),
+        "shipping_method": _to_str(_col(df, "배송방법", "")).tolist(),
+        "shipping_carrier": _to_str(_col(df, "배송업체", "")).tolist(),
+        "shipping_cost": [int(v) if pd.notna(v) else 0 for v in ship_cost],
+    }
+
+    error_rows = {e["행"] for e in errors}
+    keys = list(columns.keys())
+    rows = []
+    for i, values in enumerate(zip(*columns.values())):
+        if int(row_nos[i]) in error_rows: continue
+        rows.append((int(row_nos[i]), dict(zip(keys, values))))
+
+    errors.sort(key=lambda e: e["행"])
+    return rows, errors
+
+def get_import_job(db, job_id):
+    doc = db.collection("import_jobs").document(job_id).get()
+    return doc.to_dict() if doc.exists else None
+
+def start_import_job(db, job_id, file_name, rows):
+    """발주번호를 한 번의 트랜잭션으로 예약하고 작업 상태 문서를 생성합니다."""
+    order_nos = allocate_order_numbers(db, len(rows))
+    job = {
+        "file_name": file_name,
+        "row_nos": [r for r, _ in rows],
+        "order_nos": order_nos,
+        "total": len(rows),
+        "chunk_size": IMPORT_CHUNK_SIZE,
+        "committed_chunks": [],
+        "status": "진행중",
+        "created_at": datetime.datetime.now(),
+    }
+    db.collection("import_jobs").document(job_id).set(job)
+    return job
+
+def _commit_chunk_rollups(db, job_ref, chunk_idx, chunk_docs):
+    """
+    커밋된 묶음의 통계/재고 요약 증감, 제직기 상태와 완료 표시를 한 batch로 기록합니다.
+    함께 반영되거나 함께 실패하므로, 같은 묶음을 이어서 등록해도 집계가 두 번 더해지지 않습니다.
+    반환: 다른 작업이 사용 중이라 제직기 현황에 반영하지 못한 안내 메시지 목록
+    """
+    batch = db.batch()
+    changes = [(None, data) for _, data in chunk_docs]
+    record_stats_changes(db, changes, batch)
+    record_inventory_changes(db, changes, batch)
+    # 제직중 건이 있는 묶음만 제직기 상태 문서를 읽어 잠금
+    weaving = [({"id": doc_id}, data) for doc_id, data in chunk_docs if data.get("status") == WEAVING_STATUS]
+    conflicts = record_machine_changes(db, weaving, batch) if weaving else []
+    batch.update(job_ref, {"committed_chunks": firestore.ArrayUnion([chunk_idx])})
+    batch.commit()
+    return conflicts
+
+def run_import_job(db, job_id, job, rows, progress_cb=None):
+    """
+    완료되지 않은 묶음만 병렬로 커밋합니다.
+    progress_cb(완료건수, 전체건수, 초당처리건수)는 스크립트 스레드에서 호출됩니다.
+    이어서 등록할 때 작업 생성 후 제품 정보 변경 등으로 검증을 통과하지 못하게 된 행은 등록하지 않고 건너뜁니다.
+    반대로 작업 생성 당시 검증 오류였다가 지금은 통과하는 행은 발주번호가 예약되지 않았으므로 등록하지 않고 따로 반환합니다.
+    전체건수는 실제 등록 대상(건너뛴 행 제외) 기준입니다.
+    반환: (이번에 등록한 건수, 실패한 묶음 목록, 건너뛴 행 번호 목록, 작업에 포함되지 않은 행 번호 목록, 제직기 충돌 안내 목록)
+    """
+    docs_by_row = dict(rows)
+    chunk_size = job.get("chunk_size", IMPORT_CHUNK_SIZE)
+    row_nos = job["row_nos"]
+    order_nos = job["order_nos"]
+    done_chunks = set(job.get("committed_chunks", []))
+    job_ref = db.collection("import_jobs").document(job_id)
+    # [FIX] 이 작업의 행 목록에 없는 행 (작업 생성 후 검증 오류가 해소된 행)
+    job_rows = set(row_nos)
+    not_in_job = sorted(r for r in docs_by_row if r not in job_rows)
+
+    # batch 구성은 현재 스레드에서, 커밋만 작업 스레드에서 수행
+    pending = []
+    skipped = []
+    for chunk_idx, start in enumerate(range(0, len(row_nos), chunk_size)):
+        if chunk_idx in done_chunks: continue
+        batch = db.batch()
+        chunk_docs = []
+        for row_no, order_no in zip(row_nos[start:start + chunk_size], order_nos[start:start + chunk_size]):
+            # [FIX] 작업 생성 시에는 유효했으나 지금은 검증 오류인 행 (예약된 발주번호는 사용하지 않음)
+            if row_no not in docs_by_row:
+                skipped.append(row_no)
+                continue
+            doc_id = f"{job_id}_{row_no:06d}"
+            data = stamp_updated_at({**docs_by_row[row_no], "order_no": order_no})
+            batch.set(db.collection("orders").document(doc_id), data)
+            chunk_docs.append((doc_id, data))
+        pending.append((chunk_idx, batch, chunk_docs))
+
+    # [FIX] 완료/전체 건수에서 건너뛴 행 제외 (이전 실행에서 건너뛴 행 포함)
+    prev_skipped = set(job.get("skipped_rows", []))
+    done = sum(1 for i in done_chunks for r in row_nos[i * chunk_size:(i + 1) * chunk_size] if r not in prev_skipped)
+    total = done + sum(len(chunk_docs) for _, _, chunk_docs in pending)
+    started = time.time()
+    written_now = 0
+    failed = []
+    machine_conflicts = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=IMPORT_MAX_WORKERS) as pool:
+        futures = {pool.submit(batch.commit): (chunk_idx, chunk_docs) for chunk_idx, batch, chunk_docs in pending}
+        for fut in concurrent.futures.as_completed(futures):
+            chunk_idx, chunk_docs = futures[fut]
+            try:
+                fut.result()
+                # [FIX] 행 체크포인트(커밋된 묶음 번호)와 집계 증감을 함께 기록
+                machine_conflicts += _commit_chunk_rollups(db, job_ref, chunk_idx, chunk_docs)
+            except Exception as e:
+                # 집계 기록이 실패한 묶음도 완료 표시가 없으므로 이어서 등록 시 문서와 집계를 다시 반영
+                failed.append((chunk_idx, str(e)))
+                continue
+            n = len(chunk_docs)
+            done += n
+            written_now += n
+            if progress_cb:
+                elapsed = max(time.time() - started, 1e-6)
+                progress_cb(done, total, written_now / elapsed)
+
+    # [NEW] 과거 제직 실적이 포함된 경우 생산일지 날짜 색인에 추가
+    job_docs = [docs_by_row[r] for r in row_nos if r in docs_by_row]
+    index_production_dates(db, {d.get("weaving_end_date") for d in job_docs
+                                if d.get("status") in PRODUCTION_STATUSES})
+    if skipped:
+        job_ref.update({"skipped_rows": firestore.ArrayUnion(skipped)})
+    if not failed:
+        job_ref.update({"status": "완료", "completed_at": datetime.datetime.now()})
+    return written_now, failed, skipped, not_in_job, machine_conflicts
+
+# [NEW] '기존 데이터 삭제 후 업로드' 삭제 처리
+# 보존할 상태를 제외한 문서만 서버에서 조회하고(not-in), 필드 없이 문서 참조만 받아
+# BulkWriter로 병렬 삭제합니다. (보존 대상인 출고완료 이력 등은 읽지 않음)
+
+def _purge_query(db, preserve_statuses):
+    preserve = list(preserve_statuses)
+    # 제직완료 보존 시 롤 분할 후 남은 부모 문서(Master)도 함께 보존
+    if "제직완료" in preserve:
+        preserve.append("제직완료(Master)")
+    query = db.collection("orders")
+    if preserve:
+        query = query.where("status", "not-in", preserve)
+    return query
+
+def count_purge_targets(db, preserve_statuses):
+    """삭제 예정 건수를 집계 쿼리로 확인합니다. (실제 삭제 없음)"""
+    result = _purge_query(db, preserve_statuses).count().get()
+    return int(result[0][0].value) if result else 0
+
+def purge_orders(db, preserve_statuses, progress_cb=None):
+    """보존 상태를 제외한 발주 문서를 삭제하고 삭제 건수를 반환합니다."""
+    writer = db.bulk_writer()
+    writer.on_write_error(lambda failure, _writer: failure.attempts < 5)
+    deleted = 0
+    for snap in _purge_query(db, preserve_statuses).select([]).stream():
+        writer.delete(snap.reference)
+        deleted += 1
+        if progress_cb and deleted % 500 == 0:
+            progress_cb(deleted)
+    writer.close()
+    # 개별 삭제 기록(tombstone) 대신 초기화 시점을 남겨, 증분 동기화 측이 전체를 다시 받도록 함
+    if deleted:
+        mark_orders_reset(db)
+        # [FIX] 삭제 문서 내용을 읽지 않으므로 통계/재고 요약은 증분 반영 대신 재계산 필요 표시만 남김
+        flag_stats_rebuild(db)
+        flag_inventory_rebuild(db)
+    return deleted
@@ -0,0 +1,156 @@
+import streamlit as st
+from firebase_admin import firestore
+import threading
+import collections
+import time
+from utils import get_db
+from db_usage import track_db_usage
+
+# [NEW] 진행중(미출고) 발주 건의 프로세스 공용 메모리 미러
+# 생산/재고 화면이 rerun마다 상태별로 orders를 다시 조회하지 않도록,
+# Firestore 스냅샷 리스너로 미출고 건 전체를 메모리에 유지하고 상태/발주처/제직기별로 색인합니다.
+# ('제직완료(Master)'는 롤 분할 후 남는 부모 문서로 작업 대상이 아니므로 제외)
+
+ACTIVE_STATUSES = ["발주접수", "제직대기", "제직중", "제직완료", "염색출고", "염색중", "염색완료", "봉제중", "봉제완료"]
+_INDEX_FIELDS = ("status", "customer", "machine_no")
+# [FIX] 리스너가 시작되지 못하는 경우(권한/네트워크, 재시작 반복) 화면마다 오래 멈추지 않도록 준비 대기 시간 제한
+READY_TIMEOUT = 10.0 # 미러 인스턴스당 최초 1회 대기
+READY_RETRY_TIMEOUT = 0.5 # 이후 대기 (다른 세션이 최초 대기 중인 경우, 최근 실패 후 다시 만든 미러)
+READY_RETRY_AFTER_SEC = 60 # 대기에 실패한 뒤 이 시간 안에 새로 만든 미러는 짧게만 대기
+
+class OrderMirror:
+    _gave_up_at = None # 마지막으로 대기에 실패한 시각 (프로세스 공용, 리스너 재생성 시 참고)
+
+    def __init__(self, db):
+        self._cond = threading.Condition()
+        self._docs = {}
+        self._index = {f: collections.defaultdict(set) for f in _INDEX_FIELDS}
+        self._ready = False
+        self._wait_started = False
+        self._gave_up = False
+        self._read_time = None
+        query = db.collection("orders").where("status", "in", ACTIVE_STATUSES)
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def _index_key(self, field, value):
+        # 제직기 번호는 문자열/숫자가 섞여 저장될 수 있으므로 문자열로 통일
+        return str(value) if field == "machine_no" else value
+
+    def _remove(self, doc_id):
+        old = self._docs.pop(doc_id, None)
+        if old is None:
+            return
+        for f in _INDEX_FIELDS:
+            key = self._index_key(f, old.get(f))
+            ids = self._index[f].get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._index[f][key]
+
+    def _add(self, doc_id, data):
+        self._docs[doc_id] = data
+        for f in _INDEX_FIELDS:
+            self._index[f][self._index_key(f, data.get(f))].add(doc_id)
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        with self._cond:
+            for change in changes:
+                doc = change.document
+                self._remove(doc.id)
+                if change.type.name != "REMOVED":
+                    d = doc.to_dict()
+                    d['id'] = doc.id
+                    self._add(doc.id, d)
+            self._read_time = read_time
+            self._ready = True
+            self._cond.notify_all()
+
+    def is_healthy(self):
+        return getattr(self._watch, "is_active", True)
+
+    def wait_ready(self):
+        """
+        첫 스냅샷 수신까지 대기합니다.
+        최초 1회만 READY_TIMEOUT까지 기다리고 이후에는 READY_RETRY_TIMEOUT만 기다리며,
+        대기에 실패한 뒤에는 (준비될 때까지) 기다리지 않고 False를 반환하여 호출측이 바로 직접 조회하도록 합니다.
+        """
+        with self._cond:
+            if self._ready:
+                return True
+            if self._gave_up:
+                return False
+            recently_failed = OrderMirror._gave_up_at is not None and time.monotonic() - OrderMirror._gave_up_at < READY_RETRY_AFTER_SEC
+            first = not self._wait_started and not recently_failed
+            self._wait_started = True
+            ready = self._cond.wait_for(lambda: self._ready, timeout=READY_TIMEOUT if first else READY_RETRY_TIMEOUT)
+            if not ready:
+                self._gave_up = True
+                OrderMirror._gave_up_at = time.monotonic()
+            return ready
+
+    def wait_until_current(self, db, timeout=2.0):
+        """
+        가장 최근에 수정된 발주 문서가 스냅샷에 반영될 때까지 대기합니다. (직접 수정한 내용을 바로 다시 읽을 때 사용)
+        [FIX] 로컬 시계 대신 서버 시각(updated_at)끼리 비교하고, 미러와 무관한 수정(미출고 건이 아니었고 지금도 아님)이면 기다리지 않습니다.
+        """
+        query = db.collection("orders").order_by("updated_at", direction=firestore.Query.DESCENDING).select(["status", "updated_at"]).limit(1)
+        latest = next(iter(query.stream()), None)
+        if latest is None:
+            return True
+        d = latest.to_dict()
+        target = d.get("updated_at")
+        with self._cond:
+            if target is None or (d.get("status") not in ACTIVE_STATUSES and latest.id not in self._docs):
+                return True
+            return self._cond.wait_for(lambda: self._read_time is not None and self._read_time >= target, timeout=timeout)
+
+    def query(self, statuses=None, customer=None, machine_no=None):
+        """조건에 맞는 발주 건을 문서 ID 순으로 반환합니다. (반환값은 사본)"""
+        with self._cond:
+            candidates = None
+            if statuses is not None:
+                candidates = set()
+                for s in statuses:
+                    candidates |= self._index["status"].get(s, set())
+            for field, value in (("customer", customer), ("machine_no", machine_no)):
+                if value is None:
+                    continue
+                ids = self._index[field].get(self._index_key(field, value), set())
+                candidates = set(ids) if candidates is None else candidates & ids
+            if candidates is None:
+                candidates = self._docs.keys()
+            return [dict(self._docs[i]) for i in sorted(candidates)]
+
+@st.cache_resource(validate=lambda m: m.is_healthy())
+@track_db_usage
+def get_order_mirror():
+    return OrderMirror(get_db())
+
+def get_active_orders(db, statuses, customer=None, machine_no=None):
+    """
+    미출고 발주 건을 상태(및 발주처/제직기) 조건으로 조회합니다.
+    미러가 준비되지 않은 경우 Firestore를 직접 조회합니다. (준비 대기는 미러당 최초 1회만 길게)
+    """
+    statuses = [statuses] if isinstance(statuses, str) else list(statuses)
+    if all(s in ACTIVE_STATUSES for s in statuses):
+        mirror = get_order_mirror()
+        if mirror.wait_ready():
+            return mirror.query(statuses, customer=customer, machine_no=machine_no)
+
+    query = db.collection("orders")
+    query = query.where("status", "==", statuses[0]) if len(statuses) == 1 else query.where("status", "in", statuses)
+    # [최적화] 발주처 조건은 서버에서 필터 (파트너 계정이 전체 공장 물량을 읽지 않도록, customer+status 인덱스)
+    if customer is not None:
+        query = query.where("customer", "==", customer)
+    rows = []
+    for doc in query.stream():
+        d = doc.to_dict()
+        if machine_no is not None and str(d.get("machine_no")) != str(machine_no): continue
+        d['id'] = doc.id
+        rows.append(d)
+    return rows
+
+def sync_order_mirror():
+    """발주 건 수정 직후 rerun 전에 호출하여, 다음 화면이 변경 내용을 반영한 미러를 읽도록 합니다."""
+    get_order_mirror().wait_until_current(get_db())
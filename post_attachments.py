@@ -0,0 +1,101 @@
+import os
+import base64
+from firebase_admin import firestore
+
+# [NEW] 공지사항 첨부파일 분할 저장소
+# 첨부파일을 게시물 문서(posts) 밖의 하위 컬렉션 posts/{게시물ID}/attachment_chunks에 900KB 단위 바이너리로 나누어 저장합니다.
+# 게시물 문서에는 file_name/file_size/file_chunks 메타데이터만 남으므로 목록 조회 시 파일 내용을 읽지 않고,
+# 파일 내용은 다운로드 버튼을 누를 때만 조각을 순서대로 읽어 합칩니다. (문서 1MB 제한과 무관하게 큰 파일 첨부 가능)
+# 기존 게시물의 file_data(Base64) 첨부는 읽기를 계속 지원하며, migrate_inline_attachments()로 옮깁니다. (python post_attachments.py)
+
+CHUNK_COLLECTION = "attachment_chunks"
+CHUNK_SIZE = 900 * 1024 # 조각당 바이트 (Firestore 문서 1MB 제한 이내)
+CHUNKS_PER_BATCH = 8 # batch 요청 크기 제한(10MB) 이내
+MAX_ATTACHMENT_SIZE = int(os.environ.get("ATTACHMENT_MAX_MB", "20")) * 1024 * 1024
+
+def _chunks_ref(post_ref):
+    return post_ref.collection(CHUNK_COLLECTION)
+
+def _chunk_id(seq):
+    return f"{seq:05d}" # 문서 ID 순서 = 조각 순서
+
+def has_attachment(post):
+    return bool(post.get("file_name"))
+
+def save_attachment(db, post_ref, file_name, data):
+    """
+    파일 내용을 조각으로 저장하고 게시물에 넣을 메타데이터 dict를 반환합니다.
+    같은 게시물의 기존 첨부보다 조각 수가 적으면 남는 조각을 삭제합니다.
+    """
+    count = (len(data) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    chunks = _chunks_ref(post_ref)
+    batch, n = db.batch(), 0
+    for seq in range(count):
+        batch.set(chunks.document(_chunk_id(seq)), {"seq": seq, "data": data[seq * CHUNK_SIZE:(seq + 1) * CHUNK_SIZE]})
+        n += 1
+        if n >= CHUNKS_PER_BATCH:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    _delete_chunks(db, post_ref, start=count)
+    return {"file_name": file_name, "file_size": len(data), "file_chunks": count}
+
+def chunk_refs(post_ref, start=0):
+    """첨부파일 조각 문서 참조 목록 (start번째 조각부터)"""
+    return [snap.reference for snap in _chunks_ref(post_ref).where("seq", ">=", start).select([]).stream()]
+
+def _delete_chunks(db, post_ref, start=0):
+    batch, n = db.batch(), 0
+    for ref in chunk_refs(post_ref, start):
+        batch.delete(ref)
+        n += 1
+        if n >= 400:
+            batch.commit()
+            batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+
+def delete_attachment(db, post_ref):
+    """첨부파일 조각을 모두 삭제하고 게시물에서 지울 필드 dict를 반환합니다."""
+    _delete_chunks(db, post_ref)
+    return {f: firestore.DELETE_FIELD for f in ("file_name", "file_size", "file_chunks", "file_data")}
+
+def delete_post(db, post_id):
+    """게시물과 첨부파일 조각을 함께 삭제합니다."""
+    post_ref = db.collection("posts").document(post_id)
+    _delete_chunks(db, post_ref)
+    post_ref.delete()
+
+def load_attachment(db, post):
+    """첨부파일 내용(bytes). 조각 저장분은 순서대로 읽어 합치고, 기존 Base64 첨부는 디코딩합니다."""
+    post_ref = db.collection("posts").document(post["id"])
+    if not post.get("file_chunks"):
+        # 기존 Base64 첨부 (목록 조회에서 file_data를 제외한 경우 문서에서 다시 읽음)
+        file_data = post.get("file_data") or (post_ref.get(["file_data"]).to_dict() or {}).get("file_data")
+        return base64.b64decode(file_data) if file_data else b""
+    return b"".join(snap.to_dict()["data"] for snap in _chunks_ref(post_ref).order_by("seq").stream())
+
+def attachment_loader(db, post):
+    """st.download_button(data=...)에 넘길 지연 로더 (버튼을 누를 때만 조각을 읽음)"""
+    return lambda: load_attachment(db, post)
+
+def format_size(size):
+    if not size:
+        return ""
+    return f"{size / 1024 / 1024:.1f}MB" if size >= 1024 * 1024 else f"{size / 1024:.0f}KB"
+
+def migrate_inline_attachments(db):
+    """posts 문서의 file_data(Base64) 첨부를 조각 저장소로 옮깁니다. 반환: 옮긴 게시물 수"""
+    moved = 0
+    for snap in db.collection("posts").where("file_data", ">", "").stream():
+        d = snap.to_dict()
+        meta = save_attachment(db, snap.reference, d.get("file_name") or "attachment", base64.b64decode(d["file_data"]))
+        snap.reference.update({**meta, "file_data": firestore.DELETE_FIELD})
+        moved += 1
+    return moved
+
+if __name__ == "__main__":
+    from utils import get_db
+    count = migrate_inline_attachments(get_db())
+    print(f"첨부파일 {count:,}건을 분할 저장소로 옮겼습니다.")
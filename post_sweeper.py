@@ -0,0 +1,64 @@
+import os
+import datetime
+import threading
+import streamlit as st
+from utils import get_db
+from post_attachments import chunk_refs
+
+# [NEW] 만료 게시물 정리 작업
+# 게시 종료일(expiration_date)이 지난 공지사항과 첨부파일 조각을 batch로 삭제합니다.
+# 공지사항 화면을 열 때마다 삭제하던 방식 대신, 프로세스당 1개의 백그라운드 스레드가 주기적으로 실행합니다.
+# (앱 시작 시 start_post_sweeper() 호출, 예약 작업으로 돌릴 때는 python post_sweeper.py)
+# 정리 전까지의 만료 게시물은 목록에서 제외하여 표시합니다.
+
+SWEEP_INTERVAL_SEC = int(os.environ.get("POST_SWEEP_INTERVAL_SEC", "600")) # 10분
+SWEEP_BATCH_SIZE = 400
+
+def sweep_expired_posts(db, now=None):
+    """만료된 게시물과 첨부파일 조각을 삭제합니다. 반환: 삭제한 게시물 수"""
+    now = now or datetime.datetime.now()
+    batch, n, deleted = db.batch(), 0, 0
+    for snap in db.collection("posts").where("expiration_date", "<", now).select([]).stream():
+        for ref in chunk_refs(snap.reference) + [snap.reference]:
+            batch.delete(ref)
+            n += 1
+            if n >= SWEEP_BATCH_SIZE:
+                batch.commit()
+                batch, n = db.batch(), 0
+        deleted += 1
+    if n:
+        batch.commit()
+    return deleted
+
+class _PostSweeper:
+    def __init__(self, db, interval):
+        self._db = db
+        self._interval = interval
+        self._stop = threading.Event()
+        self.last_run = None
+        self.last_deleted = 0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="post-sweeper", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.last_deleted = sweep_expired_posts(self._db)
+                self.last_error = None
+            except Exception as e: # 인덱스/네트워크 오류 시 다음 주기에 재시도
+                self.last_error = str(e)
+            self.last_run = datetime.datetime.now()
+            self._stop.wait(self._interval)
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+@st.cache_resource(validate=lambda s: s.is_alive())
+def start_post_sweeper():
+    """만료 게시물 정리 스레드를 프로세스당 1회 시작합니다."""
+    return _PostSweeper(get_db(), SWEEP_INTERVAL_SEC)
+
+if __name__ == "__main__":
+    count = sweep_expired_posts(get_db())
+    print(f"만료된 게시물 {count:,}건을 삭제했습니다.")
@@ -0,0 +1,106 @@
+import datetime
+import streamlit as st
+from firebase_admin import firestore
+from order_archive import ARCHIVE_COLLECTION, stream_history
+
+# [NEW] 생산일지 조회용 제직완료일 필드/날짜 색인
+# 롤 등록 시 weaving_end_time과 함께 문자열 일자 weaving_end_date("YYYY-MM-DD")를 저장하고,
+# 생산 실적이 있는 날짜를 production_dates/{연도} 문서의 dates 배열에 추가합니다.
+# 생산일지는 날짜 목록을 색인에서, 선택일의 롤은 weaving_end_date 일치 조건으로 조회합니다.
+# 기존 문서는 backfill_weaving_end_date()로 한 번 채웁니다. (생산일지 화면의 관리자 '날짜 색인 생성' 또는 python production_log.py)
+
+DATE_INDEX_COLLECTION = "production_dates"
+PRODUCTION_STATUSES = ["제직완료", "제직완료(Master)", "염색중", "염색완료", "봉제중", "봉제완료", "출고완료"]
+
+def weaving_end_date(value):
+    """weaving_end_time(datetime 또는 문자열)의 일자 문자열 (없으면 None)"""
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, str) and len(value) >= 10:
+        return value[:10]
+    return None
+
+def index_production_dates(db, dates, batch=None):
+    """생산 실적 날짜들을 연도별 색인에 추가합니다. batch를 넘기면 같은 batch에 기록합니다."""
+    by_year = {}
+    for date_str in dates:
+        if date_str:
+            by_year.setdefault(date_str[:4], set()).add(date_str)
+    own_batch = batch is None
+    if own_batch:
+        batch = db.batch()
+    for year, year_dates in by_year.items():
+        batch.set(db.collection(DATE_INDEX_COLLECTION).document(year), {"dates": firestore.ArrayUnion(sorted(year_dates))}, merge=True)
+    if own_batch and by_year:
+        batch.commit()
+
+def get_production_dates(db):
+    """생산 실적이 있는 날짜 목록 (최신순)"""
+    dates = {d for doc in db.collection(DATE_INDEX_COLLECTION).stream() for d in doc.to_dict().get("dates", [])}
+    return sorted(dates, reverse=True)
+
+def load_production_day(db, date_str):
+    """해당 일자에 제직 완료된 롤 목록 (weaving_end_date + status 복합 인덱스)"""
+    rows = []
+    docs = stream_history(
+        db, db.collection("orders").where("weaving_end_date", "==", date_str).where("status", "in", PRODUCTION_STATUSES),
+        lambda col: col.where("weaving_end_date", "==", date_str), datetime.datetime.strptime(date_str, "%Y-%m-%d"))
+    for doc in docs:
+        d = doc.to_dict()
+        d['id'] = doc.id
+        rows.append(d)
+    # 완료시간 순 (Firestore 시간은 tz 포함이므로 tz 제거 후 비교)
+    rows.sort(key=lambda x: x['weaving_end_time'].replace(tzinfo=None) if isinstance(x.get('weaving_end_time'), datetime.datetime) else datetime.datetime.min)
+    return rows
+
+def backfill_weaving_end_date(db, progress_cb=None):
+    """
+    weaving_end_date가 없는 기존 문서(보관분 포함)에 값을 채우고 날짜 색인을 다시 만듭니다.
+    파생 필드만 추가하므로 updated_at은 갱신하지 않습니다. 반환: 채운 문서 수
+    """
+    writer = db.bulk_writer()
+    writer.on_write_error(lambda failure, _writer: failure.attempts < 5)
+    dates = set()
+    filled = 0
+    for col in ("orders", ARCHIVE_COLLECTION):
+        for snap in db.collection(col).select(["weaving_end_time", "weaving_end_date", "status"]).stream():
+            d = snap.to_dict()
+            date_str = weaving_end_date(d.get("weaving_end_time"))
+            if date_str is None:
+                continue
+            if d.get("status") in PRODUCTION_STATUSES:
+                dates.add(date_str)
+            if d.get("weaving_end_date") != date_str:
+                writer.update(snap.reference, {"weaving_end_date": date_str})
+                filled += 1
+                if progress_cb and filled % 500 == 0:
+                    progress_cb(filled)
+    by_year = {}
+    for date_str in dates:
+        by_year.setdefault(date_str[:4], []).append(date_str)
+    for year, year_dates in by_year.items():
+        # 실행 중 등록된 롤의 날짜가 지워지지 않도록 덮어쓰지 않고 추가
+        writer.set(db.collection(DATE_INDEX_COLLECTION).document(year), {"dates": firestore.ArrayUnion(sorted(year_dates))}, merge=True)
+    writer.close()
+    db.collection("sync_state").document("production_dates").set({"backfilled_at": firestore.SERVER_TIMESTAMP})
+    return filled
+
+@st.cache_resource
+def _backfill_state():
+    return {"done": False}
+
+def production_backfill_needed(db):
+    """
+    기존 문서의 weaving_end_date/날짜 색인 채우기가 아직 실행되지 않았는지 확인합니다.
+    색인이 비어 있는지가 아니라 완료 표시(sync_state/production_dates)로 판단하므로, 도입 후 롤이 먼저 등록되어도 안내합니다.
+    완료가 확인되면 프로세스 안에서는 다시 읽지 않습니다.
+    """
+    state = _backfill_state()
+    if not state["done"]:
+        state["done"] = db.collection("sync_state").document("production_dates").get().exists
+    return not state["done"]
+
+if __name__ == "__main__":
+    from utils import get_db
+    count = backfill_weaving_end_date(get_db(), lambda n: print(f"{n:,}건 처리 중..."))
+    print(f"제직완료일 {count:,}건을 채웠습니다.")
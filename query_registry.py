@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import datetime
+
+# [NEW] Firestore 쿼리 등록부 (복합 인덱스 관리)
+# 앱이 실행하는 여러 필드 조건/정렬 쿼리를 이곳에 등록하고, firestore.indexes.json은 등록부에서 생성합니다.
+#   python query_registry.py            -> firestore.indexes.json 생성 (firebase deploy --only firestore:indexes 로 배포)
+#   python query_registry.py --verify   -> 등록부와 firestore.indexes.json 불일치 확인 (배포 전 점검)
+#   python query_registry.py --check    -> 로컬 에뮬레이터(FIRESTORE_EMULATOR_HOST)에서 등록된 쿼리를 모두 실행
+# 에뮬레이터는 복합 인덱스 누락을 오류로 내지 않으므로, 인덱스 누락은 --verify로, 쿼리 형태(연산자 조합/정렬 순서) 오류는 --check로 확인합니다.
+# 새 쿼리에 서버 필터/정렬을 추가할 때는 먼저 여기에 등록한 뒤 인덱스를 생성/배포합니다.
+
+INDEXES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "firestore.indexes.json")
+_EQUALITY_OPS = ("==", "in", "array-contains", "array-contains-any")
+_ARRAY_OPS = ("array-contains", "array-contains-any") # 배열 필드는 CONTAINS 인덱스
+
+_day = datetime.datetime(2024, 1, 1)
+_next_month = datetime.datetime(2024, 2, 1) # 미만(<) 조건 예시값 (예시 문서가 조건에 맞도록 하한보다 큰 값)
+
+# filters: [(필드, 연산자, 예시값)], order: [(필드, "ASCENDING"/"DESCENDING")]
+# paged: fetch_query_page 사용 (정렬 필드 뒤에 __name__ 정렬 추가)
+# composite: 동등 조건만 있는 쿼리도 복합 인덱스 생성 (기본은 단일 필드 인덱스 병합에 맡김)
+QUERIES = [
+    {"name": "partner_orders_page", "collection": "orders", "used_in": "ui_orders.load_partner_orders_page",
+     "filters": [("customer", "==", "A"), ("date", ">=", _day), ("date", "<=", _day)],
+     "order": [("date", "DESCENDING")], "paged": True},
+    {"name": "partner_orders_page_status", "collection": "orders", "used_in": "ui_orders.load_partner_orders_page",
+     "filters": [("customer", "==", "A"), ("status", "in", ["발주접수"]), ("date", ">=", _day), ("date", "<=", _day)],
+     "order": [("date", "DESCENDING")], "paged": True},
+    {"name": "orders_page_status", "collection": "orders", "used_in": "ui_orders.load_orders_page",
+     "filters": [("status", "in", ["발주접수"]), ("date", ">=", _day), ("date", "<=", _day)],
+     "order": [("date", "DESCENDING")], "paged": True},
+    {"name": "active_orders_by_customer", "collection": "orders", "used_in": "order_mirror.get_active_orders",
+     "filters": [("customer", "==", "A"), ("status", "in", ["봉제완료"])], "composite": True},
+    {"name": "shipped_month", "collection": "orders", "used_in": "order_history._month_queries, order_archive._archive_query",
+     "filters": [("status", "==", "출고완료"), ("shipping_date", ">=", _day), ("shipping_date", "<", _next_month)]},
+    {"name": "archived_shipped_month", "collection": "orders_archive", "used_in": "order_history._month_queries",
+     "filters": [("status", "==", "출고완료"), ("shipping_date", ">=", _day), ("shipping_date", "<", _next_month)]},
+    {"name": "production_day", "collection": "orders", "used_in": "production_log.load_production_day",
+     "filters": [("weaving_end_date", "==", "2024-01-01"), ("status", "in", ["제직완료"])], "composite": True},
+    {"name": "shift_logs_day", "collection": "shift_logs", "used_in": "shift_log.load_day_logs",
+     "filters": [("log_date", "==", "2024-01-01")], "order": [("log_time", "ASCENDING")]},
+    {"name": "notice_page", "collection": "posts", "used_in": "notice_posts.load_post_page, load_pinned_posts",
+     "filters": [("audience", "array-contains-any", ["all"]), ("is_important", "==", False)],
+     "order": [("created_at", "DESCENDING")], "paged": True},
+    {"name": "notice_page_admin", "collection": "posts", "used_in": "notice_posts.load_post_page, load_pinned_posts (관리자)",
+     "filters": [("is_important", "==", False)], "order": [("created_at", "DESCENDING")], "paged": True},
+    {"name": "notice_search", "collection": "posts", "used_in": "notice_posts.search_posts",
+     "filters": [("audience", "array-contains-any", ["all"])], "order": [("created_at", "DESCENDING")], "paged": True},
+    {"name": "schedules_window", "collection": "schedules", "used_in": "schedule_events.load_events",
+     "filters": [("date", "<=", "2024-01-31"), ("end_date", ">=", "2024-01-01")]},
+    {"name": "schedules_by_author", "collection": "schedules", "used_in": "schedule_events.load_events",
+     "filters": [("date", "<=", "2024-01-31"), ("end_date", ">=", "2024-01-01"), ("author", "==", "A")]},
+    # 아래는 동등 조건만 사용하므로 단일 필드 인덱스로 처리 (에뮬레이터 점검 대상)
+    {"name": "rolls_by_parent", "collection": "orders", "used_in": "ui_production_weaving (롤 삭제)",
+     "filters": [("parent_id", "==", "x"), ("status", "==", "제직완료")]},
+    {"name": "siblings_by_order_no", "collection": "orders", "used_in": "ui_production_sewing (봉제 취소)",
+     "filters": [("order_no", "==", "x"), ("status", "==", "염색완료")]},
+]
+
+def index_fields(q):
+    """쿼리에 필요한 복합 인덱스 필드 목록 (필요 없으면 None)"""
+    eq = [(f, "CONTAINS" if op in _ARRAY_OPS else "ASCENDING") for f, op, _ in q["filters"] if op in _EQUALITY_OPS]
+    ranges = list(dict.fromkeys(f for f, op, _ in q["filters"] if op not in _EQUALITY_OPS))
+    order = list(q.get("order", []))
+    # 범위 조건 필드는 첫 정렬 필드여야 함 (정렬이 없으면 오름차순, 여러 필드면 필드명 순)
+    order = [(f, "ASCENDING") for f in sorted(ranges) if f not in [o[0] for o in order]] + order
+    if q.get("paged") and order:
+        order.append(("__name__", order[-1][1]))
+    fields = list(dict.fromkeys(eq)) + order
+    if len({f for f, _ in fields if f != "__name__"}) < 2:
+        return None
+    if not order and not q.get("composite"):
+        return None
+    return fields
+
+def _index_field(field, mode):
+    return {"fieldPath": field, "arrayConfig": mode} if mode == "CONTAINS" else {"fieldPath": field, "order": mode}
+
+def _field_mode(x):
+    return x.get("order") or x.get("arrayConfig")
+
+def build_indexes():
+    indexes, seen = [], set()
+    for q in QUERIES:
+        fields = index_fields(q)
+        if fields is None:
+            continue
+        key = (q["collection"], tuple(fields))
+        if key in seen:
+            continue
+        seen.add(key)
+        indexes.append({"collectionGroup": q["collection"], "queryScope": "COLLECTION",
+                        "fields": [_index_field(f, o) for f, o in fields]})
+    return {"indexes": indexes, "fieldOverrides": []}
+
+def render_indexes(manifest):
+    """기존 파일과 같은 형식(필드 한 줄씩)으로 출력"""
+    lines = ["{", '  "indexes": [']
+    for i, idx in enumerate(manifest["indexes"]):
+        lines += ["    {", f'      "collectionGroup": "{idx["collectionGroup"]}",', f'      "queryScope": "{idx["queryScope"]}",', '      "fields": [']
+        fields = [f'        {{ "fieldPath": "{f["fieldPath"]}", "{"arrayConfig" if "arrayConfig" in f else "order"}": "{_field_mode(f)}" }}' for f in idx["fields"]]
+        lines += [line + ("," if j < len(fields) - 1 else "") for j, line in enumerate(fields)]
+        lines += ["      ]", "    }" + ("," if i < len(manifest["indexes"]) - 1 else "")]
+    lines += ["  ],", '  "fieldOverrides": []', "}"]
+    return "\n".join(lines) + "\n"
+
+def verify_indexes():
+    """등록부에 필요한 인덱스 중 firestore.indexes.json에 없는 것 목록"""
+    with open(INDEXES_PATH, encoding="utf-8") as f:
+        current = json.load(f)
+    have = {(i["collectionGroup"], tuple((x["fieldPath"], _field_mode(x)) for x in i["fields"])) for i in current["indexes"]}
+    return [idx for idx in build_indexes()["indexes"]
+            if (idx["collectionGroup"], tuple((x["fieldPath"], _field_mode(x)) for x in idx["fields"])) not in have]
+
+def build_query(db, q):
+    query = db.collection(q["collection"])
+    for f, op, value in q["filters"]:
+        query = query.where(f, op, value)
+    order = q.get("order", [])
+    for f, direction in order:
+        query = query.order_by(f, direction=direction)
+    if q.get("paged") and order:
+        query = query.order_by("__name__", direction=order[-1][1])
+    return query
+
+def check_queries(db):
+    """등록된 쿼리를 모두 실행하고 실패한 쿼리의 (이름, 오류) 목록을 반환합니다."""
+    failed = []
+    for q in QUERIES:
+        try:
+            list(build_query(db, q).limit(1).stream())
+        except Exception as e:
+            failed.append((q["name"], str(e)))
+    return failed
+
+if __name__ == "__main__":
+    if "--verify" in sys.argv:
+        missing = verify_indexes()
+        for idx in missing:
+            print("누락:", idx["collectionGroup"], [f["fieldPath"] for f in idx["fields"]])
+        sys.exit(1 if missing else 0)
+    elif "--check" in sys.argv:
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            sys.exit("FIRESTORE_EMULATOR_HOST가 설정되지 않았습니다. (예: localhost:8080)")
+        from google.cloud import firestore as gcf
+        failed = check_queries(gcf.Client(project=os.environ.get("GCLOUD_PROJECT", "demo-test")))
+        for name, err in failed:
+            print(f"실패: {name} - {err}")
+        print(f"{len(QUERIES) - len(failed)}/{len(QUERIES)}개 쿼리 통과")
+        sys.exit(1 if failed else 0)
+    else:
+        with open(INDEXES_PATH, "w", encoding="utf-8", newline="\n") as f:
+            f.write(render_indexes(build_indexes()))
+        print(f"{INDEXES_PATH} 생성 완료")
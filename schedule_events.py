@@ -0,0 +1,145 @@
+import calendar
+import datetime
+import streamlit as st
+from firebase_admin import firestore
+
+# [NEW] 업무일정 이벤트 저장 방식
+# 일정 1건 = schedules 문서 1개 (기간 일정도 날짜별 문서로 나누지 않음)
+#   date: 시작일, end_date: 종료일 (반복 일정은 반복 종료일), "YYYY-MM-DD" 문자열
+#   recurrence: 반복 주기 ("weekly" | "monthly" | "yearly", 반복 없으면 필드 없음)
+# 달력/목록은 조회 기간과 겹치는 이벤트(date <= 기간끝, end_date >= 기간시작)만 읽고, 화면에 보이는 날짜로 메모리에서 펼칩니다.
+# 기존 날짜별 문서(group_id 묶음)는 migrate_schedule_groups()로 변환합니다. (python schedule_events.py, 일정 화면 최초 조회 시 자동 실행)
+
+RECURRENCE_LABELS = {"weekly": "매주", "monthly": "매월", "yearly": "매년"}
+_META_FIELDS = ("content", "type", "author", "is_all_day", "time")
+
+def _to_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+def load_events(db, start, end, author=None):
+    """start~end(date)와 겹치는 일정 목록 (날짜 색인: date + end_date, 작성자 필터는 author + date + end_date)"""
+    query = db.collection("schedules").where("date", "<=", str(end)).where("end_date", ">=", str(start))
+    if author:
+        query = query.where("author", "==", author)
+    events = []
+    for doc in query.stream():
+        d = doc.to_dict()
+        d['id'] = doc.id
+        events.append(d)
+    return events
+
+def occurrence_dates(event, start, end):
+    """이벤트가 start~end(date) 사이에 표시되는 날짜 목록"""
+    first, last = _to_date(event['date']), _to_date(event.get('end_date', event['date']))
+    freq = event.get('recurrence')
+    if not freq:
+        day, stop = max(first, start), min(last, end)
+        return [day + datetime.timedelta(days=i) for i in range((stop - day).days + 1)]
+
+    dates = []
+    if freq == "weekly":
+        skip = max(0, (start - first).days // 7)
+        day = first + datetime.timedelta(weeks=skip)
+        while day <= min(last, end):
+            if day >= start:
+                dates.append(day)
+            day += datetime.timedelta(weeks=1)
+        return dates
+
+    # 매월/매년: 시작일의 일자(매년은 월/일)와 같은 날, 해당 일자가 없는 달은 건너뜀 (예: 31일)
+    for year in range(max(first.year, start.year), min(last.year, end.year) + 1):
+        months = range(1, 13) if freq == "monthly" else [first.month]
+        for month in months:
+            if first.day > calendar.monthrange(year, month)[1]:
+                continue
+            day = datetime.date(year, month, first.day)
+            if max(first, start) <= day <= min(last, end):
+                dates.append(day)
+    return dates
+
+def expand_events(events, start, end):
+    """일정을 날짜별로 펼친 목록 (각 항목은 date가 표시 날짜인 사본)"""
+    expanded = []
+    for event in events:
+        for day in occurrence_dates(event, start, end):
+            expanded.append({**event, 'date': str(day), 'start_date': event['date']})
+    return expanded
+
+def describe_period(event):
+    """목록 표시용 기간 문자열"""
+    start, end = event['date'], event.get('end_date', event['date'])
+    freq = event.get('recurrence')
+    if freq:
+        return f"{start} ~ {end} ({RECURRENCE_LABELS.get(freq, freq)} 반복)"
+    return f"{start} ~ {end}" if start != end else start
+
+def new_event(start, end, content, s_type, author, is_all_day=True, time_str=None, recurrence=None):
+    data = {"date": str(start), "end_date": str(end), "content": content, "type": s_type,
+            "author": author, "is_all_day": is_all_day}
+    if not is_all_day and time_str:
+        data["time"] = time_str
+    if recurrence:
+        data["recurrence"] = recurrence
+    return data
+
+def migrate_schedule_groups(db):
+    """
+    날짜별 일정 문서를 이벤트 문서로 변환합니다. (end_date가 없는 문서 대상)
+    같은 group_id(없으면 같은 내용)로 이어지는 날짜는 첫 문서 하나로 합치고 나머지는 삭제합니다.
+    반환: (변환된 이벤트 수, 삭제한 문서 수)
+    """
+    legacy = []
+    for doc in db.collection("schedules").stream():
+        d = doc.to_dict()
+        if "end_date" not in d and d.get("date"):
+            d['id'] = doc.id
+            legacy.append(d)
+    # 기존 목록 화면의 병합 규칙과 같게: 같은 그룹(또는 그룹 없음) + 같은 내용 + 연속된 날짜
+    legacy.sort(key=lambda x: (x.get('group_id') or "", tuple(str(x.get(f)) for f in _META_FIELDS), x['date']))
+    runs = []
+    for d in legacy:
+        prev = runs[-1][-1] if runs else None
+        if (prev and prev.get('group_id') == d.get('group_id')
+                and all(prev.get(f) == d.get(f) for f in _META_FIELDS)
+                and (_to_date(d['date']) - _to_date(prev['date'])).days == 1):
+            runs[-1].append(d)
+        else:
+            runs.append([d])
+
+    batch, n, deleted = db.batch(), 0, 0
+    for run in runs:
+        ops = [("update", run[0]['id'], {"end_date": run[-1]['date'], "group_id": firestore.DELETE_FIELD})]
+        ops += [("delete", d['id'], None) for d in run[1:]]
+        for op, doc_id, data in ops:
+            ref = db.collection("schedules").document(doc_id)
+            if op == "update":
+                batch.update(ref, data)
+            else:
+                batch.delete(ref)
+                deleted += 1
+            n += 1
+            if n >= 400:
+                batch.commit()
+                batch, n = db.batch(), 0
+    if n:
+        batch.commit()
+    db.collection("sync_state").document("schedule_events").set({"migrated_at": firestore.SERVER_TIMESTAMP})
+    return len(runs), deleted
+
+@st.cache_resource
+def _migration_state():
+    return {"done": False}
+
+def ensure_schedule_events(db):
+    """기존 날짜별 일정 변환을 최초 1회 실행합니다. (프로세스당 상태 문서 1회 확인)"""
+    state = _migration_state()
+    if state["done"]:
+        return
+    if not db.collection("sync_state").document("schedule_events").get().exists:
+        migrate_schedule_groups(db)
+    state["done"] = True
+
+if __name__ == "__main__":
+    from utils import get_db
+    events, deleted = migrate_schedule_groups(get_db())
+    print(f"일정 {events:,}건으로 변환했습니다. (중복 날짜 문서 {deleted:,}건 삭제)")
@@ -0,0 +1,52 @@
+from firebase_admin import firestore
+
+# [NEW] 작업일지 날짜 색인 (shift_log_dates/{연도})
+# 작업일지/전달사항이 있는 날짜를 연도별 문서의 dates 배열로 관리하여,
+# 일지 조회 화면의 날짜 목록을 shift_logs/handover_notes 전체 조회 대신 연도 수만큼의 읽기로 만듭니다.
+# 일지 저장 시 같은 batch에서 ArrayUnion으로 날짜를 추가합니다.
+
+DATE_INDEX_COLLECTION = "shift_log_dates"
+
+def _index_ref(db, date_str):
+    return db.collection(DATE_INDEX_COLLECTION).document(date_str[:4])
+
+def save_shift_log(db, log_data, note_key=None, note=None):
+    """작업일지 1건(과 전달사항)을 저장하고 날짜 색인을 함께 갱신합니다."""
+    date_str = log_data["log_date"]
+    batch = db.batch()
+    batch.set(db.collection("shift_logs").document(), log_data)
+    if note_key and note:
+        batch.set(db.collection("handover_notes").document(date_str), {note_key: note}, merge=True)
+    batch.set(_index_ref(db, date_str), {"dates": firestore.ArrayUnion([date_str])}, merge=True)
+    batch.commit()
+
+def rebuild_log_date_index(db):
+    """기존 shift_logs/handover_notes로 날짜 색인을 다시 만듭니다. (최초 적용 시 1회) 반환: 날짜 수"""
+    dates = set()
+    for snap in db.collection("shift_logs").select(["log_date"]).stream():
+        if snap.to_dict().get("log_date"):
+            dates.add(snap.to_dict()["log_date"])
+    for snap in db.collection("handover_notes").select([]).stream():
+        dates.add(snap.id)
+    by_year = {}
+    for d in dates:
+        by_year.setdefault(d[:4], []).append(d)
+    batch = db.batch()
+    for year, year_dates in by_year.items():
+        batch.set(db.collection(DATE_INDEX_COLLECTION).document(year), {"dates": sorted(year_dates)})
+    batch.commit()
+    return len(dates)
+
+def get_log_dates(db):
+    """일지가 있는 날짜 목록 (최신순). 색인이 비어 있으면 기존 데이터로 한 번 생성합니다."""
+    docs = list(db.collection(DATE_INDEX_COLLECTION).stream())
+    if not docs:
+        rebuild_log_date_index(db)
+        docs = list(db.collection(DATE_INDEX_COLLECTION).stream())
+    dates = {d for doc in docs for d in doc.to_dict().get("dates", [])}
+    return sorted(dates, reverse=True)
+
+def load_day_logs(db, date_str):
+    """해당 일자의 작업일지를 작성시간 순으로 조회합니다. (log_date + log_time 복합 인덱스)"""
+    query = db.collection("shift_logs").where("log_date", "==", date_str).order_by("log_time")
+    return [doc.to_dict() for doc in query.stream()]
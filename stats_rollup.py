@@ -0,0 +1,352 @@
+import datetime
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+from firebase_admin import firestore
+from utils import get_docs_map
+from order_archive import ARCHIVE_COLLECTION
+
+# [NEW] 통계(내역조회)용 일별/월별 집계 문서
+# 발주/제직/염색/봉제/출고 기준일별로 발주처·제직기·업체별 건수와 수량/금액 합계를
+# stats_daily/{구분}_{YYYY-MM-DD}, stats_monthly/{구분}_{YYYY-MM} 문서에 누적합니다.
+# 발주 문서가 바뀔 때 (변경 전, 변경 후)를 넘기면 차이만큼 Increment로 반영하고,
+# 누락/불일치는 rebuild_stats_rollups()(백필)로 orders 전체에서 다시 계산합니다.
+# 대량 삭제처럼 변경 전 내용을 알 수 없는 경우 sync_state/stats_rollup에 재계산 필요 표시만 남기고,
+# 재계산은 관리자가 작업이 적은 시간에 실행합니다. (통계 화면 '집계 재계산' 또는 아래 명령)
+#   python stats_rollup.py  -> 전체 백필 실행
+#   python stats_rollup.py --bench  -> 날짜 버킷/집계 벤치마크 (합성 데이터)
+
+DAILY_COLLECTION = "stats_daily"
+MONTHLY_COLLECTION = "stats_monthly"
+
+# 구분: (기준 날짜 필드, 그룹 필드, 합계 필드)
+STATS_KINDS = {
+    "order": ("date", ["customer"], ["stock"]),
+    "weaving": ("weaving_end_time", ["machine_no", "customer"], ["real_stock", "prod_weight_kg"]),
+    "dyeing": ("dyeing_in_date", ["dyeing_partner", "customer"], ["stock", "dyeing_amount"]),
+    "sewing": ("sewing_end_date", ["sewing_partner", "customer"], ["stock", "sewing_defect_qty", "sewing_amount"]),
+    "shipping": ("shipping_date", ["shipping_carrier", "customer", "shipping_method"], ["stock", "shipping_cost"]),
+}
+_FLOAT_FIELDS = ("prod_weight_kg",)
+STATE_DOC_ID = "stats_rollup"
+
+# 분석 기준별 버킷 단위 (일/월/년)
+STAT_TYPE_FREQ = {"기간별": "D", "월별": "M", "년도별": "Y"}
+
+def _is_blank(v):
+    if v is None:
+        return True
+    try:
+        return bool(pd.isna(v))
+    except (TypeError, ValueError):
+        return False
+
+def _num(v, as_float=False):
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return 0
+    if pd.isna(v):
+        return 0
+    return v if as_float else int(v)
+
+def _dim(v):
+    # DataFrame 행에서 넘어온 값(NaN, numpy 타입, 3.0 같은 실수)을 저장 문서와 같은 형태로 정리
+    if _is_blank(v):
+        return ""
+    if hasattr(v, "item"):
+        v = v.item()
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+def _day_of(value):
+    """날짜 필드 값(datetime 또는 'YYYY-MM-DD' 문자열)을 'YYYY-MM-DD'로 변환합니다."""
+    if _is_blank(value):
+        return None
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.strptime(value[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+    if hasattr(value, "strftime"):
+        # 현지 시각을 그대로 저장하므로 (UTC로 표시되어 반환되더라도) 표시된 날짜를 사용
+        return value.strftime("%Y-%m-%d")
+    return None
+
+# [최적화] 날짜 버킷 키 벡터 연산
+# 행마다 strftime을 호출(apply)하지 않고, 전체 열을 한 번에 datetime64로 변환/절삭한 뒤
+# 고유값(일/월 수만큼)만 문자열로 변환하여 다시 펼칩니다.
+def bucket_keys(values, freq="D"):
+    """
+    날짜 값 Series(datetime/Timestamp/'YYYY-MM-DD...' 문자열 혼재 가능)를
+    'YYYY-MM-DD'(D) / 'YYYY-MM'(M) / 'YYYY'(Y) 키 Series로 변환합니다. (변환 불가 값은 None)
+    """
+    values = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values
+    # Firestore 시간은 UTC로 반환되고(저장값은 현지 시각), 문자열/naive 값도 UTC로 간주하여 표시된 날짜를 유지
+    parsed = pd.to_datetime(values, errors="coerce", utc=True, format="mixed")
+    floored = parsed.dt.tz_localize(None).to_numpy().astype(f"datetime64[{freq}]")
+    uniques, codes = np.unique(floored, return_inverse=True)
+    labels = np.array([None if np.isnat(u) else str(u) for u in uniques], dtype=object)
+    return pd.Series(labels[codes.reshape(-1)], index=values.index, dtype=object)
+
+def _group_id(dims):
+    return "g" + hashlib.md5("\x1f".join(str(v) for v in dims.values()).encode("utf-8")).hexdigest()[:12]
+
+def _contributions(order):
+    """발주 1건이 각 통계에 더하는 값 목록 [(구분, 일자, 그룹ID, 그룹 필드, 합계 값)]"""
+    if order is None:
+        return []
+    if hasattr(order, "to_dict"): # pandas Series
+        order = order.to_dict()
+    result = []
+    for kind, (date_field, group_fields, value_fields) in STATS_KINDS.items():
+        day = _day_of(order.get(date_field))
+        if not day:
+            continue
+        dims = {f: _dim(order.get(f)) for f in group_fields}
+        values = {"count": 1}
+        if kind == "order":
+            # 롤 분할/부분 출고로 생긴 문서(parent_id)는 발주건수에서 제외
+            values["orders"] = 0 if order.get("parent_id") else 1
+        for f in value_fields:
+            values[f] = _num(order.get(f), as_float=f in _FLOAT_FIELDS)
+        result.append((kind, day, _group_id(dims), dims, values))
+    return result
+
+def _accumulate(totals, order, sign=1):
+    for kind, day, gid, dims, values in _contributions(order):
+        entry = totals.get((kind, day, gid))
+        if entry is None:
+            entry = totals[(kind, day, gid)] = {"dims": dims, "values": dict.fromkeys(values, 0)}
+        for k, v in values.items():
+            entry["values"][k] += sign * v
+
+def _frame_totals(df):
+    """
+    발주 DataFrame 전체를 (구분, 일자, 그룹) 합계로 집계합니다. (_accumulate의 벡터 연산 버전)
+    일자 변환/합계는 열 단위로 처리하고, 그룹 필드 정리(_dim)와 그룹ID 계산은 그룹 수만큼만 수행합니다.
+    """
+    totals = {}
+    if df.empty:
+        return totals
+    for kind, (date_field, group_fields, value_fields) in STATS_KINDS.items():
+        if date_field not in df.columns:
+            continue
+        days = bucket_keys(df[date_field], "D")
+        has_day = days.notna().to_numpy()
+        if not has_day.any():
+            continue
+        part = pd.DataFrame({"_day": days[has_day]})
+        for i, f in enumerate(group_fields):
+            col = df[f][has_day] if f in df.columns else pd.Series(None, index=part.index, dtype=object)
+            # NaN/None은 그룹에서 빠지지 않도록 빈 문자열로 통일 (3.0 -> 3 정리는 그룹 단위로 _dim에서 처리)
+            part[f"_g{i}"] = col.astype(object).where(col.notna(), "")
+        part["count"] = 1
+        if kind == "order":
+            parent = df["parent_id"][has_day] if "parent_id" in df.columns else pd.Series(None, index=part.index, dtype=object)
+            part["orders"] = (parent.isna() | (parent.astype(object) == "")).astype(int)
+        for f in value_fields:
+            num = pd.to_numeric(df[f][has_day], errors="coerce").fillna(0) if f in df.columns else 0
+            # _num과 같이 문서 단위로 정수 절삭 후 합산
+            part[f] = num if f in _FLOAT_FIELDS else np.trunc(num).astype("int64")
+        value_cols = [c for c in part.columns if not c.startswith("_")]
+        key_cols = ["_day"] + [f"_g{i}" for i in range(len(group_fields))]
+        grouped = part.groupby(key_cols, sort=False)[value_cols].sum()
+        for keys, row in zip(grouped.index, grouped.to_dict("records")):
+            dims = {f: _dim(v) for f, v in zip(group_fields, keys[1:])}
+            values = {k: (float(v) if k in _FLOAT_FIELDS else int(v)) for k, v in row.items()}
+            entry = totals.get((kind, keys[0], _group_id(dims)))
+            if entry is None:
+                totals[(kind, keys[0], _group_id(dims))] = {"dims": dims, "values": values}
+            else:
+                for k, v in values.items():
+                    entry["values"][k] += v
+    return totals
+
+def _period_docs(totals):
+    """(구분, 일자, 그룹) 합계를 일별/월별 문서 단위로 묶습니다."""
+    docs = {DAILY_COLLECTION: {}, MONTHLY_COLLECTION: {}}
+    for (kind, day, gid), entry in totals.items():
+        for coll, period in ((DAILY_COLLECTION, day), (MONTHLY_COLLECTION, day[:7])):
+            groups = docs[coll].setdefault((kind, period), {})
+            g = groups.get(gid)
+            if g is None:
+                groups[gid] = {"dims": entry["dims"], "values": dict(entry["values"])}
+            else:
+                for k, v in entry["values"].items():
+                    g["values"][k] = g["values"].get(k, 0) + v
+    return docs
+
+def record_stats_changes(db, changes, batch=None):
+    """
+    발주 문서의 (변경 전, 변경 후) 목록으로 일별/월별 통계를 증감합니다.
+    신규 등록은 변경 전을 None, 삭제는 변경 후를 None으로 넘깁니다.
+    batch를 넘기면 같은 batch에 함께 기록하고(커밋은 호출측), 없으면 즉시 커밋합니다.
+    반환: 기록한 문서 수
+    """
+    totals = {}
+    for before, after in changes:
+        _accumulate(totals, before, -1)
+        _accumulate(totals, after, 1)
+    totals = {k: e for k, e in totals.items() if any(e["values"].values())}
+    if not totals:
+        return 0
+
+    own_batch = batch is None
+    if own_batch:
+        batch = db.batch()
+    written = 0
+    for coll, period_docs in _period_docs(totals).items():
+        for (kind, period), groups in period_docs.items():
+            data = {"kind": kind, "period": period, "updated_at": firestore.SERVER_TIMESTAMP, "groups": {
+                gid: {**g["dims"], **{k: firestore.Increment(v) for k, v in g["values"].items()}}
+                for gid, g in groups.items()
+            }}
+            batch.set(db.collection(coll).document(f"{kind}_{period}"), data, merge=True)
+            written += 1
+    if own_batch:
+        batch.commit()
+    return written
+
+def _state_ref(db):
+    return db.collection("sync_state").document(STATE_DOC_ID)
+
+def flag_stats_rebuild(db):
+    """집계를 증분으로 맞출 수 없는 변경(대량 삭제 등) 후 재계산 필요 표시를 남깁니다."""
+    _state_ref(db).set({"rebuild_needed": True, "flagged_at": firestore.SERVER_TIMESTAMP}, merge=True)
+
+def stats_rebuild_needed(db):
+    snap = _state_ref(db).get()
+    return snap.exists and bool(snap.to_dict().get("rebuild_needed"))
+
+def _periods(start_dt, end_dt, monthly):
+    periods = []
+    if monthly:
+        y, m = start_dt.year, start_dt.month
+        while (y, m) <= (end_dt.year, end_dt.month):
+            periods.append(f"{y:04d}-{m:02d}")
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    else:
+        day = start_dt.date() if hasattr(start_dt, "date") else start_dt
+        last = end_dt.date() if hasattr(end_dt, "date") else end_dt
+        while day <= last:
+            periods.append(day.strftime("%Y-%m-%d"))
+            day += datetime.timedelta(days=1)
+    return periods
+
+def load_stats_rollups(db, kind, start_dt, end_dt, monthly=False):
+    """
+    기간 내 집계 문서를 읽어 DataFrame으로 반환합니다.
+    컬럼: period(일자 또는 년-월), 그룹 필드, count(, orders), 합계 필드
+    """
+    _, group_fields, value_fields = STATS_KINDS[kind]
+    value_cols = ["count"] + (["orders"] if kind == "order" else []) + value_fields
+    coll = MONTHLY_COLLECTION if monthly else DAILY_COLLECTION
+    ids = [f"{kind}_{p}" for p in _periods(start_dt, end_dt, monthly)]
+    rows = []
+    for data in get_docs_map(db, coll, ids).values():
+        if not data:
+            continue
+        for g in (data.get("groups") or {}).values():
+            row = {"period": data.get("period")}
+            row.update({f: g.get(f, "") for f in group_fields})
+            row.update({f: g.get(f, 0) for f in value_cols})
+            rows.append(row)
+    df = pd.DataFrame(rows, columns=["period"] + group_fields + value_cols)
+    if not df.empty:
+        df = df[df["count"] > 0].reset_index(drop=True)
+    return df
+
+def rebuild_stats_rollups(db, progress_cb=None):
+    """
+    orders 전체(보관분 포함)로 일별/월별 통계 문서를 다시 만듭니다. (최초 적용 시 과거 데이터 백필, 불일치 보정)
+    재계산 중 발생한 변경은 덮어써질 수 있으므로 작업이 적은 시간에 실행합니다.
+    반환: 생성한 문서 수
+    """
+    fields = sorted({f for date_field, group_fields, value_fields in STATS_KINDS.values()
+                     for f in [date_field, *group_fields, *value_fields]} | {"parent_id"})
+    rows = []
+    for col in ("orders", ARCHIVE_COLLECTION):
+        for doc in db.collection(col).select(fields).stream():
+            rows.append(doc.to_dict())
+            if progress_cb and len(rows) % 1000 == 0:
+                progress_cb(len(rows))
+    totals = {k: e for k, e in _frame_totals(pd.DataFrame(rows)).items() if e["values"]["count"] > 0}
+
+    writer = db.bulk_writer()
+    writer.on_write_error(lambda failure, _writer: failure.attempts < 5)
+    now = datetime.datetime.now()
+    written = 0
+    for coll, period_docs in _period_docs(totals).items():
+        keep_ids = set()
+        for (kind, period), groups in period_docs.items():
+            doc_id = f"{kind}_{period}"
+            keep_ids.add(doc_id)
+            data = {"kind": kind, "period": period, "updated_at": firestore.SERVER_TIMESTAMP, "rebuilt_at": now,
+                    "groups": {gid: {**g["dims"], **g["values"]} for gid, g in groups.items()}}
+            writer.set(db.collection(coll).document(doc_id), data)
+            written += 1
+        for snap in db.collection(coll).select([]).stream():
+            if snap.id not in keep_ids:
+                writer.delete(snap.reference)
+    writer.close()
+    _state_ref(db).set({"rebuild_needed": False, "rebuilt_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    return written
+
+def benchmark_bucketing(n=50000, repeat=3, seed=0):
+    """
+    합성 데이터로 날짜 버킷/집계 방식별 소요 시간(초, 최소값)을 비교합니다. (DB 접근 없음)
+    - apply: 기존 방식 (행별 strftime)
+    - bucket_keys: 벡터 연산
+    - accumulate / frame_totals: 백필 집계 (문서별 누적 vs DataFrame 집계)
+    """
+    rng = np.random.default_rng(seed)
+    base = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    minutes = rng.integers(0, 2 * 365 * 24 * 60, n)
+    docs = [{
+        "date": base + datetime.timedelta(minutes=int(m)),
+        "customer": f"거래처{int(c)}",
+        "stock": int(q),
+        "dyeing_in_date": (base + datetime.timedelta(minutes=int(m))).strftime("%Y-%m-%d") if i % 2 else "",
+        "dyeing_partner": f"염색{int(c) % 5}",
+        "dyeing_amount": int(q) * 100,
+    } for i, (m, c, q) in enumerate(zip(minutes, rng.integers(0, 50, n), rng.integers(1, 500, n)))]
+    df = pd.DataFrame(docs)
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - started)
+        return min(times), result
+
+    t_apply, by_apply = best(lambda: df.apply(lambda x: x["date"].strftime("%Y-%m") if pd.notna(x["date"]) else None, axis=1))
+    t_vec, by_vec = best(lambda: bucket_keys(df["date"], "M"))
+    assert by_apply.tolist() == by_vec.tolist()
+
+    def accumulate_all():
+        totals = {}
+        for d in docs:
+            _accumulate(totals, d)
+        return totals
+    t_acc, totals_acc = best(accumulate_all)
+    t_frame, totals_frame = best(lambda: _frame_totals(df))
+    assert {k: e["values"] for k, e in totals_acc.items()} == {k: e["values"] for k, e in totals_frame.items()}
+
+    return {"rows": n, "apply": t_apply, "bucket_keys": t_vec, "accumulate": t_acc, "frame_totals": t_frame}
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        # python stats_rollup.py --bench  -> 합성 데이터 성능 비교 (DB 접근 없음)
+        r = benchmark_bucketing()
+        print(f"{r['rows']:,}행 기준")
+        print(f"  버킷 키: apply {r['apply']:.3f}s -> bucket_keys {r['bucket_keys']:.3f}s ({r['apply'] / r['bucket_keys']:.0f}배)")
+        print(f"  백필 집계: 문서별 {r['accumulate']:.3f}s -> DataFrame {r['frame_totals']:.3f}s ({r['accumulate'] / r['frame_totals']:.0f}배)")
+    else:
+        from utils import get_db
+        count = rebuild_stats_rollups(get_db(), lambda n: print(f"{n:,}건 집계 중..."))
+        print(f"통계 집계 문서 {count:,}건을 다시 만들었습니다.")
@@ -0,0 +1,94 @@
+import os
+import importlib
+import importlib.util
+import pytest
+from query_registry import QUERIES, INDEXES_PATH, build_indexes, render_indexes, verify_indexes, build_query
+
+# [NEW] 쿼리 등록부 점검
+# - firestore.indexes.json이 등록부에서 생성된 내용과 같은지 (등록 후 생성/커밋 누락 확인)
+# - 등록된 쿼리의 사용처(used_in)가 실제 코드에 있는지
+# - 로컬 에뮬레이터에서 등록된 쿼리를 모두 실행하여, 예시값에 맞는 문서가 결과에 포함되는지 (FIRESTORE_EMULATOR_HOST가 없으면 건너뜀)
+#   firebase emulators:start --only firestore  후  FIRESTORE_EMULATOR_HOST=localhost:8080 python -m pytest
+
+requires_emulator = pytest.mark.skipif(not os.environ.get("FIRESTORE_EMULATOR_HOST"),
+                                       reason="FIRESTORE_EMULATOR_HOST가 설정되지 않음")
+
+def test_manifest_matches_registry():
+    with open(INDEXES_PATH, encoding="utf-8", newline="") as f:
+        assert f.read() == render_indexes(build_indexes()), "python query_registry.py로 firestore.indexes.json을 다시 생성하세요."
+
+def test_no_missing_indexes():
+    assert verify_indexes() == []
+
+def test_query_names_unique():
+    names = [q["name"] for q in QUERIES]
+    assert len(names) == len(set(names))
+
+def _used_in_targets(used_in):
+    """'모듈.함수, 함수 (설명)' 형식을 (모듈, 함수 또는 None) 목록으로 변환 (모듈 없는 함수는 앞 항목의 모듈)"""
+    targets, module = [], None
+    for part in used_in.split(","):
+        part = part.split("(")[0].strip()
+        if "." in part:
+            module, attr = part.split(".", 1)
+        elif importlib.util.find_spec(part):
+            module, attr = part, None
+        else:
+            attr = part
+        targets.append((module, attr))
+    return targets
+
+@pytest.mark.parametrize("q", QUERIES, ids=[q["name"] for q in QUERIES])
+def test_used_in_exists(q):
+    for module, attr in _used_in_targets(q["used_in"]):
+        mod = importlib.import_module(module)
+        if attr:
+            assert hasattr(mod, attr), f"{q['name']}: {module}.{attr} 없음"
+
+def _sample_doc(q):
+    """등록된 쿼리의 예시값으로 조건에 해당하는 문서를 만듭니다. (범위 조건은 하한값 사용)"""
+    doc, lower = {}, {}
+    for field, op, value in q["filters"]:
+        if op == "array-contains-any":
+            doc[field] = value
+        elif op == "array-contains":
+            doc[field] = [value]
+        elif op == "in":
+            doc[field] = value[0]
+        elif op == ">=":
+            lower[field] = value
+        else:
+            doc.setdefault(field, value)
+    doc.update(lower)
+    for field, _ in q.get("order", []):
+        doc.setdefault(field, "2024-01-01")
+    return doc
+
+def test_sample_docs_match_filters():
+    # 예시 문서가 범위 조건을 만족해야 에뮬레이터 검사가 의미가 있음 (예시값 등록 실수 확인)
+    checks = {"==": lambda a, b: a == b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b}
+    for q in QUERIES:
+        doc = _sample_doc(q)
+        for field, op, value in q["filters"]:
+            if op in checks:
+                assert checks[op](doc[field], value), f"{q['name']}: {field} {op} {value!r}"
+
+@pytest.fixture(scope="module")
+def emulator_db():
+    from google.cloud import firestore as gcf
+    db = gcf.Client(project=os.environ.get("GCLOUD_PROJECT", "demo-test"))
+    refs = []
+    for q in QUERIES:
+        ref = db.collection(q["collection"]).document(f"registry_test_{q['name']}")
+        ref.set(_sample_doc(q))
+        refs.append(ref)
+    yield db
+    for ref in refs:
+        ref.delete()
+
+@requires_emulator
+@pytest.mark.parametrize("q", QUERIES, ids=[q["name"] for q in QUERIES])
+def test_registered_query_returns_sample(emulator_db, q):
+    # 실행 오류뿐 아니라 서버 필터/정렬이 예시 문서를 걸러내지 않는지 확인
+    ids = [snap.id for snap in build_query(emulator_db, q).stream()]
+    assert f"registry_test_{q['name']}" in ids
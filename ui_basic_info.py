@@ -5,7 +5,9 @@ import io
 import re
 from firebase_admin import firestore
 from utils import get_common_codes, manage_code_with_code, manage_code, search_address_api, get_partners
+from db_usage import track_db_usage
 
+@track_db_usage
 def render_product_master(db, sub_menu):
     # [NEW] 제품코드설정 메뉴 통합 처리
     if sub_menu in ["제품 종류", "사종", "중량", "사이즈"]:
@@ -205,6 +207,7 @@ def render_product_master(db, sub_menu):
                 st.session_state["trigger_reset"] = True
                 st.rerun()
 
+@track_db_usage
 def render_partners(db, sub_menu):
     # [FIX] 메뉴 진입/변경 시 팝업 상태 초기화 (자동 팝업 방지)
     if "last_partner_submenu" not in st.session_state:
@@ -486,6 +489,7 @@ def render_partners(db, sub_menu):
         st.info("출고 작업 시 선택할 배송방법을 관리합니다.")
         manage_code("shipping_methods", ["택배", "화물", "용차", "직배송", "퀵서비스", "기타"], "배송방법")
 
+@track_db_usage
 def render_machines(db, sub_menu):
     st.header("제직기 관리")
     
@@ -602,6 +606,7 @@ def render_machines(db, sub_menu):
                     st.success("삭제되었습니다.")
                     st.rerun()
 
+@track_db_usage
 def render_codes(db, sub_menu):
     st.header("제품코드 설정")
     st.info("제품 코드 생성을 위한 각 부분의 코드 및 포맷을 설정합니다.")
@@ -1,18 +1,24 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import base64
 import calendar
 import streamlit.components.v1 as components
 import uuid
 from firebase_admin import firestore
 from utils import get_users_list
+from db_usage import track_db_usage
+from notice_posts import (load_post, record_view, pending_views, post_audience, department_targets, viewer_keys, can_view,
+                          ensure_post_audience, load_pinned_posts, load_post_page, count_posts, search_posts)
+from schedule_events import (RECURRENCE_LABELS, load_events, expand_events, describe_period, new_event,
+                             ensure_schedule_events)
+from post_attachments import MAX_ATTACHMENT_SIZE, save_attachment, delete_attachment, delete_post, attachment_loader, has_attachment, format_size
 # [FIX] holidays 라이브러리를 선택적으로 임포트하여 Pylance 경고 해결
 try:
     import holidays # type: ignore
 except ImportError:
     holidays = None
 
+@track_db_usage
 def render_notice_board(db):
     st.title("공지사항")
     
@@ -38,16 +44,6 @@ def render_notice_board(db):
     current_user_dept = st.session_state.get("department", "")
     current_role = st.session_state.get("role", "user")
 
-    # [NEW] 만료된 게시물 자동 삭제 (현재 시간 기준)
-    try:
-        now = datetime.datetime.now()
-        # expiration_date 필드가 있고, 현재 시간보다 과거인 문서 조회 및 삭제
-        expired_docs = db.collection("posts").where("expiration_date", "<", now).stream()
-        for doc in expired_docs:
-            db.collection("posts").document(doc.id).delete()
-    except Exception:
-        pass # 인덱스 오류 등 예외 발생 시 무시 (최초 실행 시 발생 가능)
-
     # [NEW] 작성 중 상태 확인 (리런 시 닫힘 방지)
     is_writing = (
         st.session_state.get("np_title") or 
@@ -99,79 +95,44 @@ def render_notice_board(db):
             st.query_params.clear()
             st.rerun()
 
-    # 공지사항 목록 조회 (검색을 위해 전체 조회 후 필터링)
-    # [최적화] 최근 50개만 조회하여 읽기 비용 절감
-    posts_ref = db.collection("posts").order_by("created_at", direction=firestore.Query.DESCENDING).limit(50)
-    all_docs = list(posts_ref.stream())
-    
-    if all_docs:
-        visible_posts = []
-        
-        # 검색 조건 준비
-        f_author = st.session_state["n_search_author"]
-        f_keyword = st.session_state["n_search_keyword"]
-        
-        for doc in all_docs:
-            p_data = doc.to_dict()
-            p_data['id'] = doc.id
-            
-            # [NEW] 권한 체크: 내가 볼 수 있는 글인가?
-            # 1. 전체공지
-            # 2. 내가 작성자
-            # 3. 관리자
-            # 4. 나에게 온 공지 (대상선택)
-            
-            t_type = p_data.get('target_type')
-            t_val = p_data.get('target_value')
-            author_id = p_data.get('author_id')
-            
-            is_visible = False
-            
-            # 1. 관리자나 작성자는 무조건 봄
-            if current_role == "admin" or author_id == current_user_id:
-                is_visible = True
-            # 2. 대상선택인 경우 본인 포함 여부 확인
-            elif t_type == "대상선택":
-                if isinstance(t_val, list):
-                    for target in t_val:
-                        if target.startswith(f"{current_user_id} ("):
-                            is_visible = True
-                            break
-            # 3. 그 외(전체공지, None, 빈값 등)는 모두 전체 공개로 간주
-            else:
-                is_visible = True
-            
-            if not is_visible: continue
-            
-            # [NEW] 검색 필터 적용
-            
-            # 2. 작성자
-            if f_author and f_author not in p_data.get('author', ''): continue
-            
-            # 3. 키워드 (제목+내용)
-            if f_keyword:
-                txt = f"{p_data.get('title', '')} {p_data.get('content', '')}"
-                if f_keyword not in txt: continue
+    # 검색 조건 준비
+    f_author = st.session_state["n_search_author"]
+    f_keyword = st.session_state["n_search_keyword"]
 
-            visible_posts.append(p_data)
-        
-        # 필독/일반 정렬 (중요한 것 우선, 그 다음 최신순)
-        visible_posts.sort(key=lambda x: (x.get('is_important', False), x.get('created_at', datetime.datetime.min)), reverse=True)
-        
-        # [NEW] 페이징 처리
-        items_per_page = 10
-        total_items = len(visible_posts)
-        total_pages = max(1, (total_items + items_per_page - 1) // items_per_page)
-        
-        if st.session_state["notice_page"] > total_pages: st.session_state["notice_page"] = total_pages
-        if st.session_state["notice_page"] < 1: st.session_state["notice_page"] = 1
-        
-        curr_page = st.session_state["notice_page"]
-        start_idx = (curr_page - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        
-        page_posts = visible_posts[start_idx:end_idx]
+    # 공지사항 목록 조회
+    # [수정] 최근 50개를 읽어 권한을 확인하던 방식 대신, 공개 대상 색인(audience)으로 볼 수 있는 글만 서버에서 페이지 단위 조회
+    # [최적화] 목록은 메타데이터 필드만 조회 (본문은 내용 검색 시에만, 첨부파일은 제외)
+    ensure_post_audience(db)
+    is_admin = current_role == "admin"
+    audience_keys = viewer_keys(current_user_id, current_user_dept)
+    items_per_page = 10
+
+    # 페이지별 시작 커서 (1페이지는 처음부터, 다음 페이지로 이동할 때 기록)
+    page_cursors = st.session_state.setdefault("notice_page_cursors", {1: None})
+    if st.session_state["notice_page"] not in page_cursors: st.session_state["notice_page"] = 1
+    curr_page = st.session_state["notice_page"]
+    next_cursor = None
+
+    if f_author or f_keyword:
+        # 검색: 볼 수 있는 최근 게시물에서 작성자/키워드 조건으로 거른 뒤 화면에서 페이지 나눔
+        found_posts = search_posts(db, audience_keys, is_admin, f_author, f_keyword)
+        total_pages = max(1, (len(found_posts) + items_per_page - 1) // items_per_page)
+        if curr_page > total_pages: curr_page = st.session_state["notice_page"] = total_pages
+        page_posts = found_posts[(curr_page - 1) * items_per_page:curr_page * items_per_page]
+        has_next = curr_page < total_pages
+    else:
+        # 중요 공지는 1페이지 상단에 고정, 일반 공지는 최신순 커서 페이지 조회
+        total_pages = max(1, (count_posts(db, audience_keys, is_admin) + items_per_page - 1) // items_per_page)
+        page_posts, next_cursor = load_post_page(db, audience_keys, is_admin, items_per_page, page_cursors[curr_page])
+        if curr_page == 1:
+            page_posts = load_pinned_posts(db, audience_keys, is_admin) + page_posts
+        has_next = next_cursor is not None
 
+    # [수정] 만료 게시물 삭제는 백그라운드 정리 작업(post_sweeper)에서 처리하고, 정리 전 만료분은 표시만 제외
+    now = datetime.datetime.now()
+    page_posts = [p for p in page_posts if not p.get('expiration_date') or p['expiration_date'].replace(tzinfo=None) >= now]
+
+    if page_posts:
         # 페이징 컨트롤 렌더링 함수
         def render_pagination_controls():
             col_prev, col_info, col_next = st.columns([1.2, 5, 1.2])
@@ -184,7 +145,8 @@ def render_notice_board(db):
             with col_info:
                 st.markdown(f"<div style='text-align: center; line-height: 35px;'>Page {curr_page} / {total_pages}</div>", unsafe_allow_html=True)
             with col_next:
-                if st.button("다음 페이지 ▶", disabled=(curr_page == total_pages), key="btn_next_page", use_container_width=True):
+                if st.button("다음 페이지 ▶", disabled=not has_next, key="btn_next_page", use_container_width=True):
+                    page_cursors[curr_page + 1] = next_cursor
                     st.session_state["notice_page"] += 1
                     st.session_state["selected_post_id"] = None # 페이지 이동 시 선택 해제
                     st.session_state["notice_list_key"] += 1
@@ -272,7 +234,7 @@ def render_notice_board(db):
                 # 사용자 목록 가져오기
                 # [최적화] 캐싱된 함수 사용
                 users_list = get_users_list()
-                users_opts = [f"{u.get('username')} ({u.get('name')})" for u in users_list]
+                users_opts = [f"{u.get('username')} ({u.get('name')})" for u in users_list] + department_targets(users_list)
                 
                 # '전체 공지'를 옵션의 첫 번째에 추가
                 target_options = ["전체 공지"] + users_opts
@@ -307,19 +269,14 @@ def render_notice_board(db):
                             target_type = "대상선택"
                             target_value = selected_targets
 
-                        # 파일 처리 (Base64 인코딩하여 Firestore에 저장 - 용량 제한 주의)
-                        file_data = None
-                        file_name = None
+                        # [수정] 첨부파일은 게시물 문서 밖의 분할 저장소에 저장 (게시물에는 메타데이터만 기록)
+                        post_ref = db.collection("posts").document()
+                        file_meta = {}
                         if uploaded_file:
-                            # [수정] Firestore 문서 제한(1MB) 고려하여 파일 크기 제한 축소 (Base64 인코딩 시 약 33% 용량 증가)
-                            # 1MB = 1,048,576 bytes. Base64로 변환하면 약 1.37MB가 되어 저장 불가.
-                            # 안전하게 700KB로 제한 (700KB * 1.33 = 931KB + 기타 필드 < 1MB)
-                            if uploaded_file.size > 700 * 1024:
-                                st.error("첨부파일은 700KB 이하여야 합니다. (데이터베이스 문서 크기 제한)")
+                            if uploaded_file.size > MAX_ATTACHMENT_SIZE:
+                                st.error(f"첨부파일은 {format_size(MAX_ATTACHMENT_SIZE)} 이하여야 합니다.")
                                 st.stop()
-                            file_bytes = uploaded_file.read()
-                            file_data = base64.b64encode(file_bytes).decode('utf-8')
-                            file_name = uploaded_file.name
+                            file_meta = save_attachment(db, post_ref, uploaded_file.name, uploaded_file.getvalue())
 
                         doc_data = {
                             "title": title,
@@ -330,12 +287,12 @@ def render_notice_board(db):
                             "is_important": is_important,
                             "target_type": target_type,
                             "target_value": target_value, # list or string
+                            "audience": post_audience(target_type, target_value, current_user_id), # [NEW] 공개 대상 색인
                             "expiration_date": expiration_date,
-                            "file_name": file_name,
-                            "file_data": file_data,
-                            "views": 0
+                            "views": 0,
+                            **file_meta
                         }
-                        db.collection("posts").add(doc_data)
+                        post_ref.set(doc_data)
                         st.success("등록되었습니다.")
                         
                         # 입력 필드 초기화 (세션 상태 삭제)
@@ -382,7 +339,10 @@ def render_notice_board(db):
                     st.query_params.clear()
                     st.rerun()
 
-            post = next((p for p in visible_posts if p['id'] == selected_id), None)
+            # [최적화] 본문은 게시물을 열 때 1건만 조회 ([수정] 목록에 없는 오래된 글도 권한이 있으면 표시)
+            post = load_post(db, selected_id)
+            if post and not can_view(post, audience_keys, is_admin):
+                post = None
             
             if post:
                 
@@ -399,7 +359,7 @@ def render_notice_board(db):
                         
                         # 사용자 목록 다시 로드
                         users_list = get_users_list()
-                        users_opts = [f"{u.get('username')} ({u.get('name')})" for u in users_list]
+                        users_opts = [f"{u.get('username')} ({u.get('name')})" for u in users_list] + department_targets(users_list)
                         target_options = ["전체 공지"] + users_opts
                         
                         # 기존 값 복원
@@ -439,7 +399,7 @@ def render_notice_board(db):
                         has_file = bool(post.get('file_name'))
                         delete_file = False
                         if has_file:
-                            st.info(f"현재 첨부파일: {post.get('file_name')}")
+                            st.info(f"현재 첨부파일: {post.get('file_name')} {format_size(post.get('file_size'))}")
                             delete_file = st.checkbox("첨부파일 삭제", key=f"del_file_{post['id']}")
                         
                         new_file = st.file_uploader("새 첨부파일 업로드 (기존 파일 대체)", type=['png', 'jpg', 'jpeg', 'pdf', 'xlsx', 'txt'], key=f"new_file_{post['id']}")
@@ -462,23 +422,23 @@ def render_notice_board(db):
                                 "content": e_content,
                                 "target_type": e_target_type,
                                 "target_value": e_target_value,
+                                "audience": post_audience(e_target_type, e_target_value, post.get('author_id')),
                                 "is_important": e_is_important,
                                 "expiration_date": e_expiration_date
                             }
                             
-                            # 파일 업데이트 로직
+                            # 파일 업데이트 로직 ([수정] 분할 저장소 사용, 기존 Base64 첨부는 제거)
+                            post_ref = db.collection("posts").document(post['id'])
                             if new_file:
-                                if new_file.size > 1024 * 1024:
-                                    st.error("첨부파일은 1MB 이하여야 합니다.")
+                                if new_file.size > MAX_ATTACHMENT_SIZE:
+                                    st.error(f"첨부파일은 {format_size(MAX_ATTACHMENT_SIZE)} 이하여야 합니다.")
                                     st.stop()
-                                file_bytes = new_file.read()
-                                updates['file_data'] = base64.b64encode(file_bytes).decode('utf-8')
-                                updates['file_name'] = new_file.name
-                            elif delete_file:
+                                updates.update(save_attachment(db, post_ref, new_file.name, new_file.getvalue()))
                                 updates['file_data'] = firestore.DELETE_FIELD
-                                updates['file_name'] = firestore.DELETE_FIELD
+                            elif delete_file:
+                                updates.update(delete_attachment(db, post_ref))
                             
-                            db.collection("posts").document(post['id']).update(updates)
+                            post_ref.update(updates)
                             st.session_state["edit_post_id"] = None
                             st.success("수정되었습니다.")
                             st.rerun()
@@ -488,6 +448,10 @@ def render_notice_board(db):
                             st.rerun()
                 else:
                     # 상세 조회 뷰
+                    # [NEW] 조회수 (버퍼에 모아 주기적으로 반영)
+                    record_view(db, post['id'])
+                    view_count = post.get('views', 0) + pending_views(post['id'])
+
                     # 대상 문자열 처리
                     target_str = "전체"
                     if post.get('target_type') == "대상선택":
@@ -510,7 +474,7 @@ def render_notice_board(db):
                     st.markdown(f"""
                     <div style="border-bottom: 2px solid #eee; padding-bottom: 10px; margin-bottom: 20px;">
                         <h3>{badge_html} {post['title']}</h3>
-                        <div class="notice-meta">작성자: {post.get('author')} | 작성일: {post.get('created_at').strftime('%Y-%m-%d %H:%M') if post.get('created_at') else ''} | 대상: {target_str}</div>
+                        <div class="notice-meta">작성자: {post.get('author')} | 작성일: {post.get('created_at').strftime('%Y-%m-%d %H:%M') if post.get('created_at') else ''} | 대상: {target_str} | 조회: {view_count}</div>
                     </div>
                     """, unsafe_allow_html=True)
                     
@@ -520,12 +484,11 @@ def render_notice_board(db):
                     </div>
                     """, unsafe_allow_html=True)
                     
-                    # 첨부파일 다운로드
-                    if post.get('file_data') and post.get('file_name'):
-                        b64_data = post['file_data']
-                        file_name = post['file_name']
-                        href = f'<a href="data:application/octet-stream;base64,{b64_data}" download="{file_name}">첨부파일: {file_name} 다운로드</a>'
-                        st.markdown(href, unsafe_allow_html=True)
+                    # 첨부파일 다운로드 ([수정] 버튼을 누를 때만 파일 내용을 읽음)
+                    if has_attachment(post):
+                        st.download_button(f"첨부파일: {post['file_name']} {format_size(post.get('file_size'))} 다운로드",
+                                           attachment_loader(db, post), file_name=post['file_name'],
+                                           mime="application/octet-stream", key=f"dl_file_{post['id']}", on_click="ignore")
                     
                     # 수정/삭제 버튼 (본인 또는 관리자만)
                     if current_role == "admin" or current_user_id == post.get("author_id"):
@@ -537,12 +500,13 @@ def render_notice_board(db):
                                 st.rerun()
                         with c_del:
                             if st.button("삭제", key=f"del_post_{post['id']}", use_container_width=True):
-                                db.collection("posts").document(post['id']).delete()
+                                delete_post(db, post['id'])
                                 st.session_state["selected_post_id"] = None
                                 st.session_state["notice_list_key"] += 1
                                 st.query_params.clear()
                                 st.rerun()
 
+@track_db_usage
 def render_schedule(db):
     st.title("업무일정 (Calendar)")
     
@@ -550,6 +514,9 @@ def render_schedule(db):
     current_role = st.session_state.get("role", "user")
     current_user_id = st.session_state.get("user_id", "") # For author check
 
+    # [NEW] 기존 날짜별 일정 문서를 이벤트 문서로 변환 (최초 1회)
+    ensure_schedule_events(db)
+
     # [NEW] 일정 수정 모달 처리
     edit_id = st.query_params.get("edit_schedule_id")
     if edit_id:
@@ -563,7 +530,7 @@ def render_schedule(db):
                 @st.dialog("일정 수정")
                 def edit_schedule_dialog(sch_data, doc_id):
                     with st.form("edit_schedule_form"):
-                        st.write(f"**{sch_data.get('date')}** 일정 수정")
+                        st.write(f"**{describe_period(sch_data)}** 일정 수정")
                         
                         # 기존 값 로드
                         is_all_day = sch_data.get('is_all_day', True)
@@ -858,20 +825,13 @@ def render_schedule(db):
     holiday_map = {doc.id: doc.to_dict() for doc in holidays_ref}
 
     # [수정] 일정 데이터 조회 (필터 적용)
-    schedules_query = db.collection("schedules").where("date", ">=", s_str).where("date", "<=", e_str)
-    
-    schedules_ref = schedules_query.stream()
+    # [최적화] 해당 월과 겹치는 일정(기간/반복 포함)만 조회하고 날짜별로 메모리에서 펼침
+    # [최적화] 작성자 필터는 서버에서 처리 (author+date+end_date 복합 인덱스, query_registry 참고)
+    month_events = load_events(db, start_date, end_date, current_user_name if show_my_only else None)
     
     # 날짜별 일정 매핑
     schedule_map = {}
-    for doc in schedules_ref:
-        d = doc.to_dict()
-        d['id'] = doc.id
-        
-        # [NEW] 메모리 상에서 작성자 필터링 (복합 인덱스 오류 방지)
-        if show_my_only and d.get('author') != current_user_name:
-            continue
-            
+    for d in expand_events(month_events, start_date, end_date):
         d_date = d.get('date') # YYYY-MM-DD
         if d_date:
             day_int = int(d_date.split('-')[2])
@@ -1088,17 +1048,11 @@ def render_schedule(db):
         l_holiday_map = {doc.id: doc.to_dict() for doc in l_h_docs}
         
         # 일정 조회
-        l_s_docs = db.collection("schedules").where("date", ">=", l_s_str).where("date", "<=", l_e_str).stream()
-        for doc in l_s_docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            if show_my_only and d.get('author') != current_user_name: continue
-            l_raw_schedules.append(d)
+        l_raw_schedules = load_events(db, l_start, l_end, current_user_name if show_my_only else None)
     else:
         # 달력 데이터 재사용
         l_holiday_map = holiday_map
-        for day_list in schedule_map.values():
-            l_raw_schedules.extend(day_list)
+        l_raw_schedules = month_events
 
     # 1. 특정일(휴일) 데이터 처리 (미리 병합)
     holiday_groups_map = {}
@@ -1123,49 +1077,20 @@ def render_schedule(db):
             'id': f"holiday_grp_{gid}", 'date': dates[0], 'end_date': dates[-1],
             'content': info.get('name'), 'author': '관리자', 'is_all_day': True,
             'type': '긴급', 'color': info.get('color', '#d93025'),
-            'is_holiday': True, 'merged_ids': [] 
+            'is_holiday': True
         }
         final_schedules.append(holiday_sch)
     
-    # 2. 일반 일정 데이터 처리 (병합 로직 적용)
-    l_raw_schedules.sort(key=lambda x: (x.get('date', ''), x.get('time', '00:00')))
-    
-    merged_normal_schedules = []
-    if l_raw_schedules:
-        curr = l_raw_schedules[0].copy()
-        curr['end_date'] = curr['date']
-        curr['merged_ids'] = [curr['id']]
-        
-        for next_sch in l_raw_schedules[1:]:
-            is_same_meta = (curr['content'] == next_sch['content'] and curr.get('author') == next_sch.get('author') and curr.get('type') == next_sch.get('type') and curr.get('time') == next_sch.get('time'))
-            curr_gid, next_gid = curr.get('group_id'), next_sch.get('group_id')
-            is_same_group = (curr_gid is not None) and (curr_gid == next_gid)
-            
-            is_consecutive = False
-            try:
-                is_consecutive = (datetime.datetime.strptime(next_sch['date'], "%Y-%m-%d").date() - datetime.datetime.strptime(curr['end_date'], "%Y-%m-%d").date()).days == 1
-            except: pass
-            
-            should_merge = is_same_meta and (is_same_group or (curr_gid is None and next_gid is None and is_consecutive))
-            
-            if should_merge:
-                curr['end_date'] = next_sch['date']
-                curr['merged_ids'].append(next_sch['id'])
-            else:
-                merged_normal_schedules.append(curr)
-                curr = next_sch.copy()
-                curr['end_date'] = curr['date']
-                curr['merged_ids'] = [curr['id']]
-        merged_normal_schedules.append(curr)
-        
-    final_schedules.extend(merged_normal_schedules)
+    # 2. 일반 일정 데이터 처리
+    # [수정] 기간/반복 일정은 문서 1건이므로 병합 없이 그대로 표시
+    final_schedules.extend(l_raw_schedules)
     final_schedules.sort(key=lambda x: (x.get('date', ''), x.get('time', '00:00')))
     
     if final_schedules:
         for sch in final_schedules:
             # [수정] 버튼 간격을 좁히기 위해 컬럼 비율 조정
             col1, col2 = st.columns([7, 1.2])
-            date_str = f"{sch['date']} ~ {sch['end_date']}" if sch['date'] != sch['end_date'] else sch['date']
+            date_str = describe_period(sch)
             time_display = "하루일정" if sch.get('is_all_day', True) else sch.get('time', '')
             author_str, content_str, custom_color = sch.get('author', 'Unknown'), sch['content'], sch.get('color', None)
             
@@ -1181,9 +1106,7 @@ def render_schedule(db):
                 if st.session_state.get(del_key):
                     dc1, dc2 = col2.columns(2)
                     if dc1.button("✅", key=f"yes_{sch['id']}", help="삭제 확인"):
-                        batch = db.batch()
-                        for mid in sch['merged_ids']: batch.delete(db.collection("schedules").document(mid))
-                        batch.commit()
+                        db.collection("schedules").document(sch['id']).delete()
                         del st.session_state[del_key]
                         st.rerun()
                     if dc2.button("❌", key=f"no_{sch['id']}", help="취소"):
@@ -1205,17 +1128,23 @@ def render_schedule(db):
 
     with st.expander("일정 등록하기"):
         # [수정] 일정 등록 방식 개선 (라디오 버튼으로 명확하게 분리)
-        sch_mode = st.radio("일정 유형", ["하루 일정", "기간 일정"], horizontal=True)
+        sch_mode = st.radio("일정 유형", ["하루 일정", "기간 일정", "반복 일정"], horizontal=True)
         
         s_start_date = None
         s_end_date = None
         s_time = None
+        s_recurrence = None
         is_all_day = True
         
-        if sch_mode == "하루 일정":
+        if sch_mode in ["하루 일정", "반복 일정"]:
             c1, c2 = st.columns(2)
-            s_start_date = c1.date_input("날짜", datetime.date(sel_year, sel_month, today.day))
+            s_start_date = c1.date_input("날짜" if sch_mode == "하루 일정" else "시작일", datetime.date(sel_year, sel_month, today.day))
             s_end_date = s_start_date
+            # [NEW] 반복 일정: 반복 주기와 종료일 (문서 1건으로 저장)
+            if sch_mode == "반복 일정":
+                rc1, rc2 = c1.columns(2)
+                s_recurrence = rc1.selectbox("반복", list(RECURRENCE_LABELS), format_func=RECURRENCE_LABELS.get)
+                s_end_date = rc2.date_input("반복 종료일", s_start_date + datetime.timedelta(days=90))
             
             # [수정] 시간 설정 UI 배치 변경 (라디오 버튼 옆에 시간 입력)
             with c2:
@@ -1237,37 +1166,14 @@ def render_schedule(db):
         if st.button("일정 추가", type="primary"):
             if s_content:
                 # 유효성 검사
-                if sch_mode == "기간 일정" and s_start_date > s_end_date:
+                if sch_mode != "하루 일정" and s_start_date > s_end_date:
                     st.error("종료일이 시작일보다 앞설 수 없습니다.")
                     st.stop()
 
-                batch = db.batch()
-                # 기간 일정인 경우 그룹 ID 생성 (하루 일정이라도 시작!=종료일 수 없지만 로직상 분리)
-                is_range = (sch_mode == "기간 일정" and s_start_date != s_end_date)
-                group_id = str(uuid.uuid4()) if is_range else None
-                
-                target_dates = []
-                if is_range:
-                    for i in range((s_end_date - s_start_date).days + 1):
-                        target_dates.append(s_start_date + datetime.timedelta(days=i))
-                else:
-                    target_dates.append(s_start_date)
-                
-                for d in target_dates:
-                    doc_ref = db.collection("schedules").document()
-                    doc_data = {
-                        "date": str(d),
-                        "content": s_content,
-                        "type": s_type,
-                        "author": current_user_name,
-                        "is_all_day": is_all_day,
-                        "group_id": group_id
-                    }
-                    if not is_all_day and s_time:
-                        doc_data["time"] = s_time.strftime("%H:%M")
-                    batch.set(doc_ref, doc_data)
-                
-                batch.commit()
+                # [수정] 기간/반복 일정도 문서 1건으로 저장 (날짜별 문서 생성 안 함)
+                time_str = s_time.strftime("%H:%M") if s_time else None
+                db.collection("schedules").add(new_event(s_start_date, s_end_date, s_content, s_type, current_user_name,
+                                                         is_all_day, time_str, s_recurrence))
                 st.success("추가되었습니다.")
                 st.rerun()
             else:
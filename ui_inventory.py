@@ -4,9 +4,15 @@ import datetime
 import io
 import uuid
 from firebase_admin import firestore
-from utils import get_partners, get_common_codes, search_address_api, generate_report_html, save_user_settings, load_user_settings
+from utils import get_partners, get_common_codes, search_address_api, generate_report_html, save_user_settings, load_user_settings, get_docs_map, stamp_updated_at, delete_orders
+from db_usage import track_db_usage
+from order_mirror import get_active_orders, sync_order_mirror
+from inventory_summary import record_inventory_changes, load_inventory_summary, rebuild_inventory_summary, inventory_rebuild_needed
+from stats_rollup import record_stats_changes
+from order_history import mark_history_stale
 
 # [NEW] 재고 현황 로직을 별도 함수로 분리 (출고 작업과 재고 현황에서 공유)
+@track_db_usage
 def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
     # [NEW] 파트너 권한 확인
     user_role = st.session_state.get("role")
@@ -311,6 +317,11 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
         c1, c2, c3 = st.columns([1.2, 1, 5])
         if c1.button("✅ 변경 확정", type="primary", key=f"confirm_inv_changes_{allow_shipping}_{key_prefix}"):
             # Firestore에 변경사항 업데이트
+            # [수정] 변경 전 문서를 일괄 조회하여 재고 요약 증감과 함께 batch로 기록
+            before_docs = get_docs_map(db, "orders", [c['id'] for c in changes])
+            summary_changes = []
+            batch = db.batch()
+            batch_count = 0
             for change in changes:
                 doc_id = change['id']
                 update_data = {}
@@ -320,10 +331,24 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                     update_data['shipping_unit_price'] = change['changes']['shipping_unit_price'][1]
                 
                 if update_data:
-                    db.collection("orders").document(doc_id).update(update_data)
+                    batch.update(db.collection("orders").document(doc_id), stamp_updated_at(update_data))
+                    batch_count += 1
+                    before = before_docs.get(doc_id)
+                    if before is not None:
+                        summary_changes.append((before, {**before, **update_data}))
+                    if batch_count >= 400:
+                        batch.commit()
+                        batch = db.batch()
+                        batch_count = 0
+            
+            batch_count += record_inventory_changes(db, summary_changes, batch=batch)
+            batch_count += record_stats_changes(db, summary_changes, batch=batch)
+            if batch_count > 0:
+                batch.commit()
             
             st.success(f"{len(changes)}건의 재고 정보가 수정되었습니다.")
             del st.session_state[changes_key]
+            sync_order_mirror()
             st.rerun()
             
         if c2.button("❌ 취소", key=f"cancel_inv_changes_{allow_shipping}_{key_prefix}"):
@@ -333,17 +358,8 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
         st.stop() # 검토 중에는 아래 UI를 그리지 않음
 
     # 재고 기준: status == "봉제완료" (출고 전 단계)
-    docs = db.collection("orders").where("status", "==", "봉제완료").stream()
-    rows = []
-    for doc in docs:
-        d = doc.to_dict()
-        
-        # [NEW] 파트너인 경우 본인 데이터만 필터링
-        if is_partner and linked_partner:
-            if d.get("customer") != linked_partner: continue
-            
-        d['id'] = doc.id
-        rows.append(d)
+    # [최적화] 진행중 발주 미러에서 조회 (파트너인 경우 본인 데이터만 발주처 색인으로 조회)
+    rows = get_active_orders(db, "봉제완료", customer=linked_partner if (is_partner and linked_partner) else None)
 
     if rows:
         df = pd.DataFrame(rows)
@@ -453,17 +469,25 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                 pass # 아래에서 처리
 
         # [MOVED] 요약 데이터 계산 (필터링 후)
-        summary = df.groupby('product_code').agg({
-            'product_type': 'first',
-            'yarn_type': 'first',
-            'weight': 'first',
-            'size': 'first',
-            'stock': 'sum',
-            'shipping_unit_price': 'mean',
-            'total_value': 'sum'
-        }).reset_index()
-        
-        summary['shipping_unit_price'] = summary['shipping_unit_price'].astype(int)
+        # [최적화] 제품코드별 요약은 사전 집계된 inventory_summary에서 1회 조회
+        # (발주처/제품명/비고 등 상세 항목으로 검색 중일 때만 목록에서 직접 집계)
+        if tab1 and (not search_keyword or search_criteria in ["제품코드", "제품종류"]):
+            summary = load_inventory_summary(db)
+            if search_keyword:
+                search_col = 'product_code' if search_criteria == "제품코드" else 'product_type'
+                summary = summary[summary[search_col].astype(str).str.lower().str.contains(search_keyword, na=False)]
+        else:
+            summary = df.groupby('product_code').agg({
+                'product_type': 'first',
+                'yarn_type': 'first',
+                'weight': 'first',
+                'size': 'first',
+                'stock': 'sum',
+                'shipping_unit_price': 'mean',
+                'total_value': 'sum'
+            }).reset_index()
+            
+            summary['shipping_unit_price'] = summary['shipping_unit_price'].astype(int)
         
         summary_cols = {
             'product_code': '제품코드', 'product_type': '제품종류',
@@ -545,6 +569,19 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                 # [NEW] 제품별 요약 목록 합계 표시
                 st.markdown(f"<div style='text-align:right; font-weight:bold; padding:5px; color:#333;'>총 재고수량 합계: {summary_view['stock'].sum():,}</div>", unsafe_allow_html=True)
 
+                # [NEW] 재고 요약 재계산 (관리자)
+                if is_admin and not allow_shipping:
+                    # [FIX] 대량 삭제 후 재계산이 필요한 경우 펼쳐서 안내
+                    rebuild_needed = inventory_rebuild_needed(db)
+                    with st.expander("재고 요약 재계산", expanded=rebuild_needed):
+                        if rebuild_needed:
+                            st.warning("발주 일괄 삭제 이후 요약을 다시 계산하지 않았습니다. 작업이 적은 시간에 재계산하세요.")
+                        st.caption("제품별 재고 요약이 실제 재고와 다를 때 재고(봉제완료) 내역으로 다시 계산합니다.")
+                        if st.button("요약 재계산", key=f"btn_rebuild_inv_summary_{key_prefix}"):
+                            with st.spinner("재계산 중..."):
+                                rebuild_inventory_summary(db)
+                            st.rerun()
+
                 if selection_summary.selection.rows:
                     idx = selection_summary.selection.rows[0]
                     sel_p_code = summary_view.iloc[idx]['product_code']
@@ -707,10 +744,12 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                             if st.session_state.get(f"confirm_del_{sel_p_code}_{key_prefix}"):
                                 st.warning("⚠️ 정말로 삭제하시겠습니까? (복구할 수 없습니다)")
                                 if st.button("✅ 예, 삭제합니다", key=f"btn_yes_del_{sel_p_code}_{key_prefix}"):
-                                    for idx, row in del_rows.iterrows():
-                                        db.collection("orders").document(row['id']).delete()
+                                    delete_orders(db, del_rows['id'].tolist())
+                                    record_inventory_changes(db, [(row, None) for _, row in del_rows.iterrows()])
+                                    record_stats_changes(db, [(row, None) for _, row in del_rows.iterrows()])
                                     st.success("삭제되었습니다.")
                                     st.session_state[f"confirm_del_{sel_p_code}_{key_prefix}"] = False
+                                    sync_order_mirror()
                                     st.rerun()
                                 if st.button("❌ 취소", key=f"btn_no_del_{sel_p_code}_{key_prefix}"):
                                     st.session_state[f"confirm_del_{sel_p_code}_{key_prefix}"] = False
@@ -724,10 +763,12 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                             if st.session_state.get(f"confirm_del_all_{sel_p_code}_{key_prefix}"):
                                 st.warning(f"⚠️ 경고: '{sel_p_code}' 제품의 모든 재고({len(detail_df)}건)가 삭제됩니다. 이 작업은 되돌릴 수 없습니다.")
                                 if st.button("✅ 예, 모두 삭제합니다", key=f"btn_yes_del_all_{sel_p_code}_{key_prefix}"):
-                                    for idx, row in detail_df.iterrows():
-                                        db.collection("orders").document(row['id']).delete()
+                                    delete_orders(db, detail_df['id'].tolist())
+                                    record_inventory_changes(db, [(row, None) for _, row in detail_df.iterrows()])
+                                    record_stats_changes(db, [(row, None) for _, row in detail_df.iterrows()])
                                     st.success("모든 재고가 삭제되었습니다.")
                                     st.session_state[f"confirm_del_all_{sel_p_code}_{key_prefix}"] = False
+                                    sync_order_mirror()
                                     st.rerun()
                 else:
                     # [NEW] 선택된 제품이 없을 때: 요약 목록 인쇄 버튼 표시
@@ -890,10 +931,12 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                         st.warning("⚠️ 정말로 삭제하시겠습니까? (복구할 수 없습니다)")
                         c_conf1, c_conf2 = st.columns(2)
                         if c_conf1.button("✅ 예, 삭제합니다", key=f"btn_yes_del_full_{key_prefix}"):
-                            for idx, row in del_rows.iterrows():
-                                db.collection("orders").document(row['id']).delete()
+                            delete_orders(db, del_rows['id'].tolist())
+                            record_inventory_changes(db, [(row, None) for _, row in del_rows.iterrows()])
+                            record_stats_changes(db, [(row, None) for _, row in del_rows.iterrows()])
                             st.success("삭제되었습니다.")
                             st.session_state[f"confirm_del_full_{key_prefix}"] = False
+                            sync_order_mirror()
                             st.rerun()
                         if c_conf2.button("❌ 취소", key=f"btn_no_del_full_{key_prefix}"):
                             st.session_state[f"confirm_del_full_{key_prefix}"] = False
@@ -1100,6 +1143,13 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
 
                 shipped_rows = [] # [NEW] 명세서 발행용 데이터 수집
 
+                # [최적화] 출고 대상 원본 문서를 한 번에 조회(get_all)한 뒤 batch로 일괄 기록
+                org_docs = get_docs_map(db, "orders", edited_staging['id'].tolist())
+                batch = db.batch()
+                batch_count = 0
+                summary_changes = [] # [NEW] 재고 요약 증감용 (변경 전, 변경 후)
+                new_ship_docs = [] # [NEW] 분할 출고로 생성된 문서 (통계 집계용)
+
                 for idx, row in edited_staging.iterrows():
                     doc_id = row['id']
                     ship_qty = int(row['출고수량'])
@@ -1137,20 +1187,29 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                     # 부분 출고 로직
                     current_stock = int(row['현재고'])
                     if ship_qty < current_stock:
+                        org_data = org_docs.get(doc_id)
+                        if org_data is None: continue # 그 사이 삭제된 문서
                         doc_ref = db.collection("orders").document(doc_id)
-                        org_data = doc_ref.get().to_dict()
+                        new_ref = db.collection("orders").document()
                         new_ship_doc = org_data.copy()
                         new_ship_doc.update(update_data)
                         new_ship_doc['stock'] = ship_qty
                         new_ship_doc['parent_id'] = doc_id
-                        db.collection("orders").add(new_ship_doc)
-                        doc_ref.update({"stock": current_stock - ship_qty})
+                        batch.set(new_ref, stamp_updated_at(new_ship_doc))
+                        batch.update(doc_ref, stamp_updated_at({"stock": current_stock - ship_qty}))
+                        batch_count += 2
+                        summary_changes.append((org_data, {**org_data, "stock": current_stock - ship_qty}))
+                        new_ship_docs.append(new_ship_doc)
                         
                         # 명세서용 데이터 추가
-                        new_ship_doc['id'] = "new_doc" # 임시 ID
+                        new_ship_doc = new_ship_doc.copy()
+                        new_ship_doc['id'] = new_ref.id
                         shipped_rows.append(new_ship_doc)
                     else:
-                        db.collection("orders").document(row['id']).update(update_data)
+                        batch.update(db.collection("orders").document(row['id']), stamp_updated_at(update_data))
+                        batch_count += 1
+                        if org_docs.get(doc_id) is not None:
+                            summary_changes.append((org_docs[doc_id], {**org_docs[doc_id], **update_data}))
                         
                         # 명세서용 데이터 추가 (원본 데이터 + 업데이트 데이터)
                         # sel_rows에서 원본 데이터 찾기
@@ -1159,6 +1218,18 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
                         original_row['stock'] = ship_qty
                         shipped_rows.append(original_row)
 
+                    if batch_count >= 400:
+                        batch.commit()
+                        batch = db.batch()
+                        batch_count = 0
+
+                batch_count += record_inventory_changes(db, summary_changes, batch=batch)
+                # [NEW] 통계 집계: 원본 변경분 + 분할 출고로 생긴 문서
+                batch_count += record_stats_changes(db, summary_changes + [(None, d) for d in new_ship_docs], batch=batch)
+                if batch_count > 0:
+                    batch.commit()
+                mark_history_stale([r.get('shipping_date') for r in shipped_rows])
+
                 st.success(f"{len(valid_staging)}건 출고 처리 완료!")
                 
                 # [FIX] 완료 후 선택 상태 초기화 (모든 제품 코드에 대해)
@@ -1171,10 +1242,12 @@ def render_inventory_logic(db, allow_shipping=False, key_prefix="inv"):
 
                 # [NEW] 출고된 데이터를 세션에 저장 (거래명세서 확인 버튼 활성화용)
                 st.session_state["last_shipped_data"] = pd.DataFrame(shipped_rows)
+                sync_order_mirror()
                 st.rerun()
         elif allow_shipping:
             st.info("👆 목록에서 출고할 항목을 선택해주세요.")
 
+@track_db_usage
 def render_inventory(db, sub_menu):
     st.header("재고 현황")
     st.info("현재 보유 중인 완제품 재고를 조회합니다.")
@@ -1234,6 +1307,7 @@ def render_inventory(db, sub_menu):
                             
                             success_count = 0
                             error_logs = []
+                            registered_docs = []
                             
                             progress_bar = st.progress(0)
                             
@@ -1305,11 +1379,14 @@ def render_inventory(db, sub_menu):
                                     "note": str(row.get("비고", "")) if pd.notna(row.get("비고")) else ""
                                 }
                                 
-                                db.collection("orders").add(doc_data)
+                                db.collection("orders").add(stamp_updated_at(doc_data))
+                                registered_docs.append((None, doc_data))
                                 success_count += 1
                                 progress_bar.progress((idx + 1) / len(df_upload))
                                 
                             if success_count > 0:
+                                record_inventory_changes(db, registered_docs)
+                                record_stats_changes(db, registered_docs)
                                 st.success(f"✅ {success_count}건의 재고가 등록되었습니다.")
                             
                             if error_logs:
@@ -1318,6 +1395,7 @@ def render_inventory(db, sub_menu):
                                     st.write(log)
                             
                             if success_count > 0:
+                                sync_order_mirror()
                                 st.rerun()
                                 
                     except Exception as e:
@@ -1429,9 +1507,12 @@ def render_inventory(db, sub_menu):
                                 "stock": reg_qty, "shipping_unit_price": reg_price,
                                 "status": "봉제완료", "note": reg_note
                             }
-                            db.collection("orders").add(doc_data)
+                            db.collection("orders").add(stamp_updated_at(doc_data))
+                            record_inventory_changes(db, [(None, doc_data)])
+                            record_stats_changes(db, [(None, doc_data)])
                             st.success(f"재고가 등록되었습니다. (번호: {stock_no})")
                             st.session_state["stock_reg_key"] += 1
+                            sync_order_mirror()
                             st.rerun()
 
     elif sub_menu == "재고 현황 조회":
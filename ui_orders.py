@@ -5,8 +5,15 @@ import io
 import uuid
 import re
 from firebase_admin import firestore
-from utils import get_partners, generate_report_html, get_common_codes, search_address_api, get_products_list, save_user_settings, load_user_settings
-
+from utils import get_partners, generate_report_html, get_common_codes, search_address_api, get_products_list, save_user_settings, load_user_settings, allocate_order_numbers, get_db, fetch_query_page, stamp_updated_at, delete_orders
+from db_usage import track_db_usage
+from order_import import build_import_docs, file_job_id, get_import_job, start_import_job, run_import_job, count_purge_targets, purge_orders
+from inventory_summary import record_inventory_changes
+from stats_rollup import record_stats_changes
+from order_mirror import ACTIVE_STATUSES
+from machine_status import record_machine_changes, rebuild_machine_status
+
+@track_db_usage
 def render_order_entry(db, sub_menu):
     st.header("발주서 접수")
     st.info("신규 발주서를 등록합니다. 개별 등록 또는 엑셀 일괄 업로드가 가능합니다.")
@@ -403,42 +410,10 @@ def render_order_entry(db, sub_menu):
             if st.button("발주 등록", type="primary"):
                 if name and customer:
                     # 발주번호 생성 로직 (YYMM + 3자리 일련번호, 예: 2505001)
-                    now = datetime.datetime.now()
-                    prefix = now.strftime("%y%m") # 예: 2405
-                    
-                    # [수정] 발주번호 생성 및 중복 방지 재시도 로직
-                    order_no = ""
-                    max_retries = 3
-                    
-                    for attempt in range(max_retries):
-                        # 해당 월의 가장 마지막 발주번호 조회
-                        last_docs = db.collection("orders")\
-                            .where("order_no", ">=", f"{prefix}000")\
-                            .where("order_no", "<=", f"{prefix}999")\
-                            .order_by("order_no", direction=firestore.Query.DESCENDING)\
-                            .limit(1)\
-                            .stream()
-                        
-                        last_seq = 0
-                        for doc in last_docs:
-                            last_val = doc.to_dict().get("order_no")
-                            if last_val and len(last_val) == 7:
-                                try:
-                                    last_seq = int(last_val[-3:])
-                                except:
-                                    pass
-                        
-                        # 시도 횟수에 따라 번호 증가 (동시 충돌 시 회피)
-                        new_seq = last_seq + 1 + attempt
-                        temp_order_no = f"{prefix}{new_seq:03d}"
-                        
-                        # [안전장치] DB에 해당 번호가 진짜 없는지 이중 확인
-                        dup_check = list(db.collection("orders").where("order_no", "==", temp_order_no).limit(1).stream())
-                        if not dup_check:
-                            order_no = temp_order_no
-                            break
-                    
-                    if not order_no:
+                    # [수정] 월별 카운터 트랜잭션으로 발급 (동시 접수 시 중복 방지)
+                    try:
+                        order_no = allocate_order_numbers(db, 1)[0]
+                    except Exception:
                         st.error("발주번호 생성 중 충돌이 발생했습니다. 잠시 후 다시 시도해주세요.")
                         st.stop()
 
@@ -469,7 +444,8 @@ def render_order_entry(db, sub_menu):
                         "note": note,
                         "status": "발주접수" # 초기 상태
                     }
-                    db.collection("orders").add(doc_data) # 'orders' 컬렉션에 저장
+                    db.collection("orders").add(stamp_updated_at(doc_data)) # 'orders' 컬렉션에 저장
+                    record_stats_changes(db, [(None, doc_data)])
                     st.success(f"발주번호 [{order_no}] 접수 완료!")
                     st.session_state["order_success_msg"] = f"✅ 발주번호 [{order_no}]가 성공적으로 등록되었습니다."
                     
@@ -482,6 +458,22 @@ def render_order_entry(db, sub_menu):
                 else:
                     st.error("제품명과 발주처는 필수 입력 항목입니다.")
 
+# [NEW] 거래처용 발주 현황 페이지 조회 (거래처별 캐시)
+# 발주처+접수일(+상태) 조건을 서버 쿼리로 처리하여 거래처가 보는 만큼만 읽습니다.
+# (필요 인덱스: customer+date, customer+status+date)
+PARTNER_PAGE_SIZE = 100
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_partner_orders_page(partner_name, start_date, end_date, statuses=None, cursor=None):
+    query = get_db().collection("orders")\
+        .where("customer", "==", partner_name)\
+        .where("date", ">=", start_date)\
+        .where("date", "<=", end_date)
+    if statuses:
+        query = query.where("status", "in", list(statuses))
+    return fetch_query_page(query, "date", PARTNER_PAGE_SIZE, cursor)
+
+@track_db_usage
 def render_partner_order_status(db):
     st.header("발주 현황 조회 (거래처용)")
     
@@ -520,30 +512,23 @@ def render_partner_order_status(db):
     start_date = datetime.datetime.combine(date_range[0], datetime.time.min)
     end_date = datetime.datetime.combine(date_range[1], datetime.time.max) if len(date_range) > 1 else datetime.datetime.combine(date_range[0], datetime.time.max)
 
-    # [수정] 복합 인덱스 오류 방지를 위해 customer로만 1차 조회 후 메모리 필터링
-    docs = db.collection("orders").where("customer", "==", partner_name).stream()
+    # [수정] 발주처/기간/상태는 서버에서 조회하고 100건 단위로 나누어 불러옴 (커서 페이지)
+    statuses = order_status_filter(filter_status)
+
+    page_key = (partner_name, start_date, end_date, statuses)
+    if st.session_state.get("partner_order_page_key") != page_key:
+        st.session_state["partner_order_page_key"] = page_key
+        st.session_state["partner_order_cursors"] = [None]
+
+    docs = []
+    next_cursor = None
+    for cursor in st.session_state["partner_order_cursors"]:
+        page_rows, next_cursor = load_partner_orders_page(partner_name, start_date, end_date, statuses, cursor)
+        docs.extend(page_rows)
     
     rows = []
-    for doc in docs:
-        d = doc.to_dict()
-        
-        # 1. 날짜 필터링 (메모리)
-        d_date = d.get('date')
-        if d_date:
-            if d_date.tzinfo: d_date = d_date.replace(tzinfo=None)
-            if not (start_date <= d_date <= end_date):
-                continue
-        else:
-            continue
-            
-        # 2. 상태 필터링 (메모리)
-        if filter_status == "미출고(출고완료 제외)":
-            if d.get('status') == '출고완료':
-                continue
-        elif filter_status != "전체" and d.get('status') != filter_status:
-            continue
-            
-        # [NEW] 3. 검색어 필터 (메모리)
+    for d in docs:
+        # 검색어 필터 (메모리)
         if search_keyword:
             search_keyword = search_keyword.lower()
             if search_criteria == "전체":
@@ -557,9 +542,6 @@ def render_partner_order_status(db):
                 if target_field and search_keyword not in str(d.get(target_field, '')).lower():
                     continue
             
-        # 정렬을 위해 원본 날짜 임시 저장
-        d['_sort_date'] = d.get('date')
-
         # 마스터 완료 상태 표시 변경
         if d.get('status') == "제직완료(Master)":
             d['status'] = "제직완료"
@@ -573,8 +555,8 @@ def render_partner_order_status(db):
              
         rows.append(d)
         
-    # 3. 날짜 기준 내림차순 정렬
-    rows.sort(key=lambda x: x.get('_sort_date', datetime.datetime.min), reverse=True)
+    if next_cursor:
+        st.caption(f"최근 {len(docs):,}건을 표시하고 있습니다. 목록 하단의 '더 보기'로 이전 내역을 불러올 수 있습니다.")
 
     if rows:
         df = pd.DataFrame(rows)
@@ -752,6 +734,35 @@ def render_partner_order_status(db):
     else:
         st.info("조회된 발주 내역이 없습니다.")
 
+    # [NEW] 다음 페이지 불러오기
+    if next_cursor:
+        if st.button(f"더 보기 (다음 {PARTNER_PAGE_SIZE}건)", key="partner_order_more"):
+            st.session_state["partner_order_cursors"].append(next_cursor)
+            st.rerun()
+
+# [NEW] 발주 현황 페이지 조회
+# 기간(+상태) 조건을 서버 쿼리로 처리하고, 접수일 내림차순으로 페이지 단위(커서)로 불러옵니다.
+# (필요 인덱스: status+date)
+ORDER_PAGE_SIZE_OPTIONS = [200, 500, 1000]
+
+def order_status_filter(filter_status):
+    """화면의 상태 필터를 쿼리용 상태 목록으로 변환합니다. (전체 = None)"""
+    if filter_status == "미출고(출고완료 제외)":
+        return tuple(ACTIVE_STATUSES + ["제직완료(Master)"])
+    if filter_status == "제직완료":
+        # 롤 분할 후 남은 부모 문서(Master)도 '제직완료'로 표시되므로 함께 조회
+        return ("제직완료", "제직완료(Master)")
+    if filter_status and filter_status != "전체":
+        return (filter_status,)
+    return None
+
+def load_orders_page(db, start_date, end_date, statuses=None, page_size=ORDER_PAGE_SIZE_OPTIONS[0], cursor=None):
+    query = db.collection("orders").where("date", ">=", start_date).where("date", "<=", end_date)
+    if statuses:
+        query = query.where("status", "in", list(statuses))
+    return fetch_query_page(query, "date", page_size, cursor)
+
+@track_db_usage
 def render_order_status(db, sub_menu):
     st.header("발주 현황")
     user_id = st.session_state.get("user_id")
@@ -821,8 +832,8 @@ def render_order_status(db, sub_menu):
             df_template = pd.DataFrame(template_data)
             
             # 제품 목록 미리 가져오기 (매핑용)
-            product_docs = list(db.collection("products").order_by("product_code").stream())
-            products_data = [doc.to_dict() for doc in product_docs]
+            # [최적화] 캐싱된 제품 목록 사용
+            products_data = get_products_list()
             # 구버전 데이터 호환
             for p in products_data:
                 if "weaving_type" in p and "product_type" not in p: p["product_type"] = p["weaving_type"]
@@ -846,6 +857,17 @@ def render_order_status(db, sub_menu):
                     st.write("데이터 미리보기:")
                     st.dataframe(df_upload.head())
                     
+                    # [NEW] 같은 파일의 중단된 등록 작업 확인 (이어서 등록)
+                    job_id = file_job_id(uploaded_file.getvalue())
+                    job = get_import_job(db, job_id)
+                    if job and job.get("status") == "진행중":
+                        done_rows = min(len(job.get("committed_chunks", [])) * job.get("chunk_size", 0), job.get("total", 0))
+                        st.warning(f"이 파일의 이전 등록 작업이 중단되었습니다. (약 {done_rows:,} / {job.get('total', 0):,}건 등록됨) '일괄 등록 시작'을 누르면 중단된 위치부터 이어서 등록합니다.")
+                    elif job:
+                        st.info("이미 등록이 완료된 파일입니다. 다시 등록하면 새 발주번호로 추가 등록됩니다.")
+                        job_id = f"{job_id}_{datetime.datetime.now().strftime('%y%m%d%H%M%S')}"
+                        job = None
+                    
                     # [NEW] 중복 방지를 위한 초기화 옵션 및 삭제 제외 설정 (UI 변경)
                     st.markdown("---")
                     c_del_main, c_del_sub = st.columns([1.2, 3])
@@ -865,134 +887,65 @@ def render_order_status(db, sub_menu):
                         if pc3.checkbox("봉제완료", value=False, disabled=is_disabled): preserve_list.append("봉제완료")
                         if pc4.checkbox("출고완료", value=True, disabled=is_disabled): preserve_list.append("출고완료")
 
+                    # [NEW] 삭제 예정 건수 미리 확인 (집계 쿼리, 실제 삭제 없음)
+                    if delete_existing and not job:
+                        purge_count = count_purge_targets(db, preserve_list)
+                        st.warning(f"🗑️ 삭제 예정: 기존 발주 내역 **{purge_count:,}건** (보존 상태: {', '.join(preserve_list) if preserve_list else '없음'})")
+
                     if st.button("일괄 등록 시작", type="primary"):
-                        # [NEW] 기존 데이터 삭제 로직
-                        if delete_existing:
+                        purged = False
+                        # [NEW] 기존 데이터 삭제 로직 (이어서 등록하는 경우 제외)
+                        if delete_existing and not job:
+                            # [수정] 보존 상태를 제외한 문서만 조회하여 병렬 삭제
                             with st.spinner("기존 데이터를 삭제하고 있습니다..."):
-                                all_docs = db.collection("orders").stream()
-                                del_count = 0
-                                batch = db.batch()
-                                for doc in all_docs:
-                                    # [NEW] 선택된 상태 유지 옵션
-                                    doc_status = doc.to_dict().get('status')
-                                    
-                                    # 제직완료 선택 시 Master도 포함하여 유지
-                                    if "제직완료" in preserve_list and doc_status == "제직완료(Master)":
-                                        continue
-                                        
-                                    if doc_status in preserve_list:
-                                        continue
-                                        
-                                    batch.delete(doc.reference)
-                                    del_count += 1
-                                    if del_count % 400 == 0:
-                                        batch.commit()
-                                        batch = db.batch()
-                                batch.commit()
+                                del_status = st.empty()
+                                del_count = purge_orders(db, preserve_list, lambda n: del_status.caption(f"{n:,}건 삭제 중..."))
+                                del_status.empty()
+                            purged = True
                             
                             excluded_msg = f"(제외된 상태: {', '.join(preserve_list)})" if preserve_list else ""
                             st.warning(f"기존 데이터 {del_count}건을 삭제했습니다. {excluded_msg} 신규 등록을 시작합니다.")
-
-                        # 제품 코드 매핑을 위한 딕셔너리 생성
-                        product_map = {p['product_code']: p for p in products_data}
-                        
-                        # 발주번호 생성을 위한 마지막 번호 조회
-                        now = datetime.datetime.now()
-                        prefix = now.strftime("%y%m")
-                        last_docs = db.collection("orders").where("order_no", ">=", f"{prefix}000").where("order_no", "<=", f"{prefix}999").order_by("order_no", direction=firestore.Query.DESCENDING).limit(1).stream()
-                        last_seq = 0
-                        for doc in last_docs:
-                            last_val = doc.to_dict().get("order_no")
-                            if last_val and len(last_val) == 7:
-                                try: last_seq = int(last_val[-3:])
-                                except: pass
+                            if del_count:
+                                st.info("삭제된 내역은 통계 집계와 제품별 재고 요약에 바로 반영되지 않습니다. 작업이 적은 시간에 통계 화면의 '집계 재계산'과 재고 화면의 '요약 재계산'을 실행하세요.")
+
+                        # [수정] 검증/매핑을 일괄 처리하고 400건 단위 batch를 병렬 커밋 (중단 시 이어서 등록)
+                        with st.spinner("데이터를 검증하고 있습니다..."):
+                            rows, error_logs = build_import_docs(df_upload, products_data)
+                            # 이어서 등록하는 경우 기존 작업(예약된 발주번호)을 그대로 사용
+                            if not job and rows:
+                                job = start_import_job(db, job_id, uploaded_file.name, rows)
                         
                         success_count = 0
-                        error_logs = []
-                        
-                        progress_bar = st.progress(0)
-                        
-                        for idx, row in df_upload.iterrows():
-                            p_code = str(row.get("제품코드", "")).strip()
-                            if p_code not in product_map:
-                                error_logs.append(f"{idx+2}행: 제품코드 '{p_code}'가 존재하지 않습니다.")
-                                continue
-                                
-                            product_info = product_map[p_code]
-                            last_seq += 1
-                            order_no = f"{prefix}{last_seq:03d}"
-                            
-                            # 날짜 파싱 헬퍼 함수
-                            def parse_date_val(val):
-                                if pd.isna(val) or str(val).strip() == "": return None
-                                try: return pd.to_datetime(val).to_pydatetime()
-                                except: return None
-                            
-                            def parse_str_date(val):
-                                if pd.isna(val) or str(val).strip() == "": return ""
-                                return str(val)[:10]
-
-                            reg_date = parse_date_val(row.get("접수일자")) or datetime.datetime.now()
-                            
-                            # 상태 처리
-                            status = str(row.get("현재상태", "발주접수")).strip()
-                            if not status or status == "nan": status = "발주접수"
-                                
-                            doc_data = {
-                                "product_code": p_code,
-                                "product_type": product_info.get('product_type', product_info.get('weaving_type')),
-                                "yarn_type": product_info.get('yarn_type'),
-                                "weight": product_info.get('weight'),
-                                "size": product_info.get('size'),
-                                
-                                "order_no": order_no,
-                                "date": reg_date,
-                                "order_type": str(row.get("구분", "")),
-                                "customer": str(row.get("발주처", "")),
-                                "delivery_req_date": str(row.get("납품요청일", "")),
-                                "name": str(row.get("제품명(고객용)", "")),
-                                "color": str(row.get("색상", "")),
-                                "stock": int(row.get("수량", 0)),
-                                "delivery_to": str(row.get("납품처", "")),
-                                "delivery_contact": str(row.get("납품연락처", "")),
-                                "delivery_address": str(row.get("납품주소", "")),
-                                "note": str(row.get("비고", "")),
-                                "status": status,
-                                
-                                # [NEW] 상세 정보 매핑 (과거 데이터)
-                                "machine_no": int(row.get("제직기번호", 0)) if pd.notna(row.get("제직기번호")) else None,
-                                "weaving_end_time": parse_date_val(row.get("제직완료일")),
-                                "real_stock": int(row.get("생산수량", 0)) if pd.notna(row.get("생산수량")) else 0,
-                                "prod_weight_kg": float(row.get("생산중량", 0)) if pd.notna(row.get("생산중량")) else 0.0,
-                                
-                                "dyeing_partner": str(row.get("염색업체", "")),
-                                "dyeing_in_date": parse_str_date(row.get("염색입고일")),
-                                
-                                "sewing_partner": str(row.get("봉제업체", "")),
-                                "sewing_end_date": parse_str_date(row.get("봉제완료일")),
-                                
-                                "shipping_date": parse_date_val(row.get("출고일")),
-                                "shipping_method": str(row.get("배송방법", "")),
-                                "shipping_carrier": str(row.get("배송업체", "")),
-                                "shipping_cost": int(row.get("운임비", 0)) if pd.notna(row.get("운임비")) else 0
-                            }
-                            
-                            # nan 문자열 정리
-                            for k, v in doc_data.items():
-                                if isinstance(v, str) and v == "nan": doc_data[k] = ""
+                        failed_chunks = []
+                        skipped_rows = []
+                        unlisted_rows = []
+                        machine_conflicts = []
+                        if job:
+                            progress_bar = st.progress(0, text="등록 준비 중...")
+                            def on_progress(done, total, rate):
+                                progress_bar.progress(done / total if total else 1.0, text=f"{done:,} / {total:,}건 등록 중... ({rate:,.0f}건/초)")
+                            success_count, failed_chunks, skipped_rows, unlisted_rows, machine_conflicts = run_import_job(db, job_id, job, rows, on_progress)
                             
-                            db.collection("orders").add(doc_data)
-                            success_count += 1
-                            progress_bar.progress((idx + 1) / len(df_upload))
+                        # [FIX] 통계 집계/재고 요약/제직기 상태는 등록 묶음마다 증분 반영, 삭제 후에는 재계산 필요 표시 (관리자 재계산)
+                        # 제직기 상태는 삭제된 작업이 제직기를 계속 잠그지 않도록 삭제 후 제직중 건으로만 다시 만듦
+                        if purged:
+                            rebuild_machine_status(db) # [FIX] 삭제/등록된 제직중 건으로 제직기 상태 재구성
                             
                         if success_count > 0:
                             st.success(f"✅ {success_count}건의 발주가 성공적으로 등록되었습니다.")
+                        if skipped_rows:
+                            st.warning(f"⚠️ 작업 시작 후 검증 오류가 생긴 {len(skipped_rows)}개 행은 등록하지 않았습니다. (행: {', '.join(map(str, skipped_rows[:20]))}{' ...' if len(skipped_rows) > 20 else ''})")
+                        for msg in machine_conflicts:
+                            st.warning(f"⚠️ {msg}")
+                        if unlisted_rows:
+                            # [FIX] 작업 생성 당시 검증 오류로 빠진 행 (발주번호가 예약되지 않아 이 작업으로는 등록하지 않음)
+                            st.warning(f"⚠️ 처음 등록할 때 검증 오류로 제외된 {len(unlisted_rows)}개 행은 이 작업에 포함되지 않아 등록하지 않았습니다. 해당 행만 담은 파일로 따로 등록하세요. (행: {', '.join(map(str, unlisted_rows[:20]))}{' ...' if len(unlisted_rows) > 20 else ''})")
+                        if failed_chunks:
+                            st.error(f"⚠️ 일부 묶음({len(failed_chunks)}개) 저장에 실패했습니다. 같은 파일로 '일괄 등록 시작'을 다시 누르면 실패한 부분부터 이어서 등록합니다.")
                         
                         if error_logs:
-                            st.error(f"⚠️ {len(error_logs)}건의 오류가 발생했습니다.")
-                            for log in error_logs:
-                                st.write(log)
-                                
+                            st.error(f"⚠️ {len(error_logs)}건의 오류가 발생했습니다. (오류 행은 등록되지 않았습니다)")
+                            st.dataframe(pd.DataFrame(error_logs), hide_index=True, use_container_width=True)
                 except Exception as e:
                     st.error(f"파일 처리 중 오류가 발생했습니다: {e}")
 
@@ -1038,8 +991,10 @@ def render_order_status(db, sub_menu):
                     selected_rows = df_del.iloc[selected_indices]
                     
                     if st.button(f"🗑️ 선택한 {len(selected_rows)}건 영구 삭제", type="primary"):
-                        for idx, row in selected_rows.iterrows():
-                            db.collection("orders").document(row['id']).delete()
+                        delete_orders(db, selected_rows['id'].tolist())
+                        record_machine_changes(db, [(row, None) for _, row in selected_rows.iterrows()]) # [FIX] 제직기 잠금 해제
+                        record_inventory_changes(db, [(row, None) for _, row in selected_rows.iterrows()])
+                        record_stats_changes(db, [(row, None) for _, row in selected_rows.iterrows()])
                         st.success(f"{len(selected_rows)}건이 삭제되었습니다.")
                         st.session_state["del_orders_key"] += 1
                         st.rerun()
@@ -1080,9 +1035,13 @@ def render_order_status(db, sub_menu):
             search_criteria = c3.selectbox("검색 기준", criteria_options, index=criteria_options.index(saved_criteria))
             search_keyword = c4.text_input("검색어 입력", value=st.session_state.get("search_keyword", ""))
             
-            c_b1, c_b2 = st.columns([1, 6])
+            c_b1, c_b2, c_b3 = st.columns([1, 4.5, 1.5])
             with c_b1:
                 search_btn = st.form_submit_button("조회", use_container_width=True)
+            # [NEW] 한 번에 불러올 건수 (더 보기로 추가 로드)
+            saved_page_size = st.session_state.get("search_page_size", ORDER_PAGE_SIZE_OPTIONS[0])
+            if saved_page_size not in ORDER_PAGE_SIZE_OPTIONS: saved_page_size = ORDER_PAGE_SIZE_OPTIONS[0]
+            page_size = c_b3.selectbox("페이지당 건수", ORDER_PAGE_SIZE_OPTIONS, index=ORDER_PAGE_SIZE_OPTIONS.index(saved_page_size), label_visibility="collapsed", format_func=lambda n: f"{n}건씩 보기")
 
     # 검색 버튼 클릭 시 세션에 검색 조건 저장 (새로고침 되어도 유지되도록)
     if search_btn:
@@ -1091,6 +1050,7 @@ def render_order_status(db, sub_menu):
         st.session_state["search_filter_status_single"] = filter_status
         st.session_state["search_criteria"] = search_criteria
         st.session_state["search_keyword"] = search_keyword
+        st.session_state["search_page_size"] = page_size
         st.rerun()
 
     if st.session_state.get("search_performed"):
@@ -1109,14 +1069,30 @@ def render_order_status(db, sub_menu):
         start_date = datetime.datetime.combine(s_date_range[0], datetime.time.min)
         end_date = datetime.datetime.combine(s_date_range[1], datetime.time.max) if len(s_date_range) > 1 else datetime.datetime.combine(s_date_range[0], datetime.time.max)
 
-        docs = db.collection("orders").where("date", ">=", start_date).where("date", "<=", end_date).order_by("date", direction=firestore.Query.DESCENDING).stream()
+        # [수정] 상태 조건은 쿼리로 처리하고 페이지 단위로 조회 (불러온 페이지의 커서를 세션에 유지)
+        s_statuses = order_status_filter(s_filter_status)
+        s_page_size = st.session_state.get("search_page_size", ORDER_PAGE_SIZE_OPTIONS[0])
+        page_key = (start_date, end_date, s_statuses, s_page_size)
+        if st.session_state.get("order_status_page_key") != page_key:
+            st.session_state["order_status_page_key"] = page_key
+            st.session_state["order_status_cursors"] = [None]
+
+        docs = []
+        next_cursor = None
+        for cursor in st.session_state["order_status_cursors"]:
+            page_rows, next_cursor = load_orders_page(db, start_date, end_date, s_statuses, s_page_size, cursor)
+            docs.extend(page_rows)
+
+        if next_cursor:
+            c_more1, c_more2 = st.columns([7.5, 2.5])
+            c_more1.caption(f"최근 {len(docs):,}건을 불러왔습니다. 검색어는 불러온 내역 안에서 적용됩니다.")
+            if c_more2.button(f"더 보기 (다음 {s_page_size}건)", key="order_status_more", use_container_width=True):
+                st.session_state["order_status_cursors"].append(next_cursor)
+                st.rerun()
 
     # 데이터를 리스트로 변환
         rows = []
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            
+        for d in docs:
             # [수정] 마스터 완료 상태를 일반 '제직완료'로 표시
             if d.get('status') == "제직완료(Master)":
                 d['status'] = "제직완료"
@@ -1140,11 +1116,7 @@ def render_order_status(db, sub_menu):
             if 'delivery_req_date' in df.columns:
                 df['delivery_req_date'] = pd.to_datetime(df['delivery_req_date'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
             
-            # [수정] 상태 필터 (단일 선택)
-            if s_filter_status == "미출고(출고완료 제외)":
-                df = df[df['status'] != '출고완료']
-            elif s_filter_status != "전체":
-                df = df[df['status'] == s_filter_status]
+            # [수정] 상태 필터는 조회 쿼리에서 처리됨 (order_status_filter)
             
             # [수정] 검색어 필터 (기준에 따라)
             if s_keyword:
@@ -1257,7 +1229,8 @@ def render_order_status(db, sub_menu):
                                 st.write(f"선택한 **{len(selected_rows)}건**을 **'제직대기'**로 변경합니다.")
                                 if st.button("선택 항목 제직대기로 발송", type="primary", key="btn_batch_weaving"):
                                     for idx, row in selected_rows.iterrows():
-                                        db.collection("orders").document(row['id']).update({"status": "제직대기"})
+                                        db.collection("orders").document(row['id']).update(stamp_updated_at({"status": "제직대기"}))
+                                    record_machine_changes(db, [(row, {**row.to_dict(), "status": "제직대기"}) for _, row in selected_rows.iterrows()])
                                     st.success(f"{len(selected_rows)}건이 제직대기 상태로 변경되었습니다.")
                                     st.session_state["order_status_key"] += 1
                                     st.rerun()
@@ -1716,7 +1689,7 @@ def render_order_status(db, sub_menu):
                         e_del_addr = ec14.text_input("납품주소", value=sel_row.get('delivery_address', ''))
 
                         if st.form_submit_button("수정 저장"):
-                            db.collection("orders").document(sel_id).update({
+                            edit_data = {
                                 "status": e_status, # 상태 변경 반영
                                 "customer": e_customer,
                                 "order_type": e_order_type,
@@ -1732,7 +1705,16 @@ def render_order_status(db, sub_menu):
                                 "delivery_to": e_del_to,
                                 "delivery_contact": e_del_contact,
                                 "delivery_address": e_del_addr
-                            })
+                            }
+                            batch = db.batch()
+                            batch.update(db.collection("orders").document(sel_id), stamp_updated_at(edit_data))
+                            # [FIX] 상태/제직기 변경 시 제직기 잠금도 같은 batch로 반영
+                            machine_conflicts = record_machine_changes(db, [(sel_row, {**sel_row.to_dict(), **edit_data})], batch=batch)
+                            record_inventory_changes(db, [(sel_row, {**sel_row.to_dict(), **edit_data})], batch=batch)
+                            record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **edit_data})], batch=batch)
+                            batch.commit()
+                            for msg in machine_conflicts:
+                                st.toast(msg, icon="⚠️")
                             st.success("수정되었습니다.")
                             st.session_state["order_status_key"] += 1
                             st.rerun()
@@ -1746,7 +1728,12 @@ def render_order_status(db, sub_menu):
                         st.warning("정말로 삭제하시겠습니까? (복구 불가)")
                         col_conf1, col_conf2 = st.columns(2)
                         if col_conf1.button("✅ 예, 삭제합니다", key="btn_del_yes"):
-                            db.collection("orders").document(sel_id).delete()
+                            batch = db.batch()
+                            delete_orders(db, [sel_id], batch=batch)
+                            record_machine_changes(db, [(sel_row, None)], batch=batch) # [FIX] 제직기 잠금 해제
+                            batch.commit()
+                            record_inventory_changes(db, [(sel_row, None)])
+                            record_stats_changes(db, [(sel_row, None)])
                             st.session_state["delete_confirm_id"] = None
                             st.success("삭제되었습니다.")
                             st.session_state["order_status_key"] += 1
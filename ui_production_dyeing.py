@@ -3,8 +3,13 @@ import pandas as pd
 import datetime
 import io
 from firebase_admin import firestore
-from utils import get_partners, generate_report_html, get_common_codes, manage_code_with_code
+from utils import get_partners, generate_report_html, get_common_codes, manage_code_with_code, stamp_updated_at, board_refresh_interval, live_region
+from db_usage import track_db_usage
+from order_mirror import get_active_orders, sync_order_mirror
+from stats_rollup import record_stats_changes
+from order_archive import stream_history
 
+@track_db_usage
 def render_dyeing(db, sub_menu):
     st.header("염색 현황")
     st.info("제직이 완료된 건을 염색 공장에서 작업하고 봉제 단계로 넘깁니다.")
@@ -25,12 +30,8 @@ def render_dyeing(db, sub_menu):
         if "key_dyeing_wait" not in st.session_state:
             st.session_state["key_dyeing_wait"] = 0
             
-        docs = db.collection("orders").where("status", "==", "제직완료").stream()
-        rows = []
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            rows.append(d)
+        # [최적화] 진행중 발주 미러에서 조회 (Firestore 재조회 없음)
+        rows = get_active_orders(db, "제직완료")
         
         # 날짜순 정렬
         rows.sort(key=lambda x: x.get('date', datetime.datetime.max))
@@ -190,7 +191,7 @@ def render_dyeing(db, sub_menu):
                                 except:
                                     sel_cc = d_color_code_sel
 
-                            db.collection("orders").document(sel_id).update({
+                            updates = {
                                 "status": "염색중",
                                 "dyeing_out_date": str(d_date),
                                 "dyeing_partner": d_partner,
@@ -198,9 +199,14 @@ def render_dyeing(db, sub_menu):
                                 "dyeing_note": d_note,
                                 "dyeing_color_code": sel_cc,
                                 "dyeing_color_name": sel_cn
-                            })
+                            }
+                            batch = db.batch()
+                            batch.update(db.collection("orders").document(sel_id), stamp_updated_at(updates))
+                            record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                            batch.commit()
                             st.success("염색중 상태로 변경되었습니다.")
                             st.session_state["key_dyeing_wait"] += 1 # 목록 선택 초기화
+                            sync_order_mirror()
                             st.rerun()
         else:
             st.info("염색 대기 중인 건이 없습니다.")
@@ -211,15 +217,17 @@ def render_dyeing(db, sub_menu):
         
         if "key_dyeing_ing" not in st.session_state:
             st.session_state["key_dyeing_ing"] = 0
+        refresh_sec = board_refresh_interval(st.columns([2, 6])[0])
             
-        docs = db.collection("orders").where("status", "==", "염색중").stream()
-        rows = []
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            rows.append(d)
-            
-        if rows:
+        list_key = f"df_dye_ing_{st.session_state['key_dyeing_ing']}"
+
+        # [NEW] 목록 영역은 자동 새로고침 fragment로 표시 (행 선택 시 전체 화면으로 처리 영역 표시)
+        def render_list():
+            # [최적화] 진행중 발주 미러에서 조회 (Firestore 재조회 없음)
+            rows = get_active_orders(db, "염색중")
+            if not rows:
+                st.info("현재 염색 중인 작업이 없습니다.")
+                return None
             df = pd.DataFrame(rows)
             # 비고 컬럼이 없는 경우 빈 값으로 초기화 (데이터가 없을 때 오류 방지)
             if 'dyeing_note' not in df.columns:
@@ -234,7 +242,12 @@ def render_dyeing(db, sub_menu):
             final_cols = [c for c in display_cols if c in df.columns]
             
             st.write("🔽 관리할 항목을 선택하세요.")
-            selection = st.dataframe(df[final_cols].rename(columns=col_map), width="stretch", on_select="rerun", selection_mode="single-row", key=f"df_dye_ing_{st.session_state['key_dyeing_ing']}")
+            selection = st.dataframe(df[final_cols].rename(columns=col_map), width="stretch", on_select="rerun", selection_mode="single-row", key=list_key)
+            return df, selection
+
+        listing = live_region(render_list, refresh_sec, list_key)
+        if listing:
+            df, selection = listing
             
             if selection.selection.rows:
                 idx = selection.selection.rows[0]
@@ -273,7 +286,7 @@ def render_dyeing(db, sub_menu):
                     st.info(f"💰 **염색비용 합계**: {d_total:,}원 (공급가: {d_supply:,}원 / 부가세: {d_vat:,}원)")
                     
                     if st.button("염색 완료 (봉제대기로 이동)"):
-                        db.collection("orders").document(sel_id).update({
+                        updates = {
                             "status": "염색완료",
                             "dyeing_in_date": str(d_in_date),
                             "stock": d_stock,
@@ -283,9 +296,14 @@ def render_dyeing(db, sub_menu):
                             "dyeing_supply": d_supply,
                             "dyeing_vat": d_vat,
                             "vat_included": d_vat_inc
-                        })
+                        }
+                        batch = db.batch()
+                        batch.update(db.collection("orders").document(sel_id), stamp_updated_at(updates))
+                        record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                        batch.commit()
                         st.success(f"염색이 완료되었습니다. (합계: {d_total:,}원)")
                         st.session_state["key_dyeing_ing"] += 1
+                        sync_order_mirror()
                         st.rerun()
                             
                 with tab_act2:
@@ -317,28 +335,32 @@ def render_dyeing(db, sub_menu):
                                 try: e_cc, rest = e_color_sel.split(" (", 1); e_cn = rest[:-1]
                                 except: e_cc = e_color_sel
 
-                            db.collection("orders").document(sel_id).update({
+                            updates = {
                                 "dyeing_out_date": str(e_date),
                                 "dyeing_partner": e_partner,
                                 "dyeing_out_weight": e_weight,
                                 "dyeing_note": e_note,
                                 "dyeing_color_code": e_cc,
                                 "dyeing_color_name": e_cn
-                            })
+                            }
+                            batch = db.batch()
+                            batch.update(db.collection("orders").document(sel_id), stamp_updated_at(updates))
+                            record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                            batch.commit()
                             st.success("수정되었습니다.")
                             st.session_state["key_dyeing_ing"] += 1
+                            sync_order_mirror()
                             st.rerun()
                     
                     st.markdown("#### 작업 취소")
                     if st.button("염색 취소 (대기로 되돌리기)", type="primary"):
-                        db.collection("orders").document(sel_id).update({
+                        db.collection("orders").document(sel_id).update(stamp_updated_at({
                             "status": "제직완료"
-                        })
+                        }))
                         st.success("취소되었습니다.")
                         st.session_state["key_dyeing_ing"] += 1
+                        sync_order_mirror()
                         st.rerun()
-        else:
-            st.info("현재 염색 중인 작업이 없습니다.")
 
     # --- 3. 염색 완료 탭 ---
     elif sub_menu == "염색 완료 목록":
@@ -367,7 +389,9 @@ def render_dyeing(db, sub_menu):
 
         # [수정] 다음 공정으로 넘어간 내역도 조회되도록 상태 조건 확대
         target_statuses = ["염색완료", "봉제중", "봉제완료", "출고완료"]
-        docs = db.collection("orders").where("status", "in", target_statuses).stream()
+        # [NEW] 보관 경계 이전 기간이면 보관된 출고 건도 염색입고일 범위로 함께 조회
+        docs = stream_history(db, db.collection("orders").where("status", "in", target_statuses),
+                              lambda col: col.where("dyeing_in_date", ">=", start_dt.strftime("%Y-%m-%d")).where("dyeing_in_date", "<=", end_dt.strftime("%Y-%m-%d")), start_dt)
         rows = []
         for doc in docs:
             d = doc.to_dict()
@@ -500,25 +524,31 @@ def render_dyeing(db, sub_menu):
                             if st.form_submit_button("수정 저장"):
                                 # 부가세 로직은 복잡하므로 여기서는 단순 계산만 반영
                                 new_amount = int(new_weight * new_price)
-                                db.collection("orders").document(sel_id).update({
+                                updates = {
                                     "dyeing_in_date": str(new_in_date),
                                     "stock": new_stock,
                                     "dyeing_in_weight": new_weight,
                                     "dyeing_unit_price": new_price,
                                     "dyeing_amount": new_amount
-                                })
+                                }
+                                batch = db.batch()
+                                batch.update(db.collection("orders").document(sel_id), stamp_updated_at(updates))
+                                record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                                batch.commit()
                                 st.success("수정되었습니다.")
                                 st.session_state["key_dyeing_done"] += 1
+                                sync_order_mirror()
                                 st.rerun()
                     with c2:
                         st.write("**완료 취소**")
                         st.warning("상태를 다시 '염색중'으로 되돌립니다.")
                         if st.button("완료 취소 (염색중으로 복귀)", type="primary"):
-                            db.collection("orders").document(sel_id).update({
+                            db.collection("orders").document(sel_id).update(stamp_updated_at({
                                 "status": "염색중"
-                            })
+                            }))
                             st.success("복귀되었습니다.")
                             st.session_state["key_dyeing_done"] += 1
+                            sync_order_mirror()
                             st.rerun()
         else:
             st.info("염색 완료된 내역이 없습니다.")
@@ -3,8 +3,14 @@ import pandas as pd
 import datetime
 import io
 from firebase_admin import firestore
-from utils import get_partners, generate_report_html
+from utils import get_partners, generate_report_html, stamp_updated_at, delete_orders, board_refresh_interval, live_region
+from db_usage import track_db_usage
+from order_mirror import get_active_orders, sync_order_mirror
+from inventory_summary import record_inventory_changes
+from stats_rollup import record_stats_changes
+from order_archive import stream_history
 
+@track_db_usage
 def render_sewing(db, sub_menu):
     st.header("봉제 현황")
     st.info("염색이 완료된 원단을 봉제하여 완제품으로 만듭니다.")
@@ -19,12 +25,8 @@ def render_sewing(db, sub_menu):
         if "key_sewing_wait" not in st.session_state:
             st.session_state["key_sewing_wait"] = 0
             
-        docs = db.collection("orders").where("status", "==", "염색완료").stream()
-        rows = []
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            rows.append(d)
+        # [최적화] 진행중 발주 미러에서 조회 (Firestore 재조회 없음)
+        rows = get_active_orders(db, "염색완료")
         
         # 날짜순 정렬
         rows.sort(key=lambda x: x.get('date', datetime.datetime.max))
@@ -138,7 +140,8 @@ def render_sewing(db, sub_menu):
                         if s_qty < current_stock:
                             # 1. 분할된 새 문서 생성 (작업분)
                             doc_snapshot = db.collection("orders").document(sel_id).get()
-                            new_doc_data = doc_snapshot.to_dict().copy()
+                            org_data = doc_snapshot.to_dict()
+                            new_doc_data = org_data.copy()
                             new_doc_data['stock'] = s_qty
                             new_doc_data['status'] = "봉제중"
                             new_doc_data['parent_id'] = sel_id # [NEW] 분할 시 부모 ID 저장
@@ -149,12 +152,13 @@ def render_sewing(db, sub_menu):
                             else:
                                 new_doc_data['sewing_partner'] = "자체"
                             
-                            db.collection("orders").add(new_doc_data)
+                            db.collection("orders").add(stamp_updated_at(new_doc_data))
                             
                             # 2. 원본 문서 업데이트 (잔여분)
-                            db.collection("orders").document(sel_id).update({
+                            db.collection("orders").document(sel_id).update(stamp_updated_at({
                                 "stock": current_stock - s_qty
-                            })
+                            }))
+                            record_stats_changes(db, [(None, new_doc_data), (org_data, {**org_data, "stock": current_stock - s_qty})])
                             st.success(f"{s_qty}장 분할하여 봉제 작업을 시작합니다. (잔여: {current_stock - s_qty}장)")
                         else:
                             # 전체 작업
@@ -168,10 +172,11 @@ def render_sewing(db, sub_menu):
                             else:
                                 updates['sewing_partner'] = "자체"
                                 
-                            db.collection("orders").document(sel_id).update(updates)
+                            db.collection("orders").document(sel_id).update(stamp_updated_at(updates))
                             st.success("봉제 작업을 시작합니다.")
                         
                         st.session_state["key_sewing_wait"] += 1 # 목록 선택 초기화
+                        sync_order_mirror()
                         st.rerun()
                 elif len(selected_indices) > 1:
                     st.info("ℹ️ 봉제 시작 처리는 한 번에 하나의 항목만 가능합니다. (작업지시서는 다중 출력 가능)")
@@ -185,15 +190,17 @@ def render_sewing(db, sub_menu):
         # [NEW] 목록 갱신을 위한 키 초기화
         if "sewing_ing_key" not in st.session_state:
             st.session_state["sewing_ing_key"] = 0
+        refresh_sec = board_refresh_interval(st.columns([2, 6])[0])
             
-        docs = db.collection("orders").where("status", "==", "봉제중").stream()
-        rows = []
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            rows.append(d)
-            
-        if rows:
+        list_key = f"df_sew_ing_{st.session_state['sewing_ing_key']}"
+
+        # [NEW] 목록 영역은 자동 새로고침 fragment로 표시 (행 선택 시 전체 화면으로 처리 영역 표시)
+        def render_list():
+            # [최적화] 진행중 발주 미러에서 조회 (Firestore 재조회 없음)
+            rows = get_active_orders(db, "봉제중")
+            if not rows:
+                st.info("현재 봉제 중인 작업이 없습니다.")
+                return None
             df = pd.DataFrame(rows)
             col_map = {
                 "order_no": "발주번호", "sewing_partner": "봉제처", "sewing_type": "구분",
@@ -204,7 +211,12 @@ def render_sewing(db, sub_menu):
             
             st.write("🔽 완료 처리할 항목을 선택하세요.")
             # [수정] 동적 키 적용하여 완료 후 선택 해제
-            selection = st.dataframe(df[final_cols].rename(columns=col_map), width="stretch", on_select="rerun", selection_mode="single-row", key=f"df_sew_ing_{st.session_state['sewing_ing_key']}")
+            selection = st.dataframe(df[final_cols].rename(columns=col_map), width="stretch", on_select="rerun", selection_mode="single-row", key=list_key)
+            return df, selection
+
+        listing = live_region(render_list, refresh_sec, list_key)
+        if listing:
+            df, selection = listing
             
             if selection.selection.rows:
                 idx = selection.selection.rows[0]
@@ -271,9 +283,15 @@ def render_sewing(db, sub_menu):
                             updates["sewing_vat"] = s_vat
                             updates["vat_included"] = s_vat_inc
                         
-                        db.collection("orders").document(sel_id).update(updates)
+                        # [NEW] 재고 요약 증감을 같은 batch로 기록
+                        batch = db.batch()
+                        batch.update(db.collection("orders").document(sel_id), stamp_updated_at(updates))
+                        record_inventory_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                        record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                        batch.commit()
                         st.success("봉제 완료 처리되었습니다.")
                         st.session_state["sewing_ing_key"] += 1 # 키 증가로 목록 선택 초기화
+                        sync_order_mirror()
                         st.rerun()
                             
                 with tab_act2:
@@ -291,9 +309,10 @@ def render_sewing(db, sub_menu):
                                 "sewing_type": e_type,
                                 "sewing_partner": "자체" if e_type == "자체봉제" else e_partner
                             }
-                            db.collection("orders").document(sel_id).update(updates)
+                            db.collection("orders").document(sel_id).update(stamp_updated_at(updates))
                             st.success("수정되었습니다.")
                             st.session_state["sewing_ing_key"] += 1
+                            sync_order_mirror()
                             st.rerun()
                     
                     st.markdown("#### 작업 취소")
@@ -307,8 +326,10 @@ def render_sewing(db, sub_menu):
                             parent_ref = db.collection("orders").document(parent_id)
                             parent_snap = parent_ref.get()
                             if parent_snap.exists and parent_snap.to_dict().get('status') == '염색완료':
-                                parent_ref.update({"stock": firestore.Increment(stock_to_return)})
-                                db.collection("orders").document(sel_id).delete()
+                                parent_ref.update(stamp_updated_at({"stock": firestore.Increment(stock_to_return)}))
+                                delete_orders(db, [sel_id])
+                                parent_data = parent_snap.to_dict()
+                                record_stats_changes(db, [(sel_row, None), (parent_data, {**parent_data, "stock": int(parent_data.get('stock') or 0) + stock_to_return})])
                                 merged = True
                         
                         if not merged:
@@ -321,21 +342,21 @@ def render_sewing(db, sub_menu):
                             for sib in siblings:
                                 sib_data = sib.to_dict()
                                 if sib_data.get('product_code') == sel_row.get('product_code') and sib_data.get('color') == sel_row.get('color'):
-                                    db.collection("orders").document(sib.id).update({"stock": firestore.Increment(stock_to_return)})
-                                    db.collection("orders").document(sel_id).delete()
+                                    db.collection("orders").document(sib.id).update(stamp_updated_at({"stock": firestore.Increment(stock_to_return)}))
+                                    delete_orders(db, [sel_id])
+                                    record_stats_changes(db, [(sel_row, None), (sib_data, {**sib_data, "stock": int(sib_data.get('stock') or 0) + stock_to_return})])
                                     merged = True
                                     break
                         
                         if not merged:
-                            db.collection("orders").document(sel_id).update({"status": "염색완료"})
+                            db.collection("orders").document(sel_id).update(stamp_updated_at({"status": "염색완료"}))
                             st.success("취소되었습니다. (염색완료 상태로 복귀)")
                         else:
                             st.success(f"기존 대기 건과 병합되어 '염색완료' 상태로 복귀되었습니다.")
                         
                         st.session_state["sewing_ing_key"] += 1
+                        sync_order_mirror()
                         st.rerun()
-        else:
-            st.info("현재 봉제 중인 작업이 없습니다.")
 
     # --- 3. 봉제 완료 탭 ---
     elif sub_menu == "봉제 완료 목록":
@@ -364,7 +385,9 @@ def render_sewing(db, sub_menu):
             
         # [수정] 다음 공정으로 넘어간 내역도 조회되도록 상태 조건 확대
         target_statuses = ["봉제완료", "출고완료"]
-        docs = db.collection("orders").where("status", "in", target_statuses).stream()
+        # [NEW] 보관 경계 이전 기간이면 보관된 출고 건도 봉제완료일 범위로 함께 조회
+        docs = stream_history(db, db.collection("orders").where("status", "in", target_statuses),
+                              lambda col: col.where("sewing_end_date", ">=", start_dt.strftime("%Y-%m-%d")).where("sewing_end_date", "<=", end_dt.strftime("%Y-%m-%d")), start_dt)
         rows = []
         for doc in docs:
             d = doc.to_dict()
@@ -506,17 +529,26 @@ def render_sewing(db, sub_menu):
                                     updates["sewing_unit_price"] = new_price
                                     updates["sewing_amount"] = int(new_stock * new_price)
                                     
-                                db.collection("orders").document(sel_id).update(updates)
+                                batch = db.batch()
+                                batch.update(db.collection("orders").document(sel_id), stamp_updated_at(updates))
+                                record_inventory_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                                record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                                batch.commit()
                                 st.success("수정되었습니다.")
                                 st.session_state["key_sewing_done"] += 1
+                                sync_order_mirror()
                                 st.rerun()
                     with c2:
                         st.write("**완료 취소**")
                         st.warning("상태를 다시 '봉제중'으로 되돌립니다.")
                         if st.button("완료 취소 (봉제중으로 복귀)", type="primary"):
-                            db.collection("orders").document(sel_id).update({"status": "봉제중"})
+                            batch = db.batch()
+                            batch.update(db.collection("orders").document(sel_id), stamp_updated_at({"status": "봉제중"}))
+                            record_inventory_changes(db, [(sel_row, None)], batch=batch)
+                            batch.commit()
                             st.success("복귀되었습니다.")
                             st.session_state["key_sewing_done"] += 1
+                            sync_order_mirror()
                             st.rerun()
         else:
             st.info("조회된 봉제 완료 내역이 없습니다.")
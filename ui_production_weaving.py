@@ -3,8 +3,16 @@ import pandas as pd
 import datetime
 import io
 from firebase_admin import firestore
-from utils import generate_report_html, get_machines_list
+from utils import generate_report_html, get_machines_list, stamp_updated_at, delete_orders, board_refresh_interval, live_region
+from db_usage import track_db_usage
+from order_mirror import get_active_orders, sync_order_mirror
+from stats_rollup import record_stats_changes
+from order_archive import stream_history
+from shift_log import save_shift_log, get_log_dates, load_day_logs
+from machine_status import get_machine_status, start_weaving, update_weaving_order, rebuild_machine_status, machine_holder
+from production_log import weaving_end_date, index_production_dates, get_production_dates, load_production_day, backfill_weaving_end_date, production_backfill_needed
 
+@track_db_usage
 def render_weaving(db, sub_menu=None, readonly=False):
     st.header("제직 현황" if not readonly else "제직 조회 (보기 전용)")
     if "weaving_df_key" not in st.session_state:
@@ -72,19 +80,14 @@ def render_weaving(db, sub_menu=None, readonly=False):
         machines_data = [{"machine_no": i, "name": f"{i}호대", "model": "", "note": ""} for i in range(1, 10)]
     
     # [수정] 작업일지와 생산일지에서는 상단 대시보드 숨김
-    busy_machines = {} # 대시보드 미표시 시에도 아래 로직에서 참조할 수 있으므로 초기화
-    
     if sub_menu not in ["작업일지", "생산일지"]:
-        # [수정] st.expander를 사용하여 접고 펼 수 있도록 변경
-        with st.expander("제직기별 제직 현황", expanded=True):
+        # [NEW] 현황판 자동 새로고침 주기 (가동 현황 카드/제직중 목록에 적용)
+        refresh_sec = board_refresh_interval(st.columns([2, 6])[0])
+
+        def render_machine_cards():
             # 1. 제직기별 제직 현황 (Dashboard)
-            # 현재 가동 중인 제직기 정보 가져오기
-            running_docs = db.collection("orders").where("status", "==", "제직중").stream()
-            for doc in running_docs:
-                d = doc.to_dict()
-                m_no = d.get("machine_no")
-                if m_no:
-                    busy_machines[str(m_no)] = d
+            # [최적화] 현재 가동 중인 제직기 정보는 제직기 상태 문서 1회 읽기로 확인
+            busy_machines = get_machine_status(db)
                     
             # 제직기 상태 표시 (한 줄에 5개씩 자동 줄바꿈)
             cols_per_row = 5
@@ -142,11 +145,21 @@ def render_weaving(db, sub_menu=None, readonly=False):
                                 </div>
                                 """
                                 st.markdown(card_html, unsafe_allow_html=True)
+
+        # [수정] st.expander를 사용하여 접고 펼 수 있도록 변경
+        with st.expander("제직기별 제직 현황", expanded=True):
+            # [NEW] 카드 영역만 주기적으로 다시 그림 (fragment)
+            live_region(render_machine_cards, refresh_sec)
             
             # [NEW] 새로고침 버튼 (하단 배치)
             rb_c1, rb_c2 = st.columns([8.5, 1.5])
             if rb_c2.button("🔄 현황 새로고침", key="refresh_weaving_dash", help="최신 제직 현황을 불러옵니다."):
                 st.rerun()
+            # [NEW] 제직기 상태 재구성 (관리자) - 현황이 실제 제직중 발주와 다를 때
+            if st.session_state.get("role") == "admin":
+                if rb_c1.button("제직기 상태 재구성", key="rebuild_machine_status", help="제직중 발주 내역으로 제직기 사용 현황을 다시 만듭니다."):
+                    rebuild_machine_status(db)
+                    st.rerun()
         
         st.divider()
 
@@ -169,7 +182,8 @@ def render_weaving(db, sub_menu=None, readonly=False):
             search_keyword = c_f3.text_input("검색어 입력", key="weav_wait_keyword")
 
         # '제직대기' 상태인 건만 가져오기 (발주현황에서 '제직대기'로 변경된 건)
-        docs = db.collection("orders").where("status", "==", "제직대기").stream()
+        # [최적화] 진행중 발주 미러에서 조회 (Firestore 재조회 없음)
+        docs = get_active_orders(db, "제직대기")
         rows = []
         
         # 날짜 필터링 준비
@@ -181,10 +195,7 @@ def render_weaving(db, sub_menu=None, readonly=False):
             start_dt = datetime.datetime.combine(s_date_range[0], datetime.time.min)
             end_dt = datetime.datetime.combine(s_date_range[0], datetime.time.max)
 
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            
+        for d in docs:
             # 1. 날짜 필터 (접수일 기준)
             if start_dt and end_dt:
                 d_date = d.get('date')
@@ -271,11 +282,12 @@ def render_weaving(db, sub_menu=None, readonly=False):
                             batch = db.batch()
                             for idx, row in selected_rows.iterrows():
                                 doc_ref = db.collection("orders").document(row['id'])
-                                batch.update(doc_ref, {"status": "발주접수"})
+                                batch.update(doc_ref, stamp_updated_at({"status": "발주접수"}))
                             batch.commit()
                             
                             st.success(f"{len(selected_rows)}건이 발주접수 상태로 되돌려졌습니다.")
                             st.session_state["key_weaving_wait"] += 1
+                            sync_order_mirror()
                             st.rerun()
                     
                     else:
@@ -302,6 +314,7 @@ def render_weaving(db, sub_menu=None, readonly=False):
                             # [수정] 제직기 명칭만 표시하도록 변경
                             m_display_map = {} # "표시명": "호기번호" 매핑
                             m_options = []
+                            busy_machines = get_machine_status(db)
                             for m in machines_data:
                                 m_no = str(m['machine_no'])
                                 m_name = m['name']
@@ -320,23 +333,22 @@ def render_weaving(db, sub_menu=None, readonly=False):
                             if st.form_submit_button("제직 시작"):
                                 sel_m_no = m_display_map.get(s_machine)
                                 
-                                # [수정] 저장 직전 DB 실시간 상태 재확인 (동시성 제어)
-                                # 현재 해당 제직기로 '제직중'인 작업이 있는지 쿼리
-                                check_busy = list(db.collection("orders").where("status", "==", "제직중").where("machine_no", "==", int(sel_m_no)).stream())
+                                # [수정] 제직기 상태 문서를 잠금으로 사용하여 트랜잭션으로 배정 (동시 배정 방지)
+                                start_dt = datetime.datetime.combine(s_date, s_time)
+                                busy_msg = start_weaving(db, sel_m_no, sel_id, {
+                                    "status": "제직중",
+                                    "machine_no": int(sel_m_no),
+                                    "weaving_start_time": start_dt,
+                                    "weaving_roll_count": s_roll,
+                                    "completed_rolls": 0
+                                })
                                 
-                                if check_busy:
-                                    st.error(f"⛔ 해당 제직기는 이미 작업 중입니다!")
+                                if busy_msg:
+                                    st.error(f"⛔ {busy_msg}")
                                 else:
-                                    start_dt = datetime.datetime.combine(s_date, s_time)
-                                    db.collection("orders").document(sel_id).update({
-                                        "status": "제직중",
-                                        "machine_no": int(sel_m_no),
-                                        "weaving_start_time": start_dt,
-                                        "weaving_roll_count": s_roll,
-                                        "completed_rolls": 0
-                                    })
                                     st.success(f"제직을 시작합니다.")
                                     st.session_state["key_weaving_wait"] += 1 # 목록 선택 초기화
+                                    sync_order_mirror()
                                     st.rerun()
         else:
             st.info("대기 중인 작업이 없습니다.")
@@ -350,14 +362,15 @@ def render_weaving(db, sub_menu=None, readonly=False):
             st.success(st.session_state["weaving_msg"])
             st.session_state["weaving_msg"] = None
             
-        docs = db.collection("orders").where("status", "==", "제직중").stream()
-        rows = []
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            rows.append(d)
-            
-        if rows:
+        list_key = f"df_weaving_{st.session_state['weaving_df_key']}"
+
+        # [NEW] 목록 영역은 자동 새로고침 fragment로 표시 (행 선택 시 전체 화면으로 처리 영역 표시)
+        def render_list():
+            # [최적화] 진행중 발주 미러에서 조회 (Firestore 재조회 없음)
+            rows = get_active_orders(db, "제직중")
+            if not rows:
+                st.info("현재 제직 중인 작업이 없습니다.")
+                return None
             df = pd.DataFrame(rows)
             if 'weaving_start_time' in df.columns:
                 df['weaving_start_time'] = df['weaving_start_time'].apply(lambda x: x.strftime('%Y-%m-%d %H:%M') if not pd.isnull(x) and hasattr(x, 'strftime') else x)
@@ -377,7 +390,12 @@ def render_weaving(db, sub_menu=None, readonly=False):
             
             st.write("🔽 완료 처리할 항목을 선택하세요.")
             # key="df_weaving" 추가
-            selection = st.dataframe(df[final_cols].rename(columns=col_map), width="stretch", on_select="rerun", selection_mode="single-row", key=f"df_weaving_{st.session_state['weaving_df_key']}")
+            selection = st.dataframe(df[final_cols].rename(columns=col_map), width="stretch", on_select="rerun", selection_mode="single-row", key=list_key)
+            return df, selection
+
+        listing = live_region(render_list, refresh_sec, list_key)
+        if listing:
+            df, selection = listing
             
             if selection.selection.rows:
                 if readonly:
@@ -457,6 +475,7 @@ def render_weaving(db, sub_menu=None, readonly=False):
                         new_roll_doc['parent_id'] = sel_id
                         new_roll_doc['roll_no'] = next_roll_no
                         new_roll_doc['weaving_end_time'] = end_dt
+                        new_roll_doc['weaving_end_date'] = weaving_end_date(end_dt) # [NEW] 생산일지 조회용 일자
                         new_roll_doc['real_weight'] = real_weight_g
                         new_roll_doc['real_stock'] = real_stock_val
                         new_roll_doc['stock'] = real_stock_val # 중요: 이후 공정은 이 롤의 수량을 기준으로 함
@@ -468,7 +487,12 @@ def render_weaving(db, sub_menu=None, readonly=False):
                         # [수정] 총 롤 수 정보를 유지하기 위해 삭제 구문 주석 처리
                         # if 'weaving_roll_count' in new_roll_doc: del new_roll_doc['weaving_roll_count']
                         
-                        db.collection("orders").add(new_roll_doc)
+                        # [최적화] 롤 등록과 생산일지 날짜 색인을 같은 batch로 기록
+                        batch = db.batch()
+                        batch.set(db.collection("orders").document(), stamp_updated_at(new_roll_doc))
+                        index_production_dates(db, [new_roll_doc['weaving_end_date']], batch=batch)
+                        batch.commit()
+                        record_stats_changes(db, [(None, new_roll_doc)])
                         
                         # 2. 부모 문서 업데이트 (진행률 표시)
                         updates = {"completed_rolls": next_roll_no}
@@ -480,7 +504,8 @@ def render_weaving(db, sub_menu=None, readonly=False):
                         else:
                             msg = f"✅ {next_roll_no}번 롤 처리가 완료되었습니다. 이어서 {next_roll_no + 1}번 롤을 입력해주세요."
                         
-                        db.collection("orders").document(sel_id).update(updates)
+                        # [수정] 진행률은 제직기 상태에도 반영하고, 마지막 롤이면 제직기 잠금 해제
+                        update_weaving_order(db, parent_doc.get('machine_no'), sel_id, updates, release=next_roll_no >= total_rolls)
                         
                         # 메시지를 세션에 저장하여 리런 후에도 보이게 함
                         st.session_state["weaving_msg"] = msg
@@ -492,19 +517,19 @@ def render_weaving(db, sub_menu=None, readonly=False):
                         if ss_stock_key in st.session_state: del st.session_state[ss_stock_key]
                         if ss_kg_key in st.session_state: del st.session_state[ss_kg_key]
                         
+                        sync_order_mirror()
                         st.rerun()
                     
                     # [FIX] 제직 취소 기능은 readonly가 아닐 때만 표시
                     if st.button("🚫 제직 취소 (대기로 되돌리기)", key="cancel_weaving"):
-                        db.collection("orders").document(sel_id).update({
+                        update_weaving_order(db, sel_row.get('machine_no'), sel_id, {
                             "status": "제직대기",
                             "machine_no": firestore.DELETE_FIELD,
                             "weaving_start_time": firestore.DELETE_FIELD
-                        })
+                        }, release=True)
                         st.session_state["weaving_df_key"] += 1
+                        sync_order_mirror()
                         st.rerun()
-        else:
-            st.info("현재 제직 중인 작업이 없습니다.")
 
     # --- 3. 제직완료 탭 ---
     elif sub_menu == "제직완료 목록":
@@ -535,7 +560,9 @@ def render_weaving(db, sub_menu=None, readonly=False):
         # [수정] 다음 공정으로 넘어간 내역도 조회되도록 상태 조건 확대
         # 제직완료 이후의 모든 상태 포함
         target_statuses = ["제직완료", "제직완료(Master)", "염색중", "염색완료", "봉제중", "봉제완료", "출고완료"]
-        docs = db.collection("orders").where("status", "in", target_statuses).stream()
+        # [NEW] 보관 경계 이전 기간이면 보관된 출고 건도 제직완료일 범위로 함께 조회
+        docs = stream_history(db, db.collection("orders").where("status", "in", target_statuses),
+                              lambda col: col.where("weaving_end_time", ">=", start_dt).where("weaving_end_time", "<=", end_dt), start_dt)
         rows = []
         for doc in docs:
             d = doc.to_dict()
@@ -652,24 +679,36 @@ def render_weaving(db, sub_menu=None, readonly=False):
                             new_avg_weight = c4.number_input("평균중량(g)", value=float(sel_row.get('avg_weight', 0)), step=0.1, format="%.1f")
                             
                             if st.form_submit_button("수정 저장"):
-                                db.collection("orders").document(sel_id).update({
+                                updates = {
                                     "real_weight": new_real_weight,
                                     "real_stock": new_real_stock,
                                     "stock": new_real_stock, # 이후 공정을 위해 재고 수량도 함께 업데이트
                                     "prod_weight_kg": new_prod_kg,
                                     "avg_weight": new_avg_weight
-                                })
+                                }
+                                batch = db.batch()
+                                batch.update(db.collection("orders").document(sel_id), stamp_updated_at(updates))
+                                record_stats_changes(db, [(sel_row, {**sel_row.to_dict(), **updates})], batch=batch)
+                                batch.commit()
                                 st.success("수정되었습니다.")
                                 st.session_state["key_weaving_done"] += 1
+                                sync_order_mirror()
                                 st.rerun()
 
                         st.markdown("#### 제직 완료 취소 (삭제)")
                         st.warning("이 롤 데이터를 삭제하고, 제직중 상태로 되돌립니다.")
                         if st.button("🗑️ 이 롤 삭제하기 (취소)", type="primary"):
                             parent_id = sel_row.get('parent_id')
+
+                            # [FIX] 그 사이 같은 제직기에 다른 작업이 배정되었으면 삭제하지 않음 (이중 배정 방지)
+                            holder = machine_holder(db, sel_row.get('machine_no')) if parent_id else None
+                            if holder and holder.get('order_id') != parent_id:
+                                st.error(f"{sel_row.get('machine_no')}호대는 다른 작업({holder.get('name', '-')})이 제직 중이라 롤을 삭제할 수 없습니다. 해당 작업 완료 후 다시 시도하세요.")
+                                st.stop()
                             
                             # 1. 현재 롤 문서 삭제
-                            db.collection("orders").document(sel_id).delete()
+                            delete_orders(db, [sel_id])
+                            record_stats_changes(db, [(sel_row, None)])
                             
                             # 2. 부모 문서(제직중인 건) 상태 업데이트
                             if parent_id:
@@ -677,13 +716,25 @@ def render_weaving(db, sub_menu=None, readonly=False):
                                 siblings = db.collection("orders").where("parent_id", "==", parent_id).where("status", "==", "제직완료").stream()
                                 cnt = sum(1 for _ in siblings)
                                 
-                                db.collection("orders").document(parent_id).update({
+                                parent_updates = {
                                     "completed_rolls": cnt,
                                     "status": "제직중" # 마스터 완료 상태였더라도 다시 제직중으로 복귀
-                                })
+                                }
+                                # [수정] 제직기를 다시 잠금
+                                busy_msg = start_weaving(db, sel_row.get('machine_no'), parent_id, parent_updates,
+                                                         expected_statuses=("제직중", "제직완료(Master)"))
+                                holder = machine_holder(db, sel_row.get('machine_no')) if busy_msg else None
+                                if holder and holder.get('order_id') != parent_id:
+                                    # [FIX] 확인 직후 다른 작업이 배정된 경우: 제직기 없이 제직대기로 되돌려 다시 배정하도록 함
+                                    db.collection("orders").document(parent_id).update(stamp_updated_at({
+                                        "completed_rolls": cnt, "status": "제직대기", "machine_no": firestore.DELETE_FIELD}))
+                                    st.warning(f"{busy_msg} 원 발주는 제직대기로 되돌렸습니다.")
+                                elif busy_msg:
+                                    st.warning(busy_msg)
                             
                             st.success("삭제되었습니다. 제직중 목록에서 다시 작업할 수 있습니다.")
                             st.session_state["key_weaving_done"] += 1
+                            sync_order_mirror()
                             st.rerun()
             
             st.divider()
@@ -788,22 +839,17 @@ def render_weaving(db, sub_menu=None, readonly=False):
                 else:
                     machine_no_str = ", ".join(machine_selection)
                 
-                # 1. 개별 로그 저장 (shift_logs 컬렉션)
-                db.collection("shift_logs").add({
+                # 1. 개별 로그(shift_logs) + 2. 전달사항(handover_notes) 저장
+                # [최적화] 날짜 색인(shift_log_dates)도 같은 batch로 갱신
+                note_key = "day_to_night_notes" if shift == "주간" else "night_to_day_notes"
+                save_shift_log(db, {
                     "log_date": str(log_date),
                     "shift": shift,
                     "machine_no": machine_no_str,
                     "log_time": log_dt,
                     "content": content,
                     "author": author
-                })
-                
-                # 2. 전달사항 저장 (handover_notes 컬렉션)
-                if handover_notes:
-                    note_key = "day_to_night_notes" if shift == "주간" else "night_to_day_notes"
-                    db.collection("handover_notes").document(str(log_date)).set({
-                        note_key: handover_notes
-                    }, merge=True)
+                }, note_key, handover_notes)
                 
                 st.session_state["worklog_saved"] = True
                 st.session_state["wl_form_key"] += 1 # 키 변경으로 입력 폼 초기화
@@ -813,33 +859,20 @@ def render_weaving(db, sub_menu=None, readonly=False):
         st.divider()
         st.subheader("일지 조회 및 출력")
         
-        # [수정] 데이터가 있는 날짜 목록 가져오기
-        available_dates = set()
-        # 1. 작업일지 데이터 날짜
-        logs_ref = db.collection("shift_logs").stream()
-        for doc in logs_ref:
-            if doc.to_dict().get('log_date'):
-                available_dates.add(doc.to_dict().get('log_date'))
-        # 2. 전달사항 데이터 날짜 (문서 ID가 날짜)
-        notes_ref = db.collection("handover_notes").stream()
-        for doc in notes_ref:
-            available_dates.add(doc.id)
-            
-        sorted_dates = sorted(list(available_dates), reverse=True)
+        # [최적화] 데이터가 있는 날짜 목록은 연도별 날짜 색인에서 조회 (전체 일지/전달사항 조회 제거)
+        sorted_dates = get_log_dates(db)
         
         c1, c2 = st.columns([1, 3])
         view_date = c1.selectbox("조회할 날짜 선택", sorted_dates if sorted_dates else [str(datetime.date.today())], key="worklog_view_date")
         
         # 데이터 가져오기
-        # Firestore 복합 인덱스 오류 방지를 위해 order_by 제거 후 Python에서 정렬
-        log_docs = list(db.collection("shift_logs").where("log_date", "==", str(view_date)).stream())
-        log_docs.sort(key=lambda x: x.to_dict().get('log_time', datetime.datetime.min))
+        # [최적화] log_date + log_time 복합 인덱스로 서버에서 정렬
+        log_rows = load_day_logs(db, str(view_date))
         notes_doc = db.collection("handover_notes").document(str(view_date)).get()
         
         day_logs = []
         night_logs = []
-        for doc in log_docs:
-            log_data = doc.to_dict()
+        for log_data in log_rows:
             if log_data['shift'] == '주간':
                 day_logs.append(log_data)
             else:
@@ -1013,38 +1046,21 @@ def render_weaving(db, sub_menu=None, readonly=False):
     elif sub_menu == "생산일지":
         st.subheader("일일 생산일지 조회")
         
-        # [수정] 생산 실적이 있는 날짜 목록 가져오기
-        # 제직완료 이상 상태인 건들의 weaving_end_time 확인
-        target_statuses = ["제직완료", "제직완료(Master)", "염색중", "염색완료", "봉제중", "봉제완료", "출고완료"]
-        inv_ref = db.collection("orders").where("status", "in", target_statuses).stream()
-        prod_dates = set()
-        for doc in inv_ref:
-            d = doc.to_dict()
-            w_end = d.get('weaving_end_time')
-            if w_end:
-                if isinstance(w_end, datetime.datetime):
-                    prod_dates.add(w_end.strftime("%Y-%m-%d"))
-                elif isinstance(w_end, str):
-                    prod_dates.add(w_end[:10])
-        
-        sorted_prod_dates = sorted(list(prod_dates), reverse=True)
+        # [최적화] 생산 실적이 있는 날짜 목록은 연도별 날짜 색인(production_dates)에서 조회
+        sorted_prod_dates = get_production_dates(db)
+        if st.session_state.get("role") == "admin" and production_backfill_needed(db):
+            # [FIX] 색인 도입 전 데이터: 완료 표시가 없으면 관리자가 기존 문서에 weaving_end_date를 채우고 색인 생성 (최초 1회)
+            st.info("기존 제직 실적의 생산일지 날짜 색인이 아직 생성되지 않았습니다. 발주 전체(보관분 포함)를 읽으므로 작업이 적은 시간에 생성하세요.")
+            if st.button("날짜 색인 생성", key="btn_backfill_prod_dates"):
+                with st.spinner("기존 제직 실적 정리 중..."):
+                    backfill_weaving_end_date(db)
+                st.rerun()
         
         prod_date_str = st.selectbox("조회일자 선택", sorted_prod_dates if sorted_prod_dates else [str(datetime.date.today())], key="prodlog_view_date")
         prod_date = datetime.datetime.strptime(prod_date_str, "%Y-%m-%d").date()
         
-        start_dt = datetime.datetime.combine(prod_date, datetime.time.min)
-        end_dt = datetime.datetime.combine(prod_date, datetime.time.max)
-        
-        # Firestore 인덱스 오류 방지를 위해 status만 쿼리하고 날짜는 파이썬에서 필터링
-        docs = db.collection("orders").where("status", "in", target_statuses).stream()
-        rows = []
-        for doc in docs:
-            d = doc.to_dict()
-            w_end = d.get('weaving_end_time')
-            if w_end:
-                if w_end.tzinfo: w_end = w_end.replace(tzinfo=None)
-                if start_dt <= w_end <= end_dt:
-                    rows.append(d)
+        # [최적화] 선택일의 롤만 weaving_end_date 일치 조건으로 조회 (전체 이력 2회 조회 제거)
+        rows = load_production_day(db, prod_date_str)
         
         if rows:
             df = pd.DataFrame(rows)
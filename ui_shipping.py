@@ -4,9 +4,16 @@ import datetime
 import io
 import uuid
 from firebase_admin import firestore
-from utils import get_partners, get_common_codes, search_address_api, generate_report_html, get_partners_map, get_db, save_user_settings, load_user_settings, num_to_korean
+from utils import get_partners, get_common_codes, search_address_api, generate_report_html, get_partners_map, get_db, save_user_settings, load_user_settings, num_to_korean, get_company_info, get_docs_map, stamp_updated_at, delete_orders
+from db_usage import track_db_usage
+from order_mirror import sync_order_mirror
+from inventory_summary import record_inventory_changes
+from stats_rollup import record_stats_changes, bucket_keys
+from order_history import load_shipped_orders, mark_history_stale, first_shipped_date
+from order_archive import archive_shipped_orders, count_archive_targets, archive_cutoff, ARCHIVE_AFTER_MONTHS
 from ui_inventory import render_inventory_logic
 
+@track_db_usage
 def render_shipping_operations(db, sub_menu):
     st.header("출고 작업")
 
@@ -446,6 +453,13 @@ def render_shipping_operations(db, sub_menu):
                     
                     shipped_rows = [] # 명세서 발행용 데이터 수집
 
+                    # [최적화] 출고 대상 원본 문서를 한 번에 조회(get_all)한 뒤 batch로 일괄 기록
+                    org_docs = get_docs_map(db, "orders", valid_staging['id'].tolist())
+                    batch = db.batch()
+                    batch_count = 0
+                    summary_changes = [] # [NEW] 재고 요약 증감용 (변경 전, 변경 후)
+                    new_ship_docs = [] # [NEW] 분할 출고로 생성된 문서 (통계 집계용)
+
                     for idx, row in valid_staging.iterrows():
                         doc_id = row['id']
                         ship_qty = int(row['출고수량'])
@@ -487,32 +501,54 @@ def render_shipping_operations(db, sub_menu):
                         # 부분 출고 로직 (수량이 현재고보다 적을 때)
                         current_stock = int(row['현재고'])
                         if ship_qty < current_stock:
+                            org_data = org_docs.get(doc_id)
+                            if org_data is None: continue # 그 사이 삭제된 문서
                             doc_ref = db.collection("orders").document(doc_id)
-                            org_data = doc_ref.get().to_dict()
+                            new_ref = db.collection("orders").document()
                             new_ship_doc = org_data.copy()
                             new_ship_doc.update(update_data)
                             new_ship_doc['stock'] = ship_qty
                             new_ship_doc['parent_id'] = doc_id
-                            db.collection("orders").add(new_ship_doc)
-                            doc_ref.update({"stock": current_stock - ship_qty})
+                            batch.set(new_ref, stamp_updated_at(new_ship_doc))
+                            batch.update(doc_ref, stamp_updated_at({"stock": current_stock - ship_qty}))
+                            batch_count += 2
+                            summary_changes.append((org_data, {**org_data, "stock": current_stock - ship_qty}))
+                            new_ship_docs.append(new_ship_doc)
                             
                             # 명세서용 데이터 추가
-                            new_ship_doc['id'] = "new_doc" # 임시 ID
+                            new_ship_doc = new_ship_doc.copy()
+                            new_ship_doc['id'] = new_ref.id
                             shipped_rows.append(new_ship_doc)
                         else:
-                            db.collection("orders").document(doc_id).update(update_data)
+                            batch.update(db.collection("orders").document(doc_id), stamp_updated_at(update_data))
+                            batch_count += 1
+                            if org_docs.get(doc_id) is not None:
+                                summary_changes.append((org_docs[doc_id], {**org_docs[doc_id], **update_data}))
                             
                             # 명세서용 데이터 추가 (기존 데이터 + 업데이트 데이터)
                             updated_doc = row.to_dict() if hasattr(row, 'to_dict') else row.copy()
                             updated_doc.update(update_data)
                             updated_doc['stock'] = ship_qty
                             shipped_rows.append(updated_doc)
+
+                        if batch_count >= 400:
+                            batch.commit()
+                            batch = db.batch()
+                            batch_count = 0
+
+                    batch_count += record_inventory_changes(db, summary_changes, batch=batch)
+                    # [NEW] 통계 집계: 원본 변경분 + 분할 출고로 생긴 문서
+                    batch_count += record_stats_changes(db, summary_changes + [(None, d) for d in new_ship_docs], batch=batch)
+                    if batch_count > 0:
+                        batch.commit()
+                    mark_history_stale([r.get('shipping_date') for r in shipped_rows])
                     
                     st.success(f"{len(selected_rows)}건 출고 처리 완료!")
                     
                     # [NEW] 출고된 데이터를 세션에 저장하고 리런
                     st.session_state["last_shipped_data"] = pd.DataFrame(shipped_rows)
                     st.session_state["ship_op_key"] += 1
+                    sync_order_mirror()
                     st.rerun()
 
         else:
@@ -527,18 +563,15 @@ def render_shipping_operations(db, sub_menu):
 @st.cache_data(ttl=60) # 1분간 캐시 유지
 def load_shipping_orders(start_dt, end_dt):
     db = get_db()
-    # 날짜 필터링하여 쿼리
-    docs = db.collection("orders").where("shipping_date", ">=", start_dt).where("shipping_date", "<=", end_dt).stream()
-    data = []
-    for doc in docs:
-        d = doc.to_dict()
-        d['id'] = doc.id
+    # [최적화] 마감된 월은 로컬 Parquet 캐시, 최근 구간만 Firestore 조회 (order_history)
+    data = load_shipped_orders(db, start_dt, end_dt)
+    for d in data:
         # Datetime 객체는 캐싱 시 문제 없으나, 타임존 정보가 있으면 제거
         if d.get('shipping_date') and hasattr(d['shipping_date'], 'tzinfo'):
             d['shipping_date'] = d['shipping_date'].replace(tzinfo=None)
-        data.append(d)
     return data
 
+@track_db_usage
 def render_shipping_status(db, sub_menu):
     st.header("출고 현황")
     st.info("출고된 내역을 조회하고 거래명세서를 발행합니다.")
@@ -547,8 +580,7 @@ def render_shipping_status(db, sub_menu):
     # [NEW] 거래명세서 설정을 위한 세션 상태 초기화
     if "stmt_settings" not in st.session_state:
         # 회사 정보 먼저 로드
-        comp_doc = db.collection("settings").document("company_info").get()
-        comp_info = comp_doc.to_dict() if comp_doc.exists else {}
+        comp_info = get_company_info()
         
         default_settings = {
             "opt_type": "공급받는자용", "opt_merge": True, "opt_inc_ship": True,
@@ -972,6 +1004,13 @@ def render_shipping_status(db, sub_menu):
                         else:
                             sel_rows = df.iloc[selected_indices]
                             target_ids = sel_rows['id'].tolist()
+
+                    # [NEW] 보관(아카이브)된 출고 건은 조회 전용이므로 취소 대상에서 제외
+                    if 'archived_at' in df.columns:
+                        archived_ids = set(df.loc[df['archived_at'].notna(), 'id'])
+                        if archived_ids & set(target_ids):
+                            st.warning("보관된 출고 건은 취소할 수 없어 제외됩니다.")
+                            target_ids = [i for i in target_ids if i not in archived_ids]
                     
                     if st.button(f"선택 항목 출고 취소 ({len(target_ids)}건)", type="primary"):
                         # [수정] 개별 업데이트 대신 Batch Write 사용 (성능 및 안정성 개선)
@@ -987,18 +1026,22 @@ def render_shipping_status(db, sub_menu):
                         batch_count = 0
                         processed_count = 0
 
-                        for doc_id in target_ids:
-                            # [FIX] 가상 운임비 행(_cost 포함)은 실제 문서가 아니므로 건너뜀 (404 오류 방지)
-                            if "_cost" in doc_id:
-                                continue
-                                
+                        # [최적화] 취소 대상과 부분 출고의 부모 문서를 get_all로 미리 조회 (건별 왕복 제거)
+                        # [FIX] 가상 운임비 행(_cost 포함)은 실제 문서가 아니므로 건너뜀 (404 오류 방지)
+                        cancel_ids = [i for i in target_ids if "_cost" not in i]
+                        cancel_docs = get_docs_map(db, "orders", cancel_ids)
+                        parent_ids = [d.get('parent_id') for d in cancel_docs.values() if d]
+                        parent_docs = get_docs_map(db, "orders", parent_ids)
+                        summary_changes = [] # [NEW] 재고 요약 증감용 (변경 전, 변경 후)
+                        stats_changes = [] # [NEW] 통계 집계 증감용 (변경 전, 변경 후)
+
+                        for doc_id in cancel_ids:
                             doc_ref = db.collection("orders").document(doc_id)
-                            doc_snap = doc_ref.get()
+                            doc_data = cancel_docs.get(doc_id)
                             
-                            if not doc_snap.exists:
+                            if doc_data is None:
                                 continue
 
-                            doc_data = doc_snap.to_dict()
                             # [NEW] 취소할 항목에 연결된 거래명세서 ID가 있으면 삭제 목록에 추가
                             if doc_data.get("statement_id"):
                                 statement_ids_to_delete.add(doc_data.get("statement_id"))
@@ -1009,17 +1052,21 @@ def render_shipping_status(db, sub_menu):
                             merged = False
                             if parent_id:
                                 parent_ref = db.collection("orders").document(parent_id)
-                                parent_snap = parent_ref.get()
+                                parent_data = parent_docs.get(parent_id)
                                 
                                 # 부모 문서가 존재하고, 현재 '봉제완료' 상태(재고 상태)라면 병합
-                                if parent_snap.exists:
-                                    parent_data = parent_snap.to_dict()
+                                if parent_data is not None:
                                     if parent_data.get('status') == "봉제완료":
                                         # 부모 문서에 수량 더하기
-                                        batch.update(parent_ref, {"stock": firestore.Increment(stock_to_return)})
+                                        batch.update(parent_ref, stamp_updated_at({"stock": firestore.Increment(stock_to_return)}))
                                         # 현재 문서 삭제
-                                        batch.delete(doc_ref)
+                                        batch_count += delete_orders(db, [doc_id], batch=batch)
                                         merged = True
+                                        # 같은 부모로 여러 건이 병합될 수 있으므로 병합 후 수량을 누적
+                                        merged_parent = {**parent_data, "stock": int(parent_data.get('stock', 0)) + stock_to_return}
+                                        summary_changes.append((parent_data, merged_parent))
+                                        stats_changes.extend([(doc_data, None), (parent_data, merged_parent)])
+                                        parent_docs[parent_id] = merged_parent
                             
                             if not merged:
                                 # 병합되지 않으면 상태만 변경 (출고 정보 초기화 포함)
@@ -1035,7 +1082,10 @@ def render_shipping_status(db, sub_menu):
                                     "delivery_address": firestore.DELETE_FIELD,
                                     "statement_id": firestore.DELETE_FIELD # [NEW] 거래명세서 연결 ID 제거
                                 }
-                                batch.update(doc_ref, updates)
+                                batch.update(doc_ref, stamp_updated_at(updates))
+                                summary_changes.append((None, {**doc_data, "status": "봉제완료"}))
+                                restored = {k: v for k, v in doc_data.items() if k not in updates}
+                                stats_changes.append((doc_data, {**restored, "status": "봉제완료"}))
                             
                             batch_count += 1
                             processed_count += 1
@@ -1052,8 +1102,11 @@ def render_shipping_status(db, sub_menu):
                             batch.delete(stmt_ref)
                             batch_count += 1
 
+                        batch_count += record_inventory_changes(db, summary_changes, batch=batch)
+                        batch_count += record_stats_changes(db, stats_changes, batch=batch)
                         if batch_count > 0:
                             batch.commit()
+                        mark_history_stale([d.get('shipping_date') for d in cancel_docs.values() if d])
                         
                         my_bar.empty()
                         st.success(f"총 {len(target_ids)}건의 출고가 취소되었습니다.")
@@ -1065,6 +1118,7 @@ def render_shipping_status(db, sub_menu):
                         st.session_state["key_ship_done"] += 1
                         if "last_ship_selection" in st.session_state:
                             del st.session_state["last_ship_selection"]
+                        sync_order_mirror()
                         st.rerun()
                 else:
                     st.info("취소할 항목을 선택하세요.")
@@ -1119,6 +1173,21 @@ def render_shipping_status(db, sub_menu):
         else:
             st.info("출고 완료된 내역이 없습니다.")
 
+        # [NEW] 오래된 출고 이력 보관 (관리자)
+        if st.session_state.get("role") == "admin":
+            with st.expander("출고 이력 보관(아카이브)"):
+                st.caption("출고 후 일정 기간이 지난 출고완료 건을 보관 컬렉션으로 옮겨 일상 조회 비용을 줄입니다. 보관된 건은 내역 조회에는 그대로 표시되지만 출고 취소는 할 수 없습니다.")
+                arc_months = st.number_input("보관 기준 (출고 후 개월 수)", min_value=3, max_value=60, value=ARCHIVE_AFTER_MONTHS, step=1, key="archive_months")
+                st.write(f"{archive_cutoff(arc_months).strftime('%Y-%m-%d')} 이전 출고분이 대상입니다.")
+                c_a1, c_a2, _ = st.columns([1, 1, 4])
+                if c_a1.button("대상 건수 확인", key="btn_archive_count"):
+                    st.info(f"보관 대상: {count_archive_targets(db, arc_months):,}건")
+                if c_a2.button("보관 실행", type="primary", key="btn_archive_run"):
+                    arc_status = st.empty()
+                    moved = archive_shipped_orders(db, arc_months, lambda n: arc_status.caption(f"{n:,}건 이동 중..."))
+                    load_shipping_orders.clear()
+                    st.success(f"{moved:,}건을 보관했습니다.")
+
     elif sub_menu == "배송내역":
         st.subheader("📊 배송/운임 통계")
         st.info("기간별, 배송업체별 운임비 지출 현황을 확인합니다.")
@@ -1145,26 +1214,22 @@ def render_shipping_status(db, sub_menu):
             
         if submitted:
         # 데이터 조회 및 필터링
-            docs = db.collection("orders").where("status", "==", "출고완료").stream()
+            # [최적화] 출고완료 전체를 읽지 않고 조회 기간만 로드 (마감된 월은 로컬 Parquet 캐시)
+            start_dt, end_dt = None, None
+            if stat_type == "기간별(일자)":
+                if isinstance(stats_date, (list, tuple)) and len(stats_date) == 2:
+                    start_dt = datetime.datetime.combine(stats_date[0], datetime.time.min)
+                    end_dt = datetime.datetime.combine(stats_date[1], datetime.time.max)
+            elif stat_type == "월별":
+                start_dt = datetime.datetime(int(stats_year), 1, 1)
+                end_dt = datetime.datetime(int(stats_year), 12, 31, 23, 59, 59)
+            else: # 년도별 (전체)
+                start_dt = first_shipped_date(db)
+                end_dt = datetime.datetime(datetime.date.today().year, 12, 31, 23, 59, 59)
+
             rows = []
-            for doc in docs:
-                d = doc.to_dict()
-                s_date = d.get('shipping_date')
-                
-                if s_date:
-                    if s_date.tzinfo: s_date = s_date.replace(tzinfo=None)
-                    
-                    # 날짜 필터링
-                    if stat_type == "기간별(일자)" and isinstance(stats_date, list) and len(stats_date) == 2:
-                        start_dt = datetime.datetime.combine(stats_date[0], datetime.time.min)
-                        end_dt = datetime.datetime.combine(stats_date[1], datetime.time.max)
-                        if start_dt <= s_date <= end_dt:
-                            rows.append(d)
-                    elif stat_type == "월별":
-                        if s_date.year == stats_year:
-                            rows.append(d)
-                    else: # 년도별 (전체)
-                        rows.append(d)
+            if start_dt and end_dt:
+                rows = [d for d in load_shipping_orders(start_dt, end_dt) if d.get('shipping_date')]
 
             if rows:
                 df_stats = pd.DataFrame(rows)
@@ -1184,15 +1249,15 @@ def render_shipping_status(db, sub_menu):
                 
                 # [NEW] 그래프를 Expander 안에 배치하여 기본적으로 숨김
                 with st.expander("📈 그래프로 보기"):
-                    # 통계 그룹화 기준 설정
+                    # 통계 그룹화 기준 설정 ([최적화] 행별 strftime 대신 벡터 연산)
                     if stat_type == "기간별(일자)":
-                        df_stats['group_key'] = df_stats['shipping_date'].apply(lambda x: x.strftime('%Y-%m-%d'))
+                        df_stats['group_key'] = bucket_keys(df_stats['shipping_date'], "D")
                         group_label = "일자"
                     elif stat_type == "월별":
-                        df_stats['group_key'] = df_stats['shipping_date'].apply(lambda x: x.strftime('%Y-%m'))
+                        df_stats['group_key'] = bucket_keys(df_stats['shipping_date'], "M")
                         group_label = "월"
                     else:
-                        df_stats['group_key'] = df_stats['shipping_date'].apply(lambda x: x.strftime('%Y'))
+                        df_stats['group_key'] = bucket_keys(df_stats['shipping_date'], "Y")
                         group_label = "년도"
 
                     c_chart1, c_chart2 = st.columns(2)
@@ -1225,13 +1290,13 @@ def render_shipping_status(db, sub_menu):
             st.write("👆 위 조건 설정 후 **조회** 버튼을 누르면 결과가 표시됩니다.")
 
 # [NEW] 거래명세서 발행 UI 및 로직 함수 (공통 사용)
+@track_db_usage
 def render_invoice_ui(db, df_rows, mode="preview"):
     user_id = st.session_state.get("user_id")
     
     # [FIX] 세션 상태 초기화 (출고 작업에서 바로 호출될 경우를 대비하여 설정값이 없으면 로드)
     if "stmt_settings" not in st.session_state:
-        comp_doc = db.collection("settings").document("company_info").get()
-        comp_info = comp_doc.to_dict() if comp_doc.exists else {}
+        comp_info = get_company_info()
         
         default_settings = {
             "opt_type": "공급받는자용", "opt_merge": True, "opt_inc_ship": True,
@@ -1359,8 +1424,7 @@ def render_invoice_ui(db, df_rows, mode="preview"):
         st.text_area("하단 참고사항", value=s['opt_note'], height=60, key="w_stmt_opt_note", on_change=update_stmt_setting, args=('opt_note',))
 
     # 회사 정보 가져오기
-    comp_doc = db.collection("settings").document("company_info").get()
-    comp_info = comp_doc.to_dict() if comp_doc.exists else {}
+    comp_info = get_company_info()
     
     partners_map = get_partners_map()
 
@@ -1525,7 +1589,7 @@ def render_invoice_ui(db, df_rows, mode="preview"):
                                 # _cost 행은 가상 행이므로 제외
                                 if "_cost" not in str(row['id']):
                                     doc_ref = db.collection("orders").document(row['id'])
-                                    batch.update(doc_ref, {"statement_id": stmt_no})
+                                    batch.update(doc_ref, stamp_updated_at({"statement_id": stmt_no}))
                             batch.commit()
                             
                             st.success(f"거래명세서({stmt_no})가 발행되었습니다.")
@@ -3,8 +3,10 @@ import pandas as pd
 import datetime
 import base64
 import uuid
-from utils import load_user_settings, num_to_korean
+from utils import load_user_settings, num_to_korean, get_company_info
+from db_usage import track_db_usage
 
+@track_db_usage
 def render_statement_list(db):
     st.header("거래명세서 조회")
     st.info("발행된 거래명세서 내역을 조회하고 재출력합니다. (수정 불가)")
@@ -101,6 +103,7 @@ def render_statement_list(db):
         if st.button("🖨️ 명세서 재출력", type="primary"):
             print_statement(db, stmt_data)
 
+@track_db_usage
 def print_statement(db, stmt_data):
     # 설정 로드 (현재 설정 사용)
     user_id = st.session_state.get("user_id")
@@ -120,8 +123,7 @@ def print_statement(db, stmt_data):
     s = load_user_settings(user_id, "stmt_settings", default_settings)
     
     # 회사 정보 (로고/직인용)
-    comp_doc = db.collection("settings").document("company_info").get()
-    comp_info = comp_doc.to_dict() if comp_doc.exists else {}
+    comp_info = get_company_info()
     
     # 데이터 준비
     items = stmt_data.get('items', [])
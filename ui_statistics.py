@@ -12,6 +12,8 @@ import base64
 import platform
 from firebase_admin import firestore
 from utils import get_partners, generate_report_html
+from db_usage import track_db_usage
+from stats_rollup import load_stats_rollups, rebuild_stats_rollups, stats_rebuild_needed
 
 # [NEW] Matplotlib 한글 폰트 설정
 @st.cache_resource
@@ -31,6 +33,7 @@ def setup_matplotlib_font():
                 pass
         plt.rcParams['axes.unicode_minus'] = False
 
+@track_db_usage
 def render_statistics(db, sub_menu):
     st.header(sub_menu)
     st.info("발주부터 출고까지 전 공정의 현황을 년도별/월별/기간별로 분석합니다.")
@@ -78,29 +81,18 @@ def render_statistics(db, sub_menu):
         chart_type_opt = c4.radio("그래프 형태", ["막대형", "선형(점)"], horizontal=True)
         include_chart_print = c4.checkbox("인쇄 시 그래프 포함", value=True)
 
-    # [최적화] 공통 데이터 로드 함수 (기간 필터 적용)
+    # [최적화] 발주 원본 대신 일별/월별 집계 문서(stats_rollup)를 조회
+    # 기간별은 일별 문서(최대 기간 일수만큼), 월별/년도별은 월별 문서만 읽음
     @st.cache_data(ttl=60)
-    def load_orders_by_query(field_name, s_dt, e_dt):
-        # 선택된 기간의 데이터만 쿼리 (읽기 비용 절감)
-        docs = db.collection("orders").where(field_name, ">=", s_dt).where(field_name, "<=", e_dt).stream()
-        data = []
-        for doc in docs:
-            d = doc.to_dict()
-            d['id'] = doc.id
-            # 날짜 필드 변환 (해당 필드만)
-            if d.get(field_name):
-                if hasattr(d[field_name], 'tzinfo'):
-                    d[field_name] = d[field_name].replace(tzinfo=None)
-            data.append(d)
-        return pd.DataFrame(data)
-    
-    # 공통 그룹화 키 생성 함수
-    def get_group_key(row, date_col):
-        if pd.isna(row.get(date_col)): return None
-        dt = row[date_col]
-        if stat_type == "기간별": return dt.strftime("%Y-%m-%d")
-        elif stat_type == "월별": return dt.strftime("%Y-%m")
-        else: return dt.strftime("%Y")
+    def load_stats(kind, s_dt, e_dt, group_by):
+        df = load_stats_rollups(db, kind, s_dt, e_dt, monthly=group_by != "기간별")
+        # 그룹화 키: 기간별=일자, 월별=년-월, 년도별=년도
+        df['group_key'] = df['period'].str[:4] if group_by == "년도별" else df['period']
+        return df
+
+    # [NEW] 공통 시계열 집계 (발주/제직/염색/봉제/출고 공용)
+    def aggregate_by_period(df_src, group_cols, label, value_col, group_label):
+        return df_src.groupby(group_cols).agg(**{label: (value_col, 'sum')}).reset_index().rename(columns={'group_key': group_label})
 
     # 공통 액션 버튼 (엑셀/인쇄)
     def show_actions(df_data, file_name, title, chart_col=None):
@@ -185,9 +177,9 @@ def render_statistics(db, sub_menu):
     if sub_menu == "발주내역":
         st.subheader("발주 수량 및 건수 통계")
         
-        # [최적화] 'date' 필드 기준으로 필요한 기간만 조회
+        # [최적화] 발주 집계 문서 조회 ('date' 기준)
         if start_dt and end_dt:
-            df_order = load_orders_by_query('date', start_dt, end_dt)
+            df_order = load_stats('order', start_dt, end_dt, stat_type)
         else: df_order = pd.DataFrame()
 
         if filter_partners:
@@ -195,7 +187,8 @@ def render_statistics(db, sub_menu):
 
         if not df_order.empty:
             # --- 요약 ---
-            total_orders = df_order['order_no'].nunique()
+            # 분할/부분출고 문서는 제외한 원 발주 건수
+            total_orders = int(df_order['orders'].sum())
             total_qty = df_order['stock'].sum()
             avg_qty = total_qty / total_orders if total_orders > 0 else 0
             
@@ -205,13 +198,12 @@ def render_statistics(db, sub_menu):
             m3.metric("건당 평균수량", f"{avg_qty:,.1f} 장")
             st.divider()
 
-            df_order['group_key'] = df_order.apply(lambda x: get_group_key(x, 'date'), axis=1)
             group_label = stat_type.replace('별', '')
             
             # 1. 상단: 거래처별 통계 및 선택 (먼저 처리하여 필터링 기준 마련)
             st.write(f"**거래처별 발주 현황**")
-            partner_stats = df_order.groupby('customer').agg(발주건수=('order_no', 'nunique'), 총수량=('stock', 'sum')).reset_index()
-            partner_stats['평균수량'] = partner_stats['총수량'] / partner_stats['발주건수']
+            partner_stats = df_order.groupby('customer').agg(발주건수=('orders', 'sum'), 총수량=('stock', 'sum')).reset_index()
+            partner_stats['평균수량'] = (partner_stats['총수량'] / partner_stats['발주건수'].where(partner_stats['발주건수'] > 0)).fillna(0)
             partner_stats = partner_stats.sort_values('총수량', ascending=False)
             
             partner_stats['선택'] = False
@@ -247,7 +239,7 @@ def render_statistics(db, sub_menu):
                 group_cols = ['group_key']
                 chart_color_col = alt.value('#4c78a8') # 단일 색상
 
-            time_stats = df_chart.groupby(group_cols).agg(총수량=('stock', 'sum')).reset_index().rename(columns={'group_key': group_label})
+            time_stats = aggregate_by_period(df_chart, group_cols, '총수량', 'stock', group_label)
 
             # Altair 차트 생성
             base = alt.Chart(time_stats).encode(x=alt.X(f'{group_label}:N', axis=alt.Axis(labelAngle=-45), sort=None), y='총수량:Q', color=chart_color_col, tooltip=[alt.Tooltip(f'{group_label}:N', title=group_label), alt.Tooltip('customer:N', title='발주처') if compare_mode else alt.Tooltip(), alt.Tooltip('총수량:Q', title='총수량', format=',')])
@@ -267,9 +259,9 @@ def render_statistics(db, sub_menu):
     elif sub_menu == "제직내역":
         st.subheader("제직 생산량 통계")
         
-        # [최적화] 'weaving_end_time' 필드 기준으로 필요한 기간만 조회
+        # [최적화] 제직 집계 문서 조회 ('weaving_end_time' 기준)
         if start_dt and end_dt:
-            df_weav = load_orders_by_query('weaving_end_time', start_dt, end_dt)
+            df_weav = load_stats('weaving', start_dt, end_dt, stat_type)
         else: df_weav = pd.DataFrame()
 
         if filter_partners:
@@ -277,7 +269,7 @@ def render_statistics(db, sub_menu):
 
         if not df_weav.empty:
             # --- 요약 ---
-            total_rolls = len(df_weav)
+            total_rolls = int(df_weav['count'].sum())
             total_qty = df_weav['real_stock'].sum()
             total_weight = df_weav['prod_weight_kg'].sum()
             
@@ -287,15 +279,11 @@ def render_statistics(db, sub_menu):
             m3.metric("총 생산중량", f"{total_weight:,.1f} kg")
             st.divider()
 
-            df_weav['group_key'] = df_weav.apply(lambda x: get_group_key(x, 'weaving_end_time'), axis=1)
             group_label = stat_type.replace('별', '')
             
             # 1. 상단: 제직기별 통계 및 선택
             st.write("**제직기별 생산량**")
-            if 'machine_no' in df_weav.columns:
-                machine_stats = df_weav.groupby('machine_no').agg(생산롤수=('id', 'count'), 총생산매수=('real_stock', 'sum'), 총생산중량=('prod_weight_kg', 'sum')).sort_values('총생산매수', ascending=False).reset_index()
-            else:
-                machine_stats = pd.DataFrame(columns=['machine_no', '생산롤수', '총생산매수', '총생산중량'])
+            machine_stats = df_weav.groupby('machine_no').agg(생산롤수=('count', 'sum'), 총생산매수=('real_stock', 'sum'), 총생산중량=('prod_weight_kg', 'sum')).sort_values('총생산매수', ascending=False).reset_index()
 
             machine_stats['선택'] = False
             edited_machine_stats = st.data_editor(
@@ -329,7 +317,7 @@ def render_statistics(db, sub_menu):
                 group_cols = ['group_key']
                 chart_color_col = alt.value('#4c78a8')
 
-            time_stats = df_chart.groupby(group_cols).agg(총생산매수=('real_stock', 'sum')).reset_index().rename(columns={'group_key': group_label})
+            time_stats = aggregate_by_period(df_chart, group_cols, '총생산매수', 'real_stock', group_label)
 
             base = alt.Chart(time_stats).encode(x=alt.X(f'{group_label}:N', axis=alt.Axis(labelAngle=-45), sort=None), y='총생산매수:Q', color=chart_color_col, tooltip=[alt.Tooltip(f'{group_label}:N', title=group_label), alt.Tooltip('machine_no:N', title='제직기') if compare_mode else alt.Tooltip(), alt.Tooltip('총생산매수:Q', title='총생산매수', format=',')])
             if chart_type_opt == "막대형":
@@ -348,9 +336,9 @@ def render_statistics(db, sub_menu):
     elif sub_menu == "염색내역":
         st.subheader("염색 입고 및 비용 통계")
         
-        # [최적화] 'dyeing_in_date' 필드 기준으로 필요한 기간만 조회
+        # [최적화] 염색 집계 문서 조회 ('dyeing_in_date' 기준)
         if start_dt and end_dt:
-            df_dye = load_orders_by_query('dyeing_in_date', start_dt, end_dt)
+            df_dye = load_stats('dyeing', start_dt, end_dt, stat_type)
         else: df_dye = pd.DataFrame()
 
         if filter_partners:
@@ -358,7 +346,7 @@ def render_statistics(db, sub_menu):
 
         if not df_dye.empty:
             # --- 요약 ---
-            total_jobs = len(df_dye)
+            total_jobs = int(df_dye['count'].sum())
             total_qty = df_dye['stock'].sum()
             total_amount = df_dye['dyeing_amount'].sum()
             
@@ -368,12 +356,11 @@ def render_statistics(db, sub_menu):
             m3.metric("총 염색비용", f"{total_amount:,} 원")
             st.divider()
 
-            df_dye['group_key'] = df_dye.apply(lambda x: get_group_key(x, 'dyeing_in_date'), axis=1)
             group_label = stat_type.replace('별', '')
             
             # 1. 상단: 업체별 통계 및 선택
             st.write("**업체별 실적**")
-            partner_stats = df_dye.groupby('dyeing_partner').agg(작업건수=('id', 'count'), 총수량=('stock', 'sum'), 총금액=('dyeing_amount', 'sum')).sort_values('총금액', ascending=False).reset_index()
+            partner_stats = df_dye.groupby('dyeing_partner').agg(작업건수=('count', 'sum'), 총수량=('stock', 'sum'), 총금액=('dyeing_amount', 'sum')).sort_values('총금액', ascending=False).reset_index()
 
             partner_stats['선택'] = False
             edited_partner_stats = st.data_editor(
@@ -407,7 +394,7 @@ def render_statistics(db, sub_menu):
                 group_cols = ['group_key']
                 chart_color_col = alt.value('#4c78a8')
 
-            time_stats = df_chart.groupby(group_cols).agg(총금액=('dyeing_amount', 'sum')).reset_index().rename(columns={'group_key': group_label})
+            time_stats = aggregate_by_period(df_chart, group_cols, '총금액', 'dyeing_amount', group_label)
 
             base = alt.Chart(time_stats).encode(x=alt.X(f'{group_label}:N', axis=alt.Axis(labelAngle=-45), sort=None), y='총금액:Q', color=chart_color_col, tooltip=[alt.Tooltip(f'{group_label}:N', title=group_label), alt.Tooltip('dyeing_partner:N', title='염색업체') if compare_mode else alt.Tooltip(), alt.Tooltip('총금액:Q', title='총금액', format=',')])
             if chart_type_opt == "막대형":
@@ -426,9 +413,9 @@ def render_statistics(db, sub_menu):
     elif sub_menu == "봉제내역":
         st.subheader("봉제 생산 및 비용 통계")
         
-        # [최적화] 'sewing_end_date' 필드 기준으로 필요한 기간만 조회
+        # [최적화] 봉제 집계 문서 조회 ('sewing_end_date' 기준)
         if start_dt and end_dt:
-            df_sew = load_orders_by_query('sewing_end_date', start_dt, end_dt)
+            df_sew = load_stats('sewing', start_dt, end_dt, stat_type)
         else: df_sew = pd.DataFrame()
 
         if filter_partners:
@@ -436,10 +423,10 @@ def render_statistics(db, sub_menu):
 
         if not df_sew.empty:
             # --- 요약 ---
-            total_jobs = len(df_sew)
+            total_jobs = int(df_sew['count'].sum())
             total_qty = df_sew['stock'].sum()
-            total_defect = df_sew['sewing_defect_qty'].sum() if 'sewing_defect_qty' in df_sew.columns else 0
-            total_amount = df_sew['sewing_amount'].sum() if 'sewing_amount' in df_sew.columns else 0
+            total_defect = df_sew['sewing_defect_qty'].sum()
+            total_amount = df_sew['sewing_amount'].sum()
             
             m1, m2, m3, m4 = st.columns(4)
             m1.metric("총 작업건수", f"{total_jobs:,} 건")
@@ -448,12 +435,11 @@ def render_statistics(db, sub_menu):
             m4.metric("총 외주비용", f"{total_amount:,} 원")
             st.divider()
 
-            df_sew['group_key'] = df_sew.apply(lambda x: get_group_key(x, 'sewing_end_date'), axis=1)
             group_label = stat_type.replace('별', '')
             
             # 1. 상단: 업체별 통계 및 선택
             st.write("**업체별 실적 및 비용**")
-            partner_stats = df_sew.groupby('sewing_partner').agg(작업건수=('id', 'count'), 총생산수량=('stock', 'sum'), 총불량수량=('sewing_defect_qty', 'sum'), 총비용=('sewing_amount', 'sum')).sort_values('총생산수량', ascending=False).reset_index()
+            partner_stats = df_sew.groupby('sewing_partner').agg(작업건수=('count', 'sum'), 총생산수량=('stock', 'sum'), 총불량수량=('sewing_defect_qty', 'sum'), 총비용=('sewing_amount', 'sum')).sort_values('총생산수량', ascending=False).reset_index()
 
             partner_stats['선택'] = False
             edited_partner_stats = st.data_editor(
@@ -487,7 +473,7 @@ def render_statistics(db, sub_menu):
                 group_cols = ['group_key']
                 chart_color_col = alt.value('#4c78a8')
 
-            time_stats = df_chart.groupby(group_cols).agg(총생산수량=('stock', 'sum')).reset_index().rename(columns={'group_key': group_label})
+            time_stats = aggregate_by_period(df_chart, group_cols, '총생산수량', 'stock', group_label)
 
             base = alt.Chart(time_stats).encode(x=alt.X(f'{group_label}:N', axis=alt.Axis(labelAngle=-45), sort=None), y='총생산수량:Q', color=chart_color_col, tooltip=[alt.Tooltip(f'{group_label}:N', title=group_label), alt.Tooltip('sewing_partner:N', title='봉제업체') if compare_mode else alt.Tooltip(), alt.Tooltip('총생산수량:Q', title='총생산수량', format=',')])
             if chart_type_opt == "막대형":
@@ -506,9 +492,9 @@ def render_statistics(db, sub_menu):
     elif sub_menu == "출고/운임내역":
         st.subheader("출고 실적 및 운임비 통계")
         
-        # [최적화] 'shipping_date' 필드 기준으로 필요한 기간만 조회
+        # [최적화] 출고 집계 문서 조회 ('shipping_date' 기준)
         if start_dt and end_dt:
-            df_ship = load_orders_by_query('shipping_date', start_dt, end_dt)
+            df_ship = load_stats('shipping', start_dt, end_dt, stat_type)
         else: df_ship = pd.DataFrame()
 
         if filter_partners:
@@ -520,9 +506,9 @@ def render_statistics(db, sub_menu):
 
         if not df_ship.empty:
             # --- 요약 ---
-            total_jobs = len(df_ship)
+            total_jobs = int(df_ship['count'].sum())
             total_qty = df_ship['stock'].sum()
-            total_cost = df_ship['shipping_cost'].sum() if 'shipping_cost' in df_ship.columns else 0
+            total_cost = df_ship['shipping_cost'].sum()
             
             m1, m2, m3 = st.columns(3)
             m1.metric("총 출고건수", f"{total_jobs:,} 건")
@@ -530,12 +516,11 @@ def render_statistics(db, sub_menu):
             m3.metric("총 운임비", f"{total_cost:,} 원")
             st.divider()
 
-            df_ship['group_key'] = df_ship.apply(lambda x: get_group_key(x, 'shipping_date'), axis=1)
             group_label = stat_type.replace('별', '')
             
             # 1. 상단: 배송업체별 통계 및 선택
             st.write("**배송업체별 운임비**")
-            carrier_stats = df_ship.groupby('shipping_carrier').agg(출고건수=('id', 'count'), 총수량=('stock', 'sum'), 총운임비=('shipping_cost', 'sum')).sort_values('총운임비', ascending=False).reset_index()
+            carrier_stats = df_ship.groupby('shipping_carrier').agg(출고건수=('count', 'sum'), 총수량=('stock', 'sum'), 총운임비=('shipping_cost', 'sum')).sort_values('총운임비', ascending=False).reset_index()
 
             carrier_stats['선택'] = False
             edited_carrier_stats = st.data_editor(
@@ -569,7 +554,7 @@ def render_statistics(db, sub_menu):
                 group_cols = ['group_key']
                 chart_color_col = alt.value('#4c78a8')
 
-            time_stats = df_chart.groupby(group_cols).agg(총운임비=('shipping_cost', 'sum')).reset_index().rename(columns={'group_key': group_label})
+            time_stats = aggregate_by_period(df_chart, group_cols, '총운임비', 'shipping_cost', group_label)
 
             base = alt.Chart(time_stats).encode(x=alt.X(f'{group_label}:N', axis=alt.Axis(labelAngle=-45), sort=None), y='총운임비:Q', color=chart_color_col, tooltip=[alt.Tooltip(f'{group_label}:N', title=group_label), alt.Tooltip('shipping_carrier:N', title='배송업체') if compare_mode else alt.Tooltip(), alt.Tooltip('총운임비:Q', title='총운임비', format=',')])
             if chart_type_opt == "막대형":
@@ -585,8 +570,22 @@ def render_statistics(db, sub_menu):
             st.divider()
             st.write("📋 거래처별 출고 실적")
             # [수정] 출고방법(shipping_method) 컬럼 추가
-            cust_stats = df_chart.groupby(['customer', 'shipping_method']).agg(출고건수=('id', 'count'), 총수량=('stock', 'sum'), 총운임비=('shipping_cost', 'sum')).sort_values('총수량', ascending=False).reset_index()
+            cust_stats = df_chart.groupby(['customer', 'shipping_method']).agg(출고건수=('count', 'sum'), 총수량=('stock', 'sum'), 총운임비=('shipping_cost', 'sum')).sort_values('총수량', ascending=False).reset_index()
             st.dataframe(cust_stats, width="stretch", hide_index=True)
             show_actions(cust_stats, "거래처별_출고실적", "거래처별 출고 실적")
         else:
-            st.info("조회된 데이터가 없습니다.")
\ No newline at end of file
+            st.info("조회된 데이터가 없습니다.")
+
+    # [NEW] 통계 집계 재계산 (관리자)
+    if st.session_state.get("role") == "admin":
+        # [FIX] 대량 삭제 후 재계산이 필요한 경우 펼쳐서 안내
+        rebuild_needed = stats_rebuild_needed(db)
+        with st.expander("통계 집계 재계산(백필)", expanded=rebuild_needed):
+            if rebuild_needed:
+                st.warning("발주 일괄 삭제 이후 집계를 다시 계산하지 않았습니다. 작업이 적은 시간에 재계산하세요.")
+            st.caption("내역조회는 일별/월별 집계 문서를 사용합니다. 과거 데이터를 처음 반영하거나 집계가 실제와 다를 때 발주 전체로 다시 계산합니다. (발주 건수만큼 읽기 발생)")
+            if st.button("집계 재계산", key="btn_rebuild_stats"):
+                with st.spinner("재계산 중..."):
+                    rebuild_stats_rollups(db)
+                load_stats.clear()
+                st.rerun()
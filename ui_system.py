@@ -3,8 +3,10 @@ import pandas as pd
 import datetime
 import base64
 from firebase_admin import firestore
-from utils import get_partners, validate_password, search_address_api
+from utils import get_partners, validate_password, search_address_api, get_company_info, bump_company_info_version
+from db_usage import track_db_usage, get_usage_snapshot, usage_started_at, export_usage_json, export_usage_csv, reset_usage
 
+@track_db_usage
 def render_users(db, sub_menu):
     st.header("사용자 관리")
 
@@ -173,6 +175,7 @@ def render_users(db, sub_menu):
                     if c_del2.button("❌ 아니요", key=f"cancel_del_btn_{sel_id}"):
                         del st.session_state[f"confirm_delete_{sel_id}"]
                         st.rerun()
+@track_db_usage
 def render_my_profile(db):
     st.header("로그인 정보 설정")
     
@@ -267,10 +270,10 @@ def render_my_profile(db):
             else:
                 st.info("변경할 내용이 없습니다.")
 
+@track_db_usage
 def render_company_settings(db, sub_menu):
     doc_ref = db.collection("settings").document("company_info")
-    doc = doc_ref.get()
-    data = doc.to_dict() if doc.exists else {}
+    data = get_company_info()
     
     if sub_menu == "회사정보 조회":
         st.header("회사정보")
@@ -524,5 +527,48 @@ def render_company_settings(db, sub_menu):
                 new_data["logo_img"] = None
 
             doc_ref.set(new_data)
+            bump_company_info_version() # [NEW] 회사 정보 캐시 무효화
             st.success("회사 정보가 저장되었습니다.")
-            st.rerun()
\ No newline at end of file
+            st.rerun()
+# [NEW] DB 사용량 (Firestore 읽기/쓰기/삭제) 조회 - 관리자 전용
+@track_db_usage
+def render_db_usage(db, sub_menu):
+    st.header("DB 사용량 조회")
+    if st.session_state.get("role") != "admin":
+        st.error("관리자만 접근할 수 있습니다.")
+        return
+    st.info("앱 프로세스 시작(또는 초기화) 이후 화면별 Firestore 문서 읽기/쓰기/삭제 수를 집계합니다. (캐시로 처리된 조회는 집계되지 않습니다)")
+
+    df_scopes, df_runs = get_usage_snapshot()
+    st.caption(f"집계 시작: {usage_started_at().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    if df_scopes.empty:
+        st.warning("아직 집계된 사용량이 없습니다.")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("읽기", f"{int(df_scopes['reads'].sum()):,}")
+    c2.metric("쓰기", f"{int(df_scopes['writes'].sum()):,}")
+    c3.metric("삭제", f"{int(df_scopes['deletes'].sum()):,}")
+    c4.metric("rerun 수", f"{len(df_runs):,}")
+
+    col_map = {"scope": "화면(함수)", "reads": "읽기", "writes": "쓰기", "deletes": "삭제", "calls": "호출수", "total": "합계"}
+
+    st.subheader("화면별 사용량 (상위 순)")
+    st.bar_chart(df_scopes.head(15).set_index("scope")[["reads", "writes", "deletes"]])
+    st.dataframe(df_scopes.rename(columns=col_map), width="stretch", hide_index=True)
+
+    st.subheader("최근 rerun별 사용량")
+    df_runs_disp = df_runs.copy()
+    if not df_runs_disp.empty:
+        df_runs_disp["time"] = df_runs_disp["time"].dt.strftime("%m-%d %H:%M:%S")
+    st.dataframe(df_runs_disp.rename(columns={**col_map, "time": "시각", "user": "사용자", "scopes": "사용 화면"}), width="stretch", hide_index=True)
+
+    st.divider()
+    now_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    c_d1, c_d2, c_d3, _ = st.columns([1, 1, 1, 3])
+    c_d1.download_button("📥 JSON 저장", export_usage_json(), file_name=f"db_usage_{now_str}.json", mime="application/json", use_container_width=True)
+    c_d2.download_button("📥 CSV 저장", export_usage_csv(), file_name=f"db_usage_{now_str}.csv", mime="text/csv", use_container_width=True)
+    if c_d3.button("🔄 집계 초기화", use_container_width=True):
+        reset_usage()
+        st.rerun()
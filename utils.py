@@ -7,6 +7,7 @@ import datetime
 import pandas as pd
 import urllib.request
 import urllib.parse
+from db_usage import TrackedClient
 
 # 2. 데이터베이스 연결
 def get_db():
@@ -34,7 +35,8 @@ def get_db():
                 st.stop()
             
         firebase_admin.initialize_app(cred)
-    return firestore.client()
+    # [NEW] 읽기/쓰기/삭제 사용량 집계를 위해 클라이언트를 래핑하여 반환
+    return TrackedClient(firestore.client())
 
 # --- 공통 함수: 기초 코드 가져오기 ---
 @st.cache_data(ttl=300) # 5분 캐싱
@@ -89,6 +91,172 @@ def get_users_list():
     docs = db.collection("users").stream()
     return [doc.to_dict() for doc in docs]
 
+# [NEW] 공통 함수: 회사 정보(settings/company_info) 프로세스 공용 캐시
+# 로고/직인 base64 이미지가 포함되어 문서가 크므로, 매 rerun마다 읽지 않고
+# 프로세스 내에 1부만 보관합니다. 회사정보 저장 시 버전을 올려 무효화합니다.
+@st.cache_resource
+def _get_settings_versions():
+    return {"company_info": 0}
+
+@st.cache_data(max_entries=2)
+def _load_company_info(version):
+    db = get_db()
+    doc = db.collection("settings").document("company_info").get()
+    return doc.to_dict() if doc.exists else {}
+
+def get_company_info():
+    """settings/company_info 문서를 캐시에서 반환합니다. (문서가 없으면 빈 dict)"""
+    return _load_company_info(_get_settings_versions()["company_info"])
+
+def bump_company_info_version():
+    """회사 정보 변경 후 호출하여 모든 세션의 캐시를 무효화합니다."""
+    _get_settings_versions()["company_info"] += 1
+
+# [NEW] 공통 함수: 발주번호 발급 (YYMM + 3자리 일련번호, 예: 2505001)
+# 월별 카운터 문서(counters/order_no_YYMM)를 트랜잭션으로 증가시켜 동시 접수 시에도 번호가 겹치지 않습니다.
+# count개를 요청하면 연속된 번호 묶음을 한 번의 트랜잭션으로 예약합니다. (엑셀 일괄 등록용)
+def allocate_order_numbers(db, count=1, now=None):
+    if count <= 0:
+        return []
+    now = now or datetime.datetime.now()
+    prefix = now.strftime("%y%m")
+    counter_ref = db.collection("counters").document(f"order_no_{prefix}")
+
+    @firestore.transactional
+    def reserve(transaction):
+        snap = counter_ref.get(transaction=transaction)
+        if snap.exists:
+            last_seq = int(snap.to_dict().get("last_seq", 0))
+        else:
+            # 카운터가 없는 달(최초 사용)은 기존 발주번호의 최대값에서 이어서 발급
+            last_seq = 0
+            last_docs = db.collection("orders")\
+                .where("order_no", ">=", f"{prefix}000")\
+                .where("order_no", "<=", f"{prefix}999")\
+                .order_by("order_no", direction=firestore.Query.DESCENDING)\
+                .limit(1)\
+                .stream(transaction=transaction)
+            for doc in last_docs:
+                last_val = doc.to_dict().get("order_no")
+                if last_val and len(last_val) == 7:
+                    try: last_seq = int(last_val[-3:])
+                    except: pass
+        transaction.set(counter_ref, {"prefix": prefix, "last_seq": last_seq + count, "updated_at": firestore.SERVER_TIMESTAMP})
+        return last_seq
+
+    start_seq = reserve(db.transaction())
+    return [f"{prefix}{start_seq + i:03d}" for i in range(1, count + 1)]
+
+# [NEW] 공통 함수: 여러 문서를 한 번에 조회 (get_all)
+# 선택 항목마다 doc_ref.get()을 반복하면 건수만큼 왕복이 발생하므로, 문서 ID 목록을 모아 일괄 조회합니다.
+# 반환: {문서ID: 데이터 dict (없는 문서는 None)}
+def get_docs_map(db, collection, doc_ids, chunk_size=300):
+    ids = list(dict.fromkeys(i for i in doc_ids if i))
+    docs = {i: None for i in ids}
+    for start in range(0, len(ids), chunk_size):
+        refs = [db.collection(collection).document(i) for i in ids[start:start + chunk_size]]
+        for snap in db.get_all(refs):
+            if snap.exists:
+                docs[snap.id] = snap.to_dict()
+    return docs
+
+# [NEW] 공통 함수: 커서 기반 페이지 조회
+# 정렬 필드 + 문서 ID 순으로 정렬하고, (마지막 정렬값, 마지막 문서ID)를 다음 페이지 커서로 사용합니다.
+# 반환: (행 목록, 다음 페이지 커서 - 마지막 페이지면 None)
+def fetch_query_page(query, order_field, page_size, cursor=None, descending=True):
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+    query = query.order_by(order_field, direction=direction).order_by("__name__", direction=direction)
+    if cursor:
+        query = query.start_after({order_field: cursor[0], "__name__": cursor[1]})
+    rows = []
+    for doc in query.limit(page_size).stream():
+        d = doc.to_dict()
+        d['id'] = doc.id
+        rows.append(d)
+    next_cursor = (rows[-1].get(order_field), rows[-1]['id']) if len(rows) == page_size else None
+    return rows, next_cursor
+
+# [NEW] 공통 함수: 발주 문서 변경 시각(updated_at) 기록 및 변경분 조회
+# 발주 문서를 추가/수정하는 모든 곳에서 stamp_updated_at()으로 서버 시각을 기록하고,
+# 삭제는 delete_orders()로 삭제 기록(order_deletions)을 남깁니다. (일괄 삭제는 mark_orders_reset)
+# fetch_order_changes()는 워터마크 이후 변경/삭제분만 반환하므로, 캐시는 변경량만큼만 읽어 갱신할 수 있습니다.
+ORDER_DELETIONS_COLLECTION = "order_deletions"
+ORDER_DELETIONS_KEEP_DAYS = 30 # 삭제 기록 보관 기간 (expire_at: Firestore TTL 정책 대상 필드)
+ORDER_SYNC_MARGIN_SEC = 60 # 커밋 순서와 서버 시각의 차이를 고려한 재조회 여유
+
+def stamp_updated_at(data):
+    """발주 문서 쓰기 데이터에 updated_at(서버 시각)을 추가한 사본을 반환합니다."""
+    return {**data, "updated_at": firestore.SERVER_TIMESTAMP}
+
+def delete_orders(db, doc_ids, batch=None):
+    """
+    발주 문서를 삭제하고 삭제 기록을 남깁니다.
+    batch를 넘기면 같은 batch에 기록하고(커밋은 호출측), 없으면 400건 단위로 커밋합니다.
+    반환: 쓰기 수 (문서당 2건 - 삭제 + 삭제 기록)
+    """
+    own_batch = batch is None
+    if own_batch:
+        batch = db.batch()
+    expire_at = datetime.datetime.now() + datetime.timedelta(days=ORDER_DELETIONS_KEEP_DAYS)
+    count = pending = 0
+    for doc_id in doc_ids:
+        batch.delete(db.collection("orders").document(doc_id))
+        batch.set(db.collection(ORDER_DELETIONS_COLLECTION).document(doc_id), {"deleted_at": firestore.SERVER_TIMESTAMP, "expire_at": expire_at})
+        count += 2
+        pending += 2
+        if own_batch and pending >= 400:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if own_batch and pending:
+        batch.commit()
+    return count
+
+def mark_orders_reset(db):
+    """대량 삭제 등 건별 기록이 없는 변경 후 호출하여, 변경분 조회 측이 전체를 다시 읽도록 합니다."""
+    db.collection("sync_state").document("orders").set({"reset_at": firestore.SERVER_TIMESTAMP}, merge=True)
+
+def fetch_order_changes(db, since=None, fields=None):
+    """
+    since(워터마크, UTC datetime) 이후 변경/삭제된 발주 문서를 조회합니다.
+    fields를 지정하면 해당 필드만 읽습니다.
+    반환: {"changed": [문서 dict(id 포함)], "deleted": [문서ID], "reset": 전체 재조회 필요 여부, "watermark": 다음 since}
+    since가 없거나 보관 기간보다 오래되었거나 그 사이 mark_orders_reset()이 호출된 경우 reset=True입니다.
+    (reset이면 호출측이 전체를 다시 읽고, 반환된 watermark부터 이어서 조회)
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if since is None or since < now - datetime.timedelta(days=ORDER_DELETIONS_KEEP_DAYS):
+        return {"changed": [], "deleted": [], "reset": True, "watermark": now - datetime.timedelta(seconds=ORDER_SYNC_MARGIN_SEC)}
+
+    state = db.collection("sync_state").document("orders").get()
+    reset_at = state.to_dict().get("reset_at") if state.exists else None
+    if reset_at and reset_at > since:
+        return {"changed": [], "deleted": [], "reset": True, "watermark": now - datetime.timedelta(seconds=ORDER_SYNC_MARGIN_SEC)}
+
+    # 워터마크 직전 구간을 겹쳐 읽어도 같은 변경을 다시 적용할 뿐이므로 안전
+    after = since - datetime.timedelta(seconds=ORDER_SYNC_MARGIN_SEC)
+    watermark = since
+    query = db.collection("orders").where("updated_at", ">", after)
+    if fields:
+        query = query.select(sorted(set(fields) | {"updated_at"}))
+    changed = []
+    for doc in query.stream():
+        d = doc.to_dict()
+        d['id'] = doc.id
+        changed.append(d)
+        if d.get("updated_at") and d["updated_at"] > watermark:
+            watermark = d["updated_at"]
+    deleted = []
+    for snap in db.collection(ORDER_DELETIONS_COLLECTION).where("deleted_at", ">", after).stream():
+        deleted.append(snap.id)
+        deleted_at = snap.to_dict().get("deleted_at")
+        if deleted_at and deleted_at > watermark:
+            watermark = deleted_at
+    # 삭제 후 같은 ID로 다시 만들어진 문서는 변경으로 처리
+    changed_ids = {d['id'] for d in changed}
+    deleted = [i for i in deleted if i not in changed_ids]
+    return {"changed": changed, "deleted": deleted, "reset": False, "watermark": watermark}
+
 # --- 공통 함수: 기초 코드가 제품에 사용되었는지 확인 ---
 @st.cache_data(ttl=60) # 1분 동안 결과 캐싱
 def is_basic_code_used(code_key, name, code):
@@ -277,13 +445,11 @@ def manage_code(code_key, default_list, label):
 
 # --- 공통 함수: 주소 검색 API 호출 ---
 def search_address_api(keyword, page=1):
-    db = get_db()
     """
     행정안전부 도로명주소 검색 API를 호출하여 결과를 반환합니다.
     """
-    # DB에서 API 키 가져오기
-    doc = db.collection("settings").document("company_info").get()
-    api_key = doc.to_dict().get("juso_api_key", "") if doc.exists else ""
+    # 회사 정보 캐시에서 API 키 가져오기
+    api_key = get_company_info().get("juso_api_key", "")
     
     if not api_key:
         return None, None, "API 키가 등록되지 않았습니다. [시스템관리 > 회사정보 관리]에서 키를 입력해주세요."
@@ -366,6 +532,51 @@ def load_user_settings(user_id, key, default_value):
         pass
     return default_value
 
+# [NEW] 현황판 자동 새로고침 (fragment)
+# 생산 화면을 현장 상황판으로 띄워 둘 때, 가동 현황/진행 목록 영역만 주기적으로 다시 그립니다.
+# (사이드바, 스타일, 회사정보 등 화면 전체를 다시 실행하지 않음)
+BOARD_REFRESH_OPTIONS = {"끄기": 0, "30초": 30, "1분": 60, "5분": 300}
+
+def board_refresh_interval(container=st):
+    """자동 새로고침 주기를 선택하고(사용자 설정에 저장) 초 단위로 반환합니다. (0 = 끄기)"""
+    user_id = st.session_state.get("user_id")
+    if "board_refresh_sec" not in st.session_state:
+        st.session_state["board_refresh_sec"] = load_user_settings(user_id, "board_refresh_sec", 0)
+    labels = list(BOARD_REFRESH_OPTIONS)
+    current = next((k for k, v in BOARD_REFRESH_OPTIONS.items() if v == st.session_state["board_refresh_sec"]), labels[0])
+
+    def on_change():
+        sec = BOARD_REFRESH_OPTIONS[st.session_state["board_refresh_label"]]
+        st.session_state["board_refresh_sec"] = sec
+        save_user_settings(user_id, "board_refresh_sec", sec)
+
+    container.selectbox("현황 자동 새로고침", labels, index=labels.index(current), key="board_refresh_label", on_change=on_change)
+    return st.session_state["board_refresh_sec"]
+
+def has_table_selection(key):
+    """st.dataframe(on_select) 표에 선택된 행이 있는지 확인합니다."""
+    try:
+        return bool(st.session_state[key]["selection"]["rows"])
+    except (KeyError, TypeError):
+        return False
+
+def live_region(render, interval, selection_key=None):
+    """
+    render()를 interval초마다 해당 영역만 다시 그리는 fragment로 실행합니다. (interval이 0이면 일반 실행)
+    selection_key 표에서 행을 선택하면 처리 영역이 보이도록 화면 전체를 다시 실행하고, 선택 중에는 새로고침하지 않습니다.
+    반환: 일반 실행이면 render()의 반환값, fragment로 실행하면 None
+    """
+    if not interval or (selection_key and has_table_selection(selection_key)):
+        return render()
+
+    def body():
+        render()
+        if selection_key and has_table_selection(selection_key):
+            st.rerun()
+
+    st.fragment(body, run_every=interval)()
+    return None
+
 # [NEW] 숫자 한글 변환 함수 (공통 사용)
 def num_to_korean(num):
     units = ['', '십', '백', '천']